@@ -0,0 +1,43 @@
+# エンドポイント種別毎の同時実行上限
+"""
+重い検索が DB セッションを使い切って軽い参照や単価決定を待たせないよう、
+種別毎にセマフォで同時実行数を絞る。超過分は待ち合わせる（拒否はしない）。
+
+| 変数 | 既定 | 対象 |
+| --- | --- | --- |
+| DB_LIMIT_SEARCH | 4 | マスタ検索（部分一致・全件走査） |
+| DB_LIMIT_LOOKUP | 16 | コード指定の1件参照 |
+| DB_LIMIT_PRICING | 16 | 単価決定 |
+
+合計が ORACLE_POOL_MAX を超えるとプールの空き待ちが先に発生する。
+"""
+from __future__ import annotations
+
+import asyncio
+
+from app.settings import env_int
+
+_DEFAULT_LIMITS: dict[str, int] = {
+    "search": 4,
+    "lookup": 16,
+    "pricing": 16,
+}
+
+_SEMAPHORES: dict[str, asyncio.Semaphore] = {}
+
+
+def limit(kind: str) -> asyncio.Semaphore:
+    """`async with limit("search"):` で使う。"""
+    sem = _SEMAPHORES.get(kind)
+    if sem is None:
+        size = max(env_int(f"DB_LIMIT_{kind.upper()}", _DEFAULT_LIMITS.get(kind, 8)), 1)
+        sem = _SEMAPHORES.setdefault(kind, asyncio.Semaphore(size))
+    return sem
+
+
+def limit_stats() -> dict[str, dict[str, int]]:
+    # _value は待ち無しで取得できる残数
+    return {
+        kind: {"available": sem._value, "waiting": len(sem._waiters or ())}
+        for kind, sem in _SEMAPHORES.items()
+    }
@@ -1,15 +1,343 @@
 # DB接続
+"""
+Oracle 接続はプロセス内のセッションプールから貸し出す。
+
+- プールは初回の get_conn() で生成（.env 読み込み後に環境変数を参照するため）
+- `with get_conn() as conn:` を抜けると close() でプールへ返却される
+- サイズ等は環境変数で調整（未設定時は下記デフォルト）
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| ORACLE_POOL_MIN | 1 | 最小セッション数 |
+| ORACLE_POOL_MAX | 8 | 最大セッション数 |
+| ORACLE_POOL_INCREMENT | 1 | 不足時に増やすセッション数 |
+| ORACLE_STMT_CACHE_SIZE | 50 | セッション毎の文キャッシュ |
+| ORACLE_POOL_PING_INTERVAL | 60 | 貸出時に疎通確認するアイドル秒数 (0=毎回, 負数=無効) |
+| ORACLE_POOL_TIMEOUT | 300 | アイドルセッションを閉じる秒数 (0=閉じない) |
+| ORACLE_POOL_WAIT_TIMEOUT | 5000 | 空き待ちの上限ミリ秒 (0=無制限) |
+| ORACLE_DRIVER_MODE | thick | thin で Instant Client なし（async API は thin のみ） |
+| ORACLE_CLIENT_LIB_DIR | C:\\oracle\\instantclient_23_8 | thick モードの Instant Client |
+
+async ルートは fetch_all / fetch_one / iter_rows を使う。thin モードでは oracledb の async プール、
+thick モードでは同期プールをワーカースレッドから使う。
+iter_rows は arraysize 件ずつ取り出して返す（全件のリストを作らない）。
+fetch_all_by_keys はキーの配列を1つのコレクション（SYS.ODCIVARCHAR2LIST）としてバインドし、
+SQL 側の TABLE(:keys) と結合して1回で引く（/lookup 系の一括参照、同期版は fetch_all_by_keys_sync）。
+キー数によらず SQL 文が同じなので文キャッシュが効く。
+"""
 import os
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
 import oracledb
 
-oracledb.init_oracle_client(lib_dir=r"C:\oracle\instantclient_23_8")
+from app.metrics import add_rows, span
+from app.settings import env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+_POOL: Optional[oracledb.ConnectionPool] = None
+_ASYNC_POOL: Optional[oracledb.AsyncConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+_DRIVER_READY = False
+
+
+def _init_driver() -> None:
+    """thick モードなら Instant Client を初期化（プール生成前に1回だけ）。"""
+    global _DRIVER_READY
+    if _DRIVER_READY:
+        return
+    if not is_thin_mode():
+        oracledb.init_oracle_client(
+            lib_dir=env_str("ORACLE_CLIENT_LIB_DIR", r"C:\oracle\instantclient_23_8")
+        )
+    _DRIVER_READY = True
+
+
+def is_thin_mode() -> bool:
+    return env_str("ORACLE_DRIVER_MODE", "thick").lower() == "thin"
+
+
+def _pool_params() -> dict[str, Any]:
+    pool_min = env_int("ORACLE_POOL_MIN", 1)
+    pool_max = max(env_int("ORACLE_POOL_MAX", 8), pool_min, 1)
+    return dict(
+        user=os.environ["ORACLE_USER"],
+        password=os.environ["ORACLE_PASSWORD"],
+        dsn=os.environ["ORACLE_DSN"],
+        min=pool_min,
+        max=pool_max,
+        increment=env_int("ORACLE_POOL_INCREMENT", 1),
+        stmtcachesize=env_int("ORACLE_STMT_CACHE_SIZE", 50),
+        ping_interval=env_int("ORACLE_POOL_PING_INTERVAL", 60),
+        timeout=env_int("ORACLE_POOL_TIMEOUT", 300),
+        wait_timeout=env_int("ORACLE_POOL_WAIT_TIMEOUT", 5000),
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+    )
+
+
+def _create_pool() -> oracledb.ConnectionPool:
+    _init_driver()
+    pool = oracledb.create_pool(**_pool_params())
+    logger.info(
+        "Oracle pool created: min=%s max=%s increment=%s stmtcache=%s",
+        pool.min, pool.max, pool.increment, pool.stmtcachesize,
+    )
+    return pool
+
+
+def get_pool() -> oracledb.ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = _create_pool()
+    return _POOL
+
 
 def get_conn():
-    user = os.environ["ORACLE_USER"]
-    password = os.environ["ORACLE_PASSWORD"]
-    dsn = os.environ["ORACLE_DSN"]
+    """プールから接続を借りる。close()（with 終了）で返却される。"""
+    with span("db.connect"):
+        return get_pool().acquire()
+
+
+def get_async_pool() -> oracledb.AsyncConnectionPool:
+    """thin モード専用の async プール。"""
+    global _ASYNC_POOL
+    if _ASYNC_POOL is None:
+        with _POOL_LOCK:
+            if _ASYNC_POOL is None:
+                _init_driver()
+                _ASYNC_POOL = oracledb.create_pool_async(**_pool_params())
+                logger.info("Oracle async pool created: max=%s", _ASYNC_POOL.max)
+    return _ASYNC_POOL
+
+
+@asynccontextmanager
+async def get_async_conn() -> AsyncIterator[oracledb.AsyncConnection]:
+    """thin モード専用。with 終了でプールへ返却。"""
+    pool = get_async_pool()
+    with span("db.connect"):
+        conn = await pool.acquire()
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+def _fetch_sync(sql: str, params: Optional[dict], one: bool):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            with span("db.execute"):
+                cur.execute(sql, params or {})
+            with span("db.fetch"):
+                result = cur.fetchone() if one else cur.fetchall()
+    add_rows((result is not None) if one else len(result))
+    return result
+
+
+async def fetch_all(sql: str, params: Optional[dict] = None) -> list[tuple]:
+    if not is_thin_mode():
+        return await asyncio.to_thread(_fetch_sync, sql, params, False)
+    async with get_async_conn() as conn:
+        with conn.cursor() as cur:
+            with span("db.execute"):
+                await cur.execute(sql, params or {})
+            with span("db.fetch"):
+                rows = await cur.fetchall()
+    add_rows(len(rows))
+    return rows
+
+
+async def fetch_one(sql: str, params: Optional[dict] = None) -> Optional[tuple]:
+    if not is_thin_mode():
+        return await asyncio.to_thread(_fetch_sync, sql, params, True)
+    async with get_async_conn() as conn:
+        with conn.cursor() as cur:
+            cur.prefetchrows = cur.arraysize = 2
+            with span("db.execute"):
+                await cur.execute(sql, params or {})
+            with span("db.fetch"):
+                row = await cur.fetchone()
+    add_rows(row is not None)
+    return row
+
+
+def _tune(cur, arraysize: int) -> None:
+    # 1回目の往復（execute）で最初のバッチまで受け取る
+    cur.arraysize = arraysize
+    cur.prefetchrows = arraysize
+
+
+def _open_cursor_sync(sql: str, params: Optional[dict], arraysize: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        _tune(cur, arraysize)
+        with span("db.execute"):
+            cur.execute(sql, params or {})
+    except BaseException:
+        conn.close()
+        raise
+    return conn, cur
+
+
+def _close_sync(conn, cur) -> None:
+    try:
+        cur.close()
+    finally:
+        conn.close()
+
+
+async def iter_rows(sql: str, params: Optional[dict] = None, *, arraysize: int = 500) -> AsyncIterator[list[tuple]]:
+    """
+    結果を arraysize 件ずつのリストで返す。取り出し終わる（または中断される）まで接続を保持する。
+    件数は呼び出し側の SQL（FETCH FIRST / ROWNUM）で上限を付けること。
+    """
+    arraysize = max(int(arraysize), 1)
+    if not is_thin_mode():
+        conn, cur = await asyncio.to_thread(_open_cursor_sync, sql, params, arraysize)
+        try:
+            while True:
+                with span("db.fetch"):
+                    rows = await asyncio.to_thread(cur.fetchmany, arraysize)
+                if not rows:
+                    return
+                add_rows(len(rows))
+                yield rows
+        finally:
+            await asyncio.to_thread(_close_sync, conn, cur)
+    async with get_async_conn() as conn:
+        with conn.cursor() as cur:
+            _tune(cur, arraysize)
+            with span("db.execute"):
+                await cur.execute(sql, params or {})
+            while True:
+                with span("db.fetch"):
+                    rows = await cur.fetchmany(arraysize)
+                if not rows:
+                    return
+                add_rows(len(rows))
+                yield rows
+
+
+# 一括参照でバインドするコレクション型（最大 32767 要素）
+KEY_LIST_TYPE = "SYS.ODCIVARCHAR2LIST"
+NUMBER_LIST_TYPE = "SYS.ODCINUMBERLIST"
+MAX_BIND_KEYS = 32767
+_KEYS_ARRAYSIZE = 1000
+
+
+def _key_list(keys: list, numeric: bool) -> list:
+    if len(keys) > MAX_BIND_KEYS:
+        raise ValueError(f"too many keys: {len(keys)} > {MAX_BIND_KEYS}")
+    return [int(k) for k in keys] if numeric else [str(k) for k in keys]
+
+
+def _fetch_by_keys_sync(sql: str, keys: list, params: Optional[dict], list_type: str) -> list[tuple]:
+    with get_conn() as conn:
+        key_list = conn.gettype(list_type).newobject(keys)
+        with conn.cursor() as cur:
+            _tune(cur, _KEYS_ARRAYSIZE)
+            with span("db.execute"):
+                cur.execute(sql, {**(params or {}), "keys": key_list})
+            with span("db.fetch"):
+                rows = cur.fetchall()
+    add_rows(len(rows))
+    return rows
+
+
+def fetch_all_by_keys_sync(
+    sql: str, keys: list, params: Optional[dict] = None, *, numeric: bool = False
+) -> list[tuple]:
+    """fetch_all_by_keys の同期版（スレッド・バッチ処理から使う）。"""
+    keys = _key_list(keys, numeric)
+    if not keys:
+        return []
+    return _fetch_by_keys_sync(sql, keys, params, NUMBER_LIST_TYPE if numeric else KEY_LIST_TYPE)
+
+
+async def fetch_all_by_keys(
+    sql: str, keys: list, params: Optional[dict] = None, *, numeric: bool = False
+) -> list[tuple]:
+    """
+    :keys に keys を SYS.ODCIVARCHAR2LIST（numeric=True なら SYS.ODCINUMBERLIST）でバインドして実行する。
+    SQL は `FROM TABLE(:keys) k JOIN ... ON ... = k.COLUMN_VALUE` の形で書き、
+    k.COLUMN_VALUE を SELECT に含めると呼び出し側で入力キーと対応付けられる。
+    数値列の結合に文字列の配列を使うと暗黙変換（不正な値で ORA-01722）になるので numeric を使う。
+    """
+    keys = _key_list(keys, numeric)
+    if not keys:
+        return []
+    list_type = NUMBER_LIST_TYPE if numeric else KEY_LIST_TYPE
+    if not is_thin_mode():
+        return await asyncio.to_thread(_fetch_by_keys_sync, sql, keys, params, list_type)
+    async with get_async_conn() as conn:
+        key_list = (await conn.gettype(list_type)).newobject(keys)
+        with conn.cursor() as cur:
+            _tune(cur, _KEYS_ARRAYSIZE)
+            with span("db.execute"):
+                await cur.execute(sql, {**(params or {}), "keys": key_list})
+            with span("db.fetch"):
+                rows = await cur.fetchall()
+    add_rows(len(rows))
+    return rows
+
+
+async def close_async_pool() -> None:
+    global _ASYNC_POOL
+    with _POOL_LOCK:
+        pool, _ASYNC_POOL = _ASYNC_POOL, None
+    if pool is None:
+        return
+    try:
+        await pool.close(force=True)
+        logger.info("Oracle async pool closed")
+    except Exception as exc:  # pragma: no cover - defensive
+        logger.warning("Oracle async pool close failed: %s", exc)
+
+
+def close_pool() -> None:
+    """アプリ終了時に呼ぶ。貸出中のセッションがあっても強制的に閉じる。"""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is None:
+        return
+    try:
+        pool.close(force=True)
+        logger.info("Oracle pool closed")
+    except Exception as exc:  # pragma: no cover - defensive
+        logger.warning("Oracle pool close failed: %s", exc)
+
+
+def _stats(pool) -> dict[str, Any]:
+    if pool is None:
+        return {"created": False}
+    return {
+        "created": True,
+        "opened": pool.opened,
+        "busy": pool.busy,
+        "min": pool.min,
+        "max": pool.max,
+        "increment": pool.increment,
+        "stmtcachesize": pool.stmtcachesize,
+        "ping_interval": pool.ping_interval,
+        "timeout": pool.timeout,
+        "wait_timeout": pool.wait_timeout,
+    }
+
+
+def pool_stats() -> dict[str, Any]:
+    """プールの利用状況（未生成なら created=False）。thin モードでは async プールも含む。"""
+    stats = _stats(_POOL)
+    if is_thin_mode():
+        stats["async"] = _stats(_ASYNC_POOL)
+    return stats
 
-    return oracledb.connect(user=user, password=password, dsn=dsn)
 
 # 疎通確認
 def ping() -> int:
@@ -0,0 +1,382 @@
+# マスタ参照 GET の HTTP キャッシュ（ETag / Cache-Control / 304）
+"""
+/api/customers/{tcode} などのコード参照は、参照するビューの版（version stamp）と URL から
+ETag を作り、If-None-Match が一致すれば DB に触れずに 304 を返す。
+
+- 版はビュー単位。次のどれかで変わる
+  - 名称索引（name_index）の再読込やマスタスナップショットの切り替えで、
+    読み込んだ行（コード参照 API が返すのと同じ列）の指紋が変わったとき
+  - HTTP_CACHE_UPDATED_COLUMN を設定した場合、HTTP_CACHE_POLL_SEC 毎の
+    COUNT(*) / MAX(更新日時列) が変わったとき
+  - POST /api/http_cache/flush（マスタ更新後に手動で）
+- 指紋がまだ無いビューには版が無い。規則のビューが1つでも版を持たなければ、その規則の
+  応答には ETag を付けず 304 も返さない（変更を検知できない内容を使い回させない）
+- flush は <MASTER_SNAPSHOT_DIR>/http_cache_flush.json にビュー毎の値を書く。各ワーカーは
+  このファイルを1秒毎に確認して版に混ぜるので、どのワーカーで flush しても全ワーカーに効く
+- Cache-Control は規則毎に HTTP_CACHE_MAX_AGE_<規則名>（0 なら毎回再検証）
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| HTTP_CACHE_ENABLED | true | false でヘッダを付けず常に 200 |
+| HTTP_CACHE_MAX_AGE_CUSTOMERS / _SHIPTO / _MAKERS / _PRODUCTS / _UNITS | 60 | 規則毎の max-age 秒 |
+| HTTP_CACHE_UPDATED_COLUMN | (なし) | 版の確認に使う各ビューの更新日時列。未設定なら確認しない |
+| HTTP_CACHE_POLL_SEC | 300 | 更新日時列の確認間隔 |
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from app.settings import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+# 検索・一括参照など、コード参照ではないパス
+_NOT_CODES = r"(?!(?:search|lookup|units)$)[^/]+"
+
+FLUSH_FILE = "http_cache_flush.json"
+# flush ファイルの確認間隔（リクエスト処理中に stat するので間を空ける）
+_FLUSH_CHECK_SEC = 1.0
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    name: str
+    pattern: re.Pattern
+    views: tuple[str, ...]
+
+    def max_age(self) -> int:
+        return max(env_int(f"HTTP_CACHE_MAX_AGE_{self.name.upper()}", 60), 0)
+
+
+RULES: tuple[CacheRule, ...] = (
+    CacheRule("customers", re.compile(rf"^/api/customers/{_NOT_CODES}$"), ("得意先マスタV",)),
+    CacheRule("shipto", re.compile(rf"^/api/shipto/{_NOT_CODES}$"), ("得意先マスタV",)),
+    CacheRule("makers", re.compile(rf"^/api/makers/{_NOT_CODES}$"), ("メーカマスタV",)),
+    CacheRule("units", re.compile(r"^/api/products/units$"), ("商品入数マスタV", "単位マスタV")),
+    CacheRule("products", re.compile(rf"^/api/products/{_NOT_CODES}$"), ("商品マスタV", "メーカマスタV", "仕入先マスタV")),
+)
+
+ALL_VIEWS: tuple[str, ...] = tuple(dict.fromkeys(v for rule in RULES for v in rule.views))
+
+
+class ViewVersions:
+    """
+    ビュー名 → 版。版は指紋の提供元（索引・スナップショット・確認）毎の指紋と flush の値から
+    作るので、指紋と flush が同じなら版も同じ（複数ワーカーでも同じ ETag になる）。
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[str, str] = {}
+        self._fingerprints: dict[str, dict[str, str]] = {}
+        self._flushes: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def get(self, view: str) -> Optional[str]:
+        """指紋がまだ無いビューは None。"""
+        return self._versions.get(view)
+
+    def _rebuild(self, view: str) -> None:
+        sources = self._fingerprints.get(view)
+        if not sources:
+            self._versions.pop(view, None)
+            return
+        h = hashlib.blake2b(digest_size=8)
+        for name in sorted(sources):
+            h.update(f"{name}={sources[name]};".encode("utf-8"))
+        h.update(f"flush={self._flushes.get(view, '')}".encode("utf-8"))
+        self._versions[view] = h.hexdigest()
+        self.bumps += 1
+
+    def set_fingerprint(self, view: str, fingerprint: str, source: str = "") -> bool:
+        """source からの指紋が変わったら版を更新して True。"""
+        with self._lock:
+            sources = self._fingerprints.setdefault(view, {})
+            if sources.get(source) == fingerprint:
+                return False
+            sources[source] = fingerprint
+            self._rebuild(view)
+            return True
+
+    def set_flushes(self, flushes: dict[str, str]) -> list[str]:
+        """flush ファイルの内容（ビュー → 値）を反映する。値が変わったビューを返す。"""
+        with self._lock:
+            changed = [v for v in set(flushes) | set(self._flushes) if flushes.get(v) != self._flushes.get(v)]
+            self._flushes = dict(flushes)
+            for view in changed:
+                self._rebuild(view)
+            return sorted(changed)
+
+    def snapshot(self) -> dict[str, Optional[str]]:
+        return {view: self.get(view) for view in ALL_VIEWS}
+
+
+_VERSIONS = ViewVersions()
+
+
+def view_versions() -> ViewVersions:
+    return _VERSIONS
+
+
+class RowsFingerprint:
+    """rows_fingerprint を fetchmany の単位で足していく版（全件をリストにしない）。"""
+
+    def __init__(self) -> None:
+        self._h = hashlib.blake2b(digest_size=16)
+
+    def update(self, rows: Iterable[tuple]) -> None:
+        for row in rows:
+            self._h.update(repr(row).encode("utf-8"))
+            self._h.update(b"\n")
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+def rows_fingerprint(rows: Iterable[tuple]) -> str:
+    fp = RowsFingerprint()
+    fp.update(rows)
+    return fp.hexdigest()
+
+
+def note_view_rows(view: str, rows: Iterable[tuple], source: str = "") -> None:
+    """索引の読み込み時に呼ぶ。読んだ行が前回と違えばそのビューの ETag を無効にする。"""
+    note_view_fingerprint(view, rows_fingerprint(rows), source)
+
+
+def note_view_fingerprint(view: str, fingerprint: str, source: str = "") -> None:
+    if _VERSIONS.set_fingerprint(view, fingerprint, source):
+        logger.info("http_cache: %s version=%s", view, _VERSIONS.get(view))
+
+
+# ---- flush（ワーカー間で共有するファイル）----
+
+def flush_file_path() -> Path:
+    from app.master_snapshot import snapshot_dir
+
+    return snapshot_dir() / FLUSH_FILE
+
+
+def read_flush_file(path: Path) -> dict[str, str]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"{path.name} is not an object")
+    return {str(view): str(value) for view, value in data.items()}
+
+
+class _FlushFile:
+    """flush ファイルを間隔を空けて確認し、変わっていれば _VERSIONS に反映する。"""
+
+    def __init__(self) -> None:
+        self._checked = 0.0
+        self._stamp: Optional[tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked < _FLUSH_CHECK_SEC:
+            return
+        with self._lock:
+            if not force and now - self._checked < _FLUSH_CHECK_SEC:
+                return
+            self._checked = now
+            path = flush_file_path()
+            try:
+                st = path.stat()
+                stamp: Optional[tuple[int, int]] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp == self._stamp:
+                return
+            try:
+                flushes = read_flush_file(path) if stamp is not None else {}
+            except (OSError, ValueError) as exc:
+                logger.warning("http_cache: read %s failed: %s", path.name, exc)
+                return
+            self._stamp = stamp
+            changed = _VERSIONS.set_flushes(flushes)
+        if changed:
+            logger.info("http_cache: flushed %s", ", ".join(changed))
+
+
+_FLUSH = _FlushFile()
+_FLUSH_WRITE_LOCK = threading.Lock()
+
+
+def flush_views(views: Optional[list[str]] = None) -> list[str]:
+    """指定ビュー（省略時は全て）の版を全ワーカーで変える。変えたビュー名を返す。"""
+    targets = [v for v in ALL_VIEWS if not views or v in views]
+    if not targets:
+        return targets
+    path = flush_file_path()
+    value = secrets.token_hex(8)
+    with _FLUSH_WRITE_LOCK:
+        try:
+            flushes = read_flush_file(path)
+        except FileNotFoundError:
+            flushes = {}
+        except ValueError:
+            # 壊れていれば作り直す（全ビューの版が変わるだけ）
+            flushes = {}
+        flushes.update({view: value for view in targets})
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{FLUSH_FILE}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(flushes, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    _FLUSH.sync(force=True)
+    return targets
+
+
+def http_cache_enabled() -> bool:
+    return env_bool("HTTP_CACHE_ENABLED", True)
+
+
+def match_rule(method: str, path: str) -> Optional[CacheRule]:
+    if method not in ("GET", "HEAD"):
+        return None
+    for rule in RULES:
+        if rule.pattern.match(path):
+            return rule
+    return None
+
+
+def make_etag(rule: CacheRule, path: str, query: bytes) -> Optional[str]:
+    """規則のビューが1つでも版を持たなければ None（ETag を付けない）。"""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(path.encode("utf-8"))
+    h.update(b"?" + query)
+    for view in rule.views:
+        version = _VERSIONS.get(view)
+        if version is None:
+            return None
+        h.update(b"|" + version.encode("ascii"))
+    return f'W/"{h.hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # W/ の有無は弱い比較なので無視する
+    want = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == want for tag in if_none_match.split(","))
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.not_modified = 0
+        self.full = 0
+        self.unversioned = 0
+
+
+_STATS = _Stats()
+
+
+class HttpCacheMiddleware:
+    """RULES に一致する GET に ETag / Cache-Control を付け、If-None-Match が一致すれば 304。"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not http_cache_enabled():
+            await self.app(scope, receive, send)
+            return
+        rule = match_rule(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        _FLUSH.sync()
+        etag = make_etag(rule, scope["path"], scope.get("query_string", b""))
+        if etag is None:
+            _STATS.unversioned += 1
+            await self.app(scope, receive, send)
+            return
+        cache_control = f"private, max-age={rule.max_age()}" if rule.max_age() else "private, no-cache"
+        cache_headers = [(b"etag", etag.encode("ascii")), (b"cache-control", cache_control.encode("ascii"))]
+
+        if_none_match = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"if-none-match"), None)
+        if if_none_match and _etag_matches(if_none_match, etag):
+            _STATS.not_modified += 1
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message = {**message, "headers": [*message.get("headers", []), *cache_headers]}
+            await send(message)
+
+        _STATS.full += 1
+        await self.app(scope, receive, send_with_headers)
+
+
+# ---- 更新日時列による版の確認 ----
+
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+
+
+def _poll_views(cur, updated_col: str) -> None:
+    for view in ALL_VIEWS:
+        try:
+            cur.execute(f"SELECT COUNT(*), MAX({updated_col}) FROM {view}")
+            note_view_rows(view, [cur.fetchone()], "poll")
+        except Exception as exc:
+            logger.warning("http_cache: poll %s failed: %s", view, exc)
+
+
+def _poll_loop(updated_col: str) -> None:
+    from app.db import get_conn
+
+    interval = env_float("HTTP_CACHE_POLL_SEC", 300)
+    while not _STOP.is_set():
+        try:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    _poll_views(cur, updated_col)
+        except Exception as exc:
+            logger.warning("http_cache: poll failed: %s", exc)
+        _STOP.wait(interval)
+
+
+def start_http_cache() -> None:
+    global _THREAD
+    updated_col = env_str("HTTP_CACHE_UPDATED_COLUMN")
+    if not http_cache_enabled() or not updated_col or _THREAD is not None:
+        return
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_poll_loop, args=(updated_col,), name="http-cache-poll", daemon=True)
+    _THREAD.start()
+
+
+def stop_http_cache() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+
+
+def http_cache_stats() -> dict[str, Any]:
+    return {
+        "enabled": http_cache_enabled(),
+        "not_modified": _STATS.not_modified,
+        "full": _STATS.full,
+        "unversioned": _STATS.unversioned,
+        "version_bumps": _VERSIONS.bumps,
+        "versions": _VERSIONS.snapshot(),
+        "max_age": {rule.name: rule.max_age() for rule in RULES},
+        "poll_column": env_str("HTTP_CACHE_UPDATED_COLUMN") or None,
+        "flush_file": str(flush_file_path()),
+    }
@@ -7,44 +7,32 @@ app/main.py
 """
 
 import os
-import time
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from fastapi.responses import Response
+from fastapi import FastAPI, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.logging_config import setup_logging
 from app.routes import api_router
 
-from app.schemas import OrderRequestV2
-from app.pdf import build_order_pdf_bytes
-from app.db import get_conn
-
-
-def _fetch_supplier_names(codes: set[str]) -> dict[str, str]:
-  if not codes:
-    return {}
-
-  params = {}
-  placeholders = []
-  for idx, code in enumerate(sorted(codes)):
-    key = f"code{idx}"
-    placeholders.append(f":{key}")
-    params[key] = code
-
-  sql = f"""
-    SELECT 仕入先コード, 仕入先名
-      FROM 仕入先マスタV
-     WHERE 仕入先コード IN ({", ".join(placeholders)})
-  """
-
-  with get_conn() as conn:
-    with conn.cursor() as cur:
-      cur.execute(sql, params)
-      return {row[0]: (row[1] or "") for row in cur.fetchall()}
+from app.db import close_pool, close_async_pool, pool_stats
+from app.concurrency import limit_stats
+from app.price_index import start_price_index, stop_price_index
+from app.pdf_pool import open_pdf_executor, pdf_pool_stats, shutdown_pdf_executor
+from app.pdf_jobs import pdf_jobs_stats, start_pdf_jobs, stop_pdf_jobs
+from app.pdf_cache import pdf_cache_stats
+from app.name_index import name_index_stats, start_name_index, stop_name_index
+from app.product_index import product_index_stats, start_product_index, stop_product_index
+from app.search_cache import get_search_cache
+from app.master_snapshot import master_snapshot_stats, start_master_snapshot, stop_master_snapshot
+from app.repository import repository_stats
+from app.supplier_cache import start_supplier_cache, stop_supplier_cache, supplier_cache_stats
+from app.metrics import MetricsMiddleware, render_metrics
+from app.http_cache import HttpCacheMiddleware, flush_views, http_cache_stats, start_http_cache, stop_http_cache
 
 
 setup_logging()
@@ -54,7 +42,35 @@ load_dotenv()
 logger.info("ORACLE_USER exists? %s", "ORACLE_USER" in os.environ)
 
 
-app = FastAPI(title="Order PDF API")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+  open_pdf_executor()
+  start_master_snapshot()
+  start_price_index()
+  start_name_index()
+  start_product_index()
+  start_pdf_jobs()
+  start_supplier_cache()
+  start_http_cache()
+  yield
+  stop_http_cache()
+  stop_supplier_cache()
+  stop_pdf_jobs()
+  stop_product_index()
+  stop_name_index()
+  stop_price_index()
+  stop_master_snapshot()
+  shutdown_pdf_executor()
+  await close_async_pool()
+  close_pool()
+
+
+app = FastAPI(title="Order PDF API", lifespan=lifespan)
+
+# マスタのコード参照に ETag / Cache-Control（If-None-Match 一致なら DB に触れず 304）
+app.add_middleware(HttpCacheMiddleware)
+# 最後に追加したものが最も外側。304 も含めて全リクエストを計測する
+app.add_middleware(MetricsMiddleware)
 
 # APIはrouterに集約
 app.include_router(api_router, prefix="/api")
@@ -73,80 +89,60 @@ def health():
   return {"ok": True}
 
 
-@app.post("/api/orders/pdf_v2")
-def create_order_pdf_v2(req: OrderRequestV2):
-
-  start_all = time.perf_counter()
-  logger.info("PDF(v2) generation started")
-
-  header = req.header.model_dump()
-  missing_supplier_codes = {
-    it.supplier_code for it in req.items
-    if (it.supplier_code not in (None, "")) and not (it.supplier_name and it.supplier_name.strip())
-  }
-  supplier_name_map: dict[str, str] = {}
-  if missing_supplier_codes:
-    try:
-      supplier_name_map = _fetch_supplier_names(missing_supplier_codes)
-    except Exception as exc:  # pragma: no cover - defensive
-      logger.warning("Supplier name lookup failed: %s", exc)
-
-  pdf_header = {
-    "order_date": header.get("order_date"),
-    "delivery_date": header.get("delivery_date"),
- #   "nyuka_shidai": header.get("nyuka_shidai"),
- #   "drafter_name": header.get("drafter_name"),
-    "customer_cd": header.get("customer_cd") or header.get("tcode"),
-    "customer_name": header.get("customer_name"),
-    "tantou_cd": header.get("tantou_cd"),
-    "tantou_name": header.get("tantou_name"),
-    "shipto_cd": header.get("shipto_cd") or header.get("jcode"),
-    "shipto_name": header.get("shipto_name"),
-    "order_no": header.get("order_no"),
-  }
-
-  pdf_items = []
-  for it in req.items:
-    qty = it.qty
-    sales_unit_price = it.price
-    sales_amount = it.sales_amount
-    if sales_amount is None and sales_unit_price is not None:
-      sales_amount = sales_unit_price * qty
-
-    buy_amount = it.purchase_amount
-    if buy_amount is None and it.purchase_price is not None:
-      buy_amount = it.purchase_price * qty
-
-    supplier_name = it.supplier_name or supplier_name_map.get(it.supplier_code or "", "")
-
-    pdf_items.append({
-      "item_name": it.name,
-      "qty": qty,
-      "sales_unit_price": sales_unit_price,
-      "sales_amount": sales_amount,
-      "spec": it.spec,
-      "unit_name": it.unit_name,
-      "irisu_name": it.irisu_name,
-      "buy_unit_price": it.purchase_price,
-      "buy_amount": buy_amount,
-      "item_cd": it.scode,
-      "supplier_cd": it.supplier_code,
-      "supplier_name": supplier_name,
-      "delivery_place_cd": it.delivery_place_cd,
-      "delivery_place_name": it.delivery_place_name,
-      "line_note": it.line_note,
-    })
-
-  start_pdf = time.perf_counter()
-  pdf_bytes = build_order_pdf_bytes(header=pdf_header, items=pdf_items)
-  pdf_time = time.perf_counter() - start_pdf
-  logger.info("PDF(v2) build finished: %.3f sec", pdf_time)
-
-  total_time = time.perf_counter() - start_all
-  logger.info("PDF(v2) generation completed: %.3f sec", total_time)
-
-  filename = f"order_{req.header.order_date}.pdf"
-  headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-  return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+@app.get("/api/health/pool")
+def health_pool():
+  return {**pool_stats(), "limits": limit_stats(), "pdf_pool": pdf_pool_stats(), "pdf_jobs": pdf_jobs_stats()}
+
+
+@app.get("/api/health/pdf_cache")
+def health_pdf_cache():
+  return pdf_cache_stats()
+
+
+@app.get("/api/health/name_index")
+def health_name_index():
+  return name_index_stats()
+
+
+@app.get("/api/health/product_index")
+def health_product_index():
+  return product_index_stats()
+
+
+@app.get("/api/health/search_cache")
+def health_search_cache():
+  return get_search_cache().stats()
+
+
+@app.get("/api/health/master_snapshot")
+def health_master_snapshot():
+  return master_snapshot_stats()
+
+
+@app.get("/api/health/repository")
+def health_repository():
+  return repository_stats()
+
+
+@app.get("/api/health/supplier_cache")
+def health_supplier_cache():
+  return supplier_cache_stats()
+
+
+@app.get("/api/metrics")
+def metrics():
+  return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/health/http_cache")
+def health_http_cache():
+  return http_cache_stats()
+
+
+@app.post("/api/http_cache/flush")
+def http_cache_flush(view: list[str] = Query(None, description="このビューの版だけ変える（省略時は全て）")):
+  """マスタ更新後に呼ぶ。以降のコード参照は 304 にならず新しい内容を返す"""
+  return {"flushed": flush_views(view)}
+
 
 app.mount("/", StaticFiles(directory=str(STATIC_DIR), html=True), name="ui")
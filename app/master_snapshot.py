@@ -0,0 +1,549 @@
+# マスタのローカルスナップショット（SQLite、ワーカー間で共有）
+"""
+得意先・メーカ・仕入先・商品・単位入数を Oracle から SQLite ファイルに書き出し、
+コード参照（/customers/{tcode}、/products/lookup、仕入先名の補完など）はまずここを引く。
+
+- ファイルは <MASTER_SNAPSHOT_DIR>/master-<日時>-<pid>.sqlite。書き終えてから
+  CURRENT（ファイル名だけを書いたポインタ）を os.replace で差し替える（版の切り替えは原子的）
+- 読み手は immutable な読み取り専用接続 + mmap なので、ロックを取らず、ページは OS の
+  ページキャッシュ経由で複数の uvicorn ワーカーに共有される
+- 各ワーカーは MASTER_SNAPSHOT_CHECK_SEC 毎に CURRENT を見て、新しい版を開いて参照を差し替える
+  （古い版の接続は次の差し替えまで閉じない。処理中の読み取りを妨げない）
+- 作成は build.lock を排他作成できた1プロセスだけが行う。起動時にスナップショットが無い、
+  または MASTER_SNAPSHOT_REFRESH_SEC より古ければ作り直す
+- 未ヒットのコードは呼び出し側が SQL で引く（スナップショット作成後に追加されたマスタも引ける）
+- MASTER_SNAPSHOT_PRICES が true なら単価ビュー5つも書き出し、単価決定（需商→得商→定価）も
+  ここで行える（DATA_BACKEND=replica のローカルレプリカ。app.repository）
+
+デプロイ時に作っておく（ウォームアップ）:
+
+    python -m app.master_snapshot build
+    python -m app.master_snapshot info
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| MASTER_SNAPSHOT_ENABLED | true | false でスナップショットを使わず常に SQL |
+| MASTER_SNAPSHOT_DIR | var/master_snapshot | 保存先（ワーカー間で共有するローカルディスク） |
+| MASTER_SNAPSHOT_BUILD | true | false ならこのプロセスでは作らない（別途 build コマンドで作る運用） |
+| MASTER_SNAPSHOT_REFRESH_SEC | 600 | この秒数より古ければ作り直す |
+| MASTER_SNAPSHOT_CHECK_SEC | 30 | CURRENT の確認間隔 |
+| MASTER_SNAPSHOT_KEEP | 3 | 残す版の数（開いている版は削除に失敗しても次回に再試行） |
+| MASTER_SNAPSHOT_PRICES | (DATA_BACKEND=replica なら true) | 単価ビューも書き出す |
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from app.http_cache import RowsFingerprint, note_view_fingerprint
+from app.pricing import PricingKey, PricingResult, pick_pricing
+from app.settings import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "build.lock"
+# 作成途中で落ちたプロセスのロックはこの秒数で無視する
+_LOCK_STALE_SEC = 1800
+# SQLite の IN (?, ...) 1回あたりのコード数
+_CHUNK_SIZE = 500
+_MMAP_BYTES = 256 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class _Table:
+    sql: str
+    ddl: str
+    columns: int
+    views: tuple[str, ...]
+    # 先頭 keys 列（コード）の変換。SQLite 側は型を変換しないので参照時の型に揃えておく
+    key: Callable[[Any], Any] = str
+    keys: int = 1
+    # 同一キーの行が複数あれば先勝ち（price_index と同じ）。False なら後勝ち
+    first_wins: bool = False
+
+
+def _price_code(v: Any) -> str:
+    """単価ビューのキー（NUMBER / VARCHAR）とリクエストの文字列をそろえる（前後の空白は除く）。"""
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+_TABLES: dict[str, _Table] = {
+    "customers": _Table(
+        "SELECT 得意先コード, 得意先名 FROM 得意先マスタV ORDER BY 得意先コード",
+        "CREATE TABLE customers (code PRIMARY KEY, name) WITHOUT ROWID",
+        2, ("得意先マスタV",), key=int,
+    ),
+    "makers": _Table(
+        "SELECT メーカコード, 社内用メーカ名 FROM メーカマスタV ORDER BY メーカコード",
+        "CREATE TABLE makers (code PRIMARY KEY, name) WITHOUT ROWID",
+        2, ("メーカマスタV",),
+    ),
+    "suppliers": _Table(
+        "SELECT 仕入先コード, 仕入先名 FROM 仕入先マスタV ORDER BY 仕入先コード",
+        "CREATE TABLE suppliers (code PRIMARY KEY, name) WITHOUT ROWID",
+        2, ("仕入先マスタV",),
+    ),
+    # 列順は routes/products.py の get_product（_PRODUCT_COLS）と同じ
+    "products": _Table(
+        """
+        SELECT
+            M_商品.商品コード,
+            M_商品.メーカコード,
+            M_メカ.社内用メーカ名,
+            M_商品.商品名,
+            M_商品.メーカ品番,
+            M_商品.規格,
+            M_商品.仕入先コード,
+            M_仕入.仕入先名
+          FROM 商品マスタV M_商品
+          LEFT JOIN メーカマスタV M_メカ
+            ON M_商品.メーカコード = M_メカ.メーカコード
+          LEFT JOIN 仕入先マスタV M_仕入
+            ON M_商品.仕入先コード = M_仕入.仕入先コード
+         ORDER BY M_商品.商品コード
+        """,
+        "CREATE TABLE products (code PRIMARY KEY, maker_cd, maker_name, product_name, maker_part_no, spec, "
+        "supplier_code, supplier_name) WITHOUT ROWID",
+        8, ("商品マスタV",),
+    ),
+    # 列順は app.repository の SQL_UNITS_BY_KEYS と同じ。商品毎に 順序 の昇順で入れる
+    "units": _Table(
+        """
+        SELECT 入数.商品コード, 単位.単位名, 入数.入数名, 入数.入数ランク
+          FROM 商品入数マスタV 入数
+          LEFT JOIN 単位マスタV 単位 ON (入数.単位コード = 単位.単位コード)
+         ORDER BY 入数.商品コード, 入数.順序
+        """,
+        "CREATE TABLE units (product_cd, unit_name, irisu_name, irisu_rank)",
+        4, ("商品入数マスタV", "単位マスタV"),
+    ),
+}
+
+# 単価ビュー（MASTER_SNAPSHOT_PRICES のときだけ）。列は pick_pricing の tier の値
+_PRICE_TABLES: dict[str, _Table] = {
+    "price_ju": _Table(
+        "SELECT 得意先コード, 需要先コード, 商品コード, 入数ランク, 売上単価 FROM 需要先商品売上単価マスタV",
+        "CREATE TABLE price_ju (tcode, jcode, scode, irank, sales_price, "
+        "PRIMARY KEY (tcode, jcode, scode, irank)) WITHOUT ROWID",
+        5, ("需要先商品売上単価マスタV",), key=_price_code, keys=4, first_wins=True,
+    ),
+    "price_js": _Table(
+        "SELECT 得意先コード, 需要先コード, 商品コード, 入数ランク, CAST(仕入先コード AS VARCHAR2(20)), 仕入単価 "
+        "FROM 需要先商品仕入単価マスタV",
+        "CREATE TABLE price_js (tcode, jcode, scode, irank, supplier_code, purchase_price, "
+        "PRIMARY KEY (tcode, jcode, scode, irank)) WITHOUT ROWID",
+        6, ("需要先商品仕入単価マスタV",), key=_price_code, keys=4, first_wins=True,
+    ),
+    "price_tu": _Table(
+        "SELECT 得意先コード, 商品コード, 入数ランク, 売上単価 FROM 得意先商品売上単価マスタV",
+        "CREATE TABLE price_tu (tcode, scode, irank, sales_price, PRIMARY KEY (tcode, scode, irank)) WITHOUT ROWID",
+        4, ("得意先商品売上単価マスタV",), key=_price_code, keys=3, first_wins=True,
+    ),
+    "price_ts": _Table(
+        "SELECT 得意先コード, 商品コード, 入数ランク, CAST(仕入先コード AS VARCHAR2(20)), 仕入単価 "
+        "FROM 得意先商品仕入単価マスタV",
+        "CREATE TABLE price_ts (tcode, scode, irank, supplier_code, purchase_price, "
+        "PRIMARY KEY (tcode, scode, irank)) WITHOUT ROWID",
+        5, ("得意先商品仕入単価マスタV",), key=_price_code, keys=3, first_wins=True,
+    ),
+    "price_teika": _Table(
+        "SELECT 商品コード, 入数ランク, 定価, 売上単価, 仕入単価 FROM 商品単価マスタV",
+        "CREATE TABLE price_teika (scode, irank, teika, sales_price, purchase_price, "
+        "PRIMARY KEY (scode, irank)) WITHOUT ROWID",
+        5, ("商品単価マスタV",), key=_price_code, keys=2, first_wins=True,
+    ),
+}
+
+# キー1つ分の tier を pick_pricing の行形式 (定価, 売上単価, 仕入先コード, 仕入単価) で引く
+_SQL_PRICE_TIERS = """
+SELECT 'ju', NULL, sales_price, NULL, NULL FROM price_ju
+ WHERE tcode = :t AND jcode = :j AND scode = :s AND irank = :r
+UNION ALL
+SELECT 'js', NULL, NULL, supplier_code, purchase_price FROM price_js
+ WHERE tcode = :t AND jcode = :j AND scode = :s AND irank = :r
+UNION ALL
+SELECT 'tu', NULL, sales_price, NULL, NULL FROM price_tu WHERE tcode = :t AND scode = :s AND irank = :r
+UNION ALL
+SELECT 'ts', NULL, NULL, supplier_code, purchase_price FROM price_ts WHERE tcode = :t AND scode = :s AND irank = :r
+UNION ALL
+SELECT 'teika', teika, sales_price, NULL, purchase_price FROM price_teika WHERE scode = :s AND irank = :r
+"""
+
+
+def snapshot_enabled() -> bool:
+    return env_bool("MASTER_SNAPSHOT_ENABLED", True)
+
+
+def snapshot_dir() -> Path:
+    return Path(env_str("MASTER_SNAPSHOT_DIR", str(PROJECT_DIR / "var" / "master_snapshot")))
+
+
+def prices_enabled() -> bool:
+    return env_bool("MASTER_SNAPSHOT_PRICES", env_str("DATA_BACKEND", "oracle").lower() == "replica")
+
+
+def _tables() -> dict[str, _Table]:
+    """書き出すテーブル。"""
+    return {**_TABLES, **_PRICE_TABLES} if prices_enabled() else dict(_TABLES)
+
+
+# ---- 作成 ----
+
+def build_snapshot(cur, directory: Path) -> Path:
+    """Oracle から全テーブルを書き出し、CURRENT を差し替える。作成したファイルのパスを返す。"""
+    start = time.perf_counter()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"master-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.sqlite"
+    tmp = directory / (name + ".tmp")
+    db = sqlite3.connect(tmp)
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute("CREATE TABLE meta (key PRIMARY KEY, value) WITHOUT ROWID")
+        meta: list[tuple[str, Any]] = []
+        cur.arraysize = 5000
+        for table, spec in _tables().items():
+            cur.execute(spec.sql)
+            db.execute(spec.ddl)
+            insert = (
+                f"INSERT OR {'IGNORE' if spec.first_wins else 'REPLACE'} INTO {table} "
+                f"VALUES ({', '.join('?' * spec.columns)})"
+            )
+            # 単価ビューは件数が多いので fetchmany の単位で書き込む（全件をリストにしない）
+            fingerprint = RowsFingerprint()
+            count = 0
+            while True:
+                rows = cur.fetchmany()
+                if not rows:
+                    break
+                fingerprint.update(rows)
+                count += len(rows)
+                db.executemany(insert, ((*map(spec.key, r[:spec.keys]), *r[spec.keys:]) for r in rows))
+            meta += [(f"rows.{table}", count), (f"fingerprint.{table}", fingerprint.hexdigest())]
+        db.execute("CREATE INDEX units_product ON units (product_cd)")
+        meta.append(("built_at", time.time()))
+        db.executemany("INSERT INTO meta VALUES (?, ?)", meta)
+        db.commit()
+    finally:
+        db.close()
+
+    path = directory / name
+    os.replace(tmp, path)
+    pointer = directory / (CURRENT_FILE + f".{os.getpid()}.tmp")
+    pointer.write_text(name, encoding="utf-8")
+    os.replace(pointer, directory / CURRENT_FILE)
+    logger.info("master_snapshot built: %s %.3f sec", name, time.perf_counter() - start)
+    _cleanup(directory, keep=max(env_int("MASTER_SNAPSHOT_KEEP", 3), 1))
+    return path
+
+
+def _cleanup(directory: Path, keep: int) -> None:
+    current = _read_pointer(directory)
+    files = sorted(directory.glob("master-*.sqlite"), reverse=True)
+    for path in files[keep:]:
+        if path.name == current:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            # Windows では開いている版は消せない。次回に再試行する
+            pass
+    for path in directory.glob("*.tmp"):
+        try:
+            if time.time() - path.stat().st_mtime > _LOCK_STALE_SEC:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _read_pointer(directory: Path) -> Optional[str]:
+    try:
+        return (directory / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _try_lock(directory: Path) -> bool:
+    path = directory / LOCK_FILE
+    directory.mkdir(parents=True, exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - path.stat().st_mtime <= _LOCK_STALE_SEC:
+                    return False
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            continue
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        return True
+    return False
+
+
+def _unlock(directory: Path) -> None:
+    try:
+        (directory / LOCK_FILE).unlink()
+    except FileNotFoundError:
+        pass
+
+
+# ---- 参照 ----
+
+class MasterSnapshot:
+    """1つの版（読み取り専用）。メソッドは見つかったコードだけを dict で返す。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={_MMAP_BYTES}")
+        self.meta: dict[str, Any] = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def built_at(self) -> float:
+        return float(self.meta.get("built_at") or 0)
+
+    @property
+    def has_prices(self) -> bool:
+        return all(f"rows.{t}" in self.meta for t in _PRICE_TABLES)
+
+    def fingerprint(self, table: str) -> Optional[str]:
+        return self.meta.get(f"fingerprint.{table}")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _select(self, sql: str, codes: list) -> list[tuple]:
+        rows: list[tuple] = []
+        for start in range(0, len(codes), _CHUNK_SIZE):
+            chunk = codes[start:start + _CHUNK_SIZE]
+            rows += self._conn.execute(sql.format(keys=", ".join("?" * len(chunk))), chunk).fetchall()
+        return rows
+
+    def _names(self, table: str, codes: Iterable[Any]) -> dict[Any, Any]:
+        codes = list(dict.fromkeys(codes))
+        found = dict(self._select(f"SELECT code, name FROM {table} WHERE code IN ({{keys}})", codes))
+        self._count(len(found), len(codes))
+        return found
+
+    def _count(self, found: int, total: int) -> None:
+        self.hits += found
+        self.misses += total - found
+
+    def customer_names(self, codes: Iterable[int]) -> dict[int, Any]:
+        return self._names("customers", codes)
+
+    def maker_names(self, codes: Iterable[str]) -> dict[str, Any]:
+        return self._names("makers", codes)
+
+    def supplier_names(self, codes: Iterable[str]) -> dict[str, Any]:
+        return self._names("suppliers", codes)
+
+    def products(self, codes: Iterable[str]) -> dict[str, tuple]:
+        """商品コード → get_product の列順の行。"""
+        codes = list(dict.fromkeys(codes))
+        found = {r[0]: r[1:] for r in self._select("SELECT * FROM products WHERE code IN ({keys})", codes)}
+        self._count(len(found), len(codes))
+        return found
+
+    def units(self, codes: Iterable[str]) -> dict[str, list[tuple]]:
+        """商品コード → 単位の行（get_units の列順）。商品が無いコードは含まない（単位の無い商品は []）。"""
+        codes = list(dict.fromkeys(codes))
+        found: dict[str, list[tuple]] = {
+            r[0]: [] for r in self._select("SELECT code FROM products WHERE code IN ({keys})", codes)
+        }
+        sql = "SELECT product_cd, unit_name, irisu_name, irisu_rank FROM units WHERE product_cd IN ({keys}) ORDER BY rowid"
+        for r in self._select(sql, list(found)):
+            found[r[0]].append(r[1:])
+        self._count(len(found), len(codes))
+        return found
+
+    def pricing(self, keys: Iterable[PricingKey]) -> dict[PricingKey, PricingResult]:
+        """単価ビューから SQL_PRICE_PICK と同じ優先順位で決める（has_prices の版だけ）。"""
+        found: dict[PricingKey, PricingResult] = {}
+        for key in dict.fromkeys(keys):
+            params = {
+                "t": _price_code(key.tcode), "j": _price_code(key.jcode),
+                "s": _price_code(key.scode), "r": _price_code(key.irank),
+            }
+            tiers: dict[str, tuple] = {}
+            for tag, *row in self._conn.execute(_SQL_PRICE_TIERS, params):
+                tiers.setdefault(tag, tuple(row))
+            found[key] = pick_pricing(tiers)
+        self._count(len(found), len(found))
+        return found
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "file": self.path.name,
+            "built_at": self.built_at,
+            "prices": self.has_prices,
+            "rows": {t: self.meta[f"rows.{t}"] for t in {**_TABLES, **_PRICE_TABLES} if f"rows.{t}" in self.meta},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_CURRENT: Optional[MasterSnapshot] = None
+# 差し替え直後も読み取り中かもしれないので、1世代前は次の差し替えまで閉じない
+_PREVIOUS: Optional[MasterSnapshot] = None
+_SWAP_LOCK = threading.Lock()
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+_LAST_ERROR: Optional[str] = None
+
+
+def get_master_snapshot() -> Optional[MasterSnapshot]:
+    """開いている版。未作成・無効なら None（SQL 経路を使う）。"""
+    return _CURRENT
+
+
+def _swap_to_current(directory: Path) -> bool:
+    """CURRENT が今の版と違えば開いて差し替える。差し替えたら True。"""
+    global _CURRENT, _PREVIOUS
+    name = _read_pointer(directory)
+    if name is None or (_CURRENT is not None and _CURRENT.path.name == name):
+        return False
+    snap = MasterSnapshot(directory / name)
+    with _SWAP_LOCK:
+        if _PREVIOUS is not None:
+            _PREVIOUS.close()
+        _PREVIOUS, _CURRENT = _CURRENT, snap
+    for table, spec in {**_TABLES, **_PRICE_TABLES}.items():
+        fingerprint = snap.fingerprint(table)
+        if fingerprint:
+            for view in spec.views:
+                note_view_fingerprint(view, fingerprint, "master_snapshot")
+    logger.info("master_snapshot opened: %s", name)
+    return True
+
+
+def _build_due() -> bool:
+    if not env_bool("MASTER_SNAPSHOT_BUILD", True):
+        return False
+    snap = _CURRENT
+    return snap is None or time.time() - snap.built_at >= env_float("MASTER_SNAPSHOT_REFRESH_SEC", 600)
+
+
+def _build_locked(directory: Path) -> None:
+    from app.db import get_conn
+
+    if not _try_lock(directory):
+        return
+    try:
+        # ロック待ちの間に他のワーカーが作っていれば何もしない
+        _swap_to_current(directory)
+        if not _build_due():
+            return
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                build_snapshot(cur, directory)
+    finally:
+        _unlock(directory)
+
+
+def _refresh_loop(directory: Path) -> None:
+    global _LAST_ERROR
+    interval = env_float("MASTER_SNAPSHOT_CHECK_SEC", 30)
+    while not _STOP.is_set():
+        try:
+            _swap_to_current(directory)
+            if _build_due():
+                _build_locked(directory)
+                _swap_to_current(directory)
+            _LAST_ERROR = None
+        except Exception as exc:
+            _LAST_ERROR = str(exc)
+            logger.warning("master_snapshot refresh failed: %s", exc)
+        _STOP.wait(interval)
+
+
+def start_master_snapshot() -> None:
+    """既存の版があれば起動時に開く（最初のリクエストから使える）。作成・切り替えは別スレッド。"""
+    global _THREAD
+    if not snapshot_enabled() or _THREAD is not None:
+        return
+    directory = snapshot_dir()
+    try:
+        _swap_to_current(directory)
+    except Exception as exc:
+        logger.warning("master_snapshot open failed: %s", exc)
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_refresh_loop, args=(directory,), name="master-snapshot", daemon=True)
+    _THREAD.start()
+
+
+def stop_master_snapshot() -> None:
+    global _THREAD, _CURRENT, _PREVIOUS
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+    with _SWAP_LOCK:
+        for snap in (_PREVIOUS, _CURRENT):
+            if snap is not None:
+                snap.close()
+        _CURRENT = _PREVIOUS = None
+
+
+def master_snapshot_stats() -> dict[str, Any]:
+    snap = _CURRENT
+    return {
+        "enabled": snapshot_enabled(),
+        "ready": snap is not None,
+        **(snap.stats() if snap is not None else {}),
+        "last_error": _LAST_ERROR,
+    }
+
+
+# ---- ウォームアップ ----
+def _main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="マスタスナップショットの作成 / 確認")
+    parser.add_argument("command", choices=["build", "info"])
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    directory = snapshot_dir()
+    if args.command == "build":
+        from app.db import get_conn
+
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                path = build_snapshot(cur, directory)
+        print(path)
+        return 0
+
+    name = _read_pointer(directory)
+    if name is None:
+        print(f"no snapshot in {directory}")
+        return 1
+    snap = MasterSnapshot(directory / name)
+    try:
+        print(snap.stats())
+    finally:
+        snap.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,259 @@
+# リクエスト単位の計測（区間の所要時間・DB 時間・取得行数・送信バイト数）と /api/metrics
+"""
+MetricsMiddleware がリクエスト毎の記録を contextvar に置き、処理中の `with span("db.execute"):` は
+その記録と区間別のヒストグラムの両方に所要時間を足す（asyncio.to_thread・スレッドプールで
+実行される同期ルートにも contextvar は引き継がれる）。
+
+区間名:
+- db.connect / db.execute / db.fetch（app.db）
+- pdf.overlay / pdf.merge / pdf.serialize（app.pdf。xobject エンジンは pdf.render）
+
+/api/metrics は Prometheus のテキスト形式:
+- app_http_requests_total{method,route,status}
+- app_http_request_duration_seconds{method,route}（ヒストグラム）
+- app_http_response_bytes_total{method,route}
+- app_db_seconds_total{route} / app_db_rows_fetched_total{route}（リクエスト内の db.* 区間の合計）
+- app_span_duration_seconds{span}（ヒストグラム。バックグラウンド処理の区間も含む）
+- app_slow_requests_total
+
+route はルートのパス定義（/api/customers/{tcode}）。ルートに当たらない要求（静的ファイル・404・
+HTTP キャッシュの 304）は "other"。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| METRICS_ENABLED | true | false で計測しない（/api/metrics は空） |
+| METRICS_SLOW_REQUEST_MS | 0 | この時間以上かかったリクエストを区間の内訳付きでログ出力（0=出さない） |
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from app.settings import env_bool, env_float
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+OTHER_ROUTE = "other"
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        sep = "," if labels else ""
+        out = []
+        cumulative = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {self.total:.6f}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class RequestSpans:
+    """1リクエストの区間の記録。"""
+
+    __slots__ = ("start", "spans", "rows", "db_sec")
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+        self.rows = 0
+        self.db_sec = 0.0
+
+    def add(self, name: str, started: float, sec: float) -> None:
+        self.spans.append((name, started - self.start, sec))
+        if name.startswith("db."):
+            self.db_sec += sec
+
+    def breakdown(self) -> list[dict]:
+        return [{"span": n, "at_ms": round(at * 1000, 1), "ms": round(sec * 1000, 1)} for n, at, sec in self.spans]
+
+
+_CURRENT: ContextVar[Optional[RequestSpans]] = ContextVar("request_spans", default=None)
+
+
+class _Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.bytes_out: dict[tuple[str, str], int] = {}
+        self.db_sec: dict[str, float] = {}
+        self.rows: dict[str, int] = {}
+        self.spans: dict[str, Histogram] = {}
+        self.slow = 0
+
+    def observe_span(self, name: str, sec: float) -> None:
+        with self._lock:
+            hist = self.spans.get(name)
+            if hist is None:
+                hist = self.spans[name] = Histogram()
+            hist.observe(sec)
+
+    def observe_request(
+        self, method: str, route: str, status: int, sec: float, bytes_out: int, req: RequestSpans, slow: bool
+    ) -> None:
+        with self._lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get((method, route))
+            if hist is None:
+                hist = self.latency[(method, route)] = Histogram()
+            hist.observe(sec)
+            self.bytes_out[(method, route)] = self.bytes_out.get((method, route), 0) + bytes_out
+            self.db_sec[route] = self.db_sec.get(route, 0.0) + req.db_sec
+            self.rows[route] = self.rows.get(route, 0) + req.rows
+            self.slow += slow
+
+    def render(self) -> str:
+        out: list[str] = []
+        with self._lock:
+            out += [
+                "# HELP app_http_requests_total HTTP requests.",
+                "# TYPE app_http_requests_total counter",
+            ]
+            out += [
+                f"app_http_requests_total{{{_labels(method=m, route=r, status=str(s))}}} {n}"
+                for (m, r, s), n in sorted(self.requests.items())
+            ]
+            out += [
+                "# HELP app_http_request_duration_seconds HTTP request latency.",
+                "# TYPE app_http_request_duration_seconds histogram",
+            ]
+            for (m, r), hist in sorted(self.latency.items()):
+                out += hist.lines("app_http_request_duration_seconds", _labels(method=m, route=r))
+            out += [
+                "# HELP app_http_response_bytes_total Response body bytes sent.",
+                "# TYPE app_http_response_bytes_total counter",
+            ]
+            out += [
+                f"app_http_response_bytes_total{{{_labels(method=m, route=r)}}} {n}"
+                for (m, r), n in sorted(self.bytes_out.items())
+            ]
+            out += [
+                "# HELP app_db_seconds_total Time spent in DB spans within requests.",
+                "# TYPE app_db_seconds_total counter",
+            ]
+            out += [f"app_db_seconds_total{{{_labels(route=r)}}} {v:.6f}" for r, v in sorted(self.db_sec.items())]
+            out += [
+                "# HELP app_db_rows_fetched_total Rows fetched from the DB within requests.",
+                "# TYPE app_db_rows_fetched_total counter",
+            ]
+            out += [f"app_db_rows_fetched_total{{{_labels(route=r)}}} {n}" for r, n in sorted(self.rows.items())]
+            out += [
+                "# HELP app_span_duration_seconds Duration of instrumented spans.",
+                "# TYPE app_span_duration_seconds histogram",
+            ]
+            for name, hist in sorted(self.spans.items()):
+                out += hist.lines("app_span_duration_seconds", _labels(span=name))
+            out += [
+                "# HELP app_slow_requests_total Requests slower than METRICS_SLOW_REQUEST_MS.",
+                "# TYPE app_slow_requests_total counter",
+                f"app_slow_requests_total {self.slow}",
+            ]
+        return "\n".join(out) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+_REGISTRY = _Registry()
+
+
+def metrics_enabled() -> bool:
+    return env_bool("METRICS_ENABLED", True)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """`with span("pdf.merge"):` の区間を計測する。リクエスト外でもヒストグラムには記録する。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sec = time.perf_counter() - started
+        _REGISTRY.observe_span(name, sec)
+        req = _CURRENT.get()
+        if req is not None:
+            req.add(name, started, sec)
+
+
+def add_rows(n: int) -> None:
+    """DB から取得した行数をリクエストの記録に足す。"""
+    req = _CURRENT.get()
+    if req is not None:
+        req.rows += n
+
+
+def render_metrics() -> str:
+    return _REGISTRY.render() if metrics_enabled() else ""
+
+
+class MetricsMiddleware:
+    """リクエスト毎の所要時間・状態・送信バイト数と区間の内訳を記録する。"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not metrics_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        req = RequestSpans()
+        token = _CURRENT.set(req)
+        status = 500
+        bytes_out = 0
+
+        async def send_counting(message) -> None:
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_counting)
+        finally:
+            _CURRENT.reset(token)
+            sec = time.perf_counter() - req.start
+            route_obj = scope.get("route")
+            route = getattr(route_obj, "path", None) or OTHER_ROUTE
+            slow_ms = env_float("METRICS_SLOW_REQUEST_MS", 0)
+            slow = slow_ms > 0 and sec * 1000 >= slow_ms
+            _REGISTRY.observe_request(scope["method"], route, status, sec, bytes_out, req, slow)
+            if slow:
+                logger.warning(
+                    "slow request: %s %s status=%d %.1f ms db=%.1f ms rows=%d bytes=%d spans=%s",
+                    scope["method"], scope["path"], status, sec * 1000, req.db_sec * 1000, req.rows, bytes_out,
+                    json.dumps(req.breakdown(), ensure_ascii=False),
+                )
@@ -0,0 +1,275 @@
+# 名称検索のメモリ索引（得意先・需要先・メーカ）
+"""
+得意先マスタV / メーカマスタV の名称を起動時に読み込み、正規化した文字列の
+1〜3-gram 転置リストで部分一致検索する。SQL の
+UTL_I18N.TRANSLITERATE(...) LIKE '%kw%'（全件走査）を置き換える。
+
+- 正規化: app.textnorm.normalize（NFKC・ハイフン/長音の統一・casefold）
+- 検索: 3文字以下はクエリそのものの転置リスト、4文字以上は構成 3-gram のうち最短のリストを候補に部分一致を確認
+- 順位: 一致位置が前（前方一致が先）→ 名称が短い（完全一致が先頭）→ コード順
+- ページング: keyset。after（前ページ最後のコード）の行より順位が後ろのものを返す
+- 読み込み前・失敗時は get_name_index() が None を返し、呼び出し側は SQL 経路を使う
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| NAME_INDEX_ENABLED | true | false で索引を作らず常に SQL |
+| NAME_INDEX_REFRESH_SEC | 600 | 再読込の間隔 |
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+from bisect import bisect_right
+import threading
+import time
+from array import array
+from typing import Any, Optional
+
+from app.http_cache import note_view_rows
+from app.settings import env_bool, env_float
+from app.textnorm import normalize
+
+logger = logging.getLogger(__name__)
+
+MAX_GRAM = 3
+_MASK16 = 0xFFFF
+_MASK32 = 0xFFFFFFFF
+
+# 索引名 → 読み込み SQL（コード, 名称）。需要先は得意先マスタV を共用する
+_SOURCES: dict[str, str] = {
+    "customers": "SELECT 得意先コード, 得意先名 FROM 得意先マスタV ORDER BY 得意先コード",
+    "makers": "SELECT メーカコード, 社内用メーカ名 FROM メーカマスタV ORDER BY メーカコード",
+}
+
+# 読み込んだ行の指紋を HTTP キャッシュの版に使うビュー（コード参照 API が返すのと同じ列）
+_VIEWS: dict[str, str] = {
+    "customers": "得意先マスタV",
+    "makers": "メーカマスタV",
+}
+
+
+class InvalidAfter(ValueError):
+    """after が今の検索結果に存在しない（再読込で消えた・検索語が変わった）。"""
+
+
+def _grams(text: str, n: int) -> set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _pack(pos: int, size: int, row_id: int) -> int:
+    """順位 (一致位置, 名称長, 行番号) を1つの整数に詰める。"""
+    return (min(pos, _MASK16) << 48) | (min(size, _MASK16) << 32) | row_id
+
+
+class _Snapshot:
+    """読み込み1回分。検索中に差し替わっても参照中のものはそのまま使える。"""
+
+    __slots__ = ("codes", "names", "norms", "row_of_code", "postings", "positions", "loaded_at")
+
+    def __init__(self, rows: list[tuple]) -> None:
+        self.codes = [r[0] for r in rows]
+        self.names = [r[1] for r in rows]
+        # after はクエリ文字列で届くので str で引く
+        self.row_of_code = {str(code): i for i, code in enumerate(self.codes)}
+        self.norms = [normalize(r[1]) for r in rows]
+        # 転置リストは (初出位置, 名称長, 行番号) 順に並べる。3文字以下のクエリは
+        # n-gram = クエリそのものなので、先頭 limit 件がそのまま検索順位になる
+        # 並べ替えを速くするため (初出位置, 名称長, 行番号) を1つの整数に詰める
+        building: dict[str, list[int]] = {}
+        for row_id, norm in enumerate(self.norms):
+            for n in range(1, MAX_GRAM + 1):
+                for gram in _grams(norm, n):
+                    key = _pack(norm.find(gram), len(norm), row_id)
+                    entries = building.get(gram)
+                    if entries is None:
+                        building[gram] = [key]
+                    else:
+                        entries.append(key)
+        self.postings: dict[str, array] = {}
+        self.positions: dict[str, array] = {}
+        for gram, keys in building.items():
+            keys.sort()
+            self.postings[gram] = array("I", [k & _MASK32 for k in keys])
+            self.positions[gram] = array("H", [k >> 48 for k in keys])
+        self.loaded_at = time.time()
+
+
+class NameIndex:
+    def __init__(self, name: str, sql: str) -> None:
+        self.name = name
+        self.sql = sql
+        self._snap: Optional[_Snapshot] = None
+        self.last_error: Optional[str] = None
+        self.load_sec: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snap is not None
+
+    def load(self, cur) -> None:
+        start = time.perf_counter()
+        cur.arraysize = 5000
+        cur.execute(self.sql)
+        rows = cur.fetchall()
+        self.load_rows(rows)
+        if self.name in _VIEWS:
+            note_view_rows(_VIEWS[self.name], rows, "name_index")
+        self.load_sec = time.perf_counter() - start
+        logger.info("name_index %s loaded: rows=%d %.3f sec", self.name, len(self._snap.codes), self.load_sec)
+
+    def load_rows(self, rows: list[tuple]) -> None:
+        self._snap = _Snapshot(rows)
+
+    def search(self, q: str, limit: int = 100, *, after: Optional[str] = None) -> list[tuple[Any, Any]]:
+        """(コード, 名称) を順位順に最大 limit 件。after を渡すとそのコードの行より後ろから。"""
+        snap = self._snap
+        if snap is None:
+            raise RuntimeError(f"name index {self.name} is not loaded")
+        query = normalize(q)
+        if not query:
+            return []
+        last = self._after_key(snap, query, after) if after else -1
+
+        if len(query) <= MAX_GRAM:
+            posting = snap.postings.get(query)
+            if posting is None:
+                return []
+            start = 0
+            if last >= 0:
+                # 転置リストは順位順なので、after の位置から読めばよい
+                positions, norms = snap.positions[query], snap.norms
+                start = bisect_right(
+                    range(len(posting)), last,
+                    key=lambda i: _pack(positions[i], len(norms[posting[i]]), posting[i]),
+                )
+            return [(snap.codes[row_id], snap.names[row_id]) for row_id in posting[start:start + limit]]
+
+        shortest = None
+        for gram in _grams(query, MAX_GRAM):
+            posting = snap.postings.get(gram)
+            if posting is None:
+                return []
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+
+        head = query[:MAX_GRAM]
+        if len(shortest) * 8 < len(snap.postings[head]):
+            # 絞り込める 3-gram があれば、その候補を全件確認して並べる
+            return self._rank_all(snap, query, shortest, limit, last)
+        return self._rank_by_head(snap, query, head, limit, last)
+
+    @staticmethod
+    def _after_key(snap: _Snapshot, query: str, after: str) -> int:
+        row_id = snap.row_of_code.get(str(after))
+        pos = snap.norms[row_id].find(query) if row_id is not None else -1
+        if pos < 0:
+            raise InvalidAfter(f"after={after} is not in the results")
+        return _pack(pos, len(snap.norms[row_id]), row_id)
+
+    @staticmethod
+    def _rank_all(snap: _Snapshot, query: str, posting: array, limit: int, last: int) -> list[tuple[Any, Any]]:
+        norms = snap.norms
+        ranked = []
+        for row_id in posting:
+            norm = norms[row_id]
+            pos = norm.find(query)
+            if pos >= 0:
+                key = _pack(pos, len(norm), row_id)
+                if key > last:
+                    ranked.append(key)
+        top = heapq.nsmallest(limit, ranked)
+        return [(snap.codes[k & _MASK32], snap.names[k & _MASK32]) for k in top]
+
+    @staticmethod
+    def _rank_by_head(snap: _Snapshot, query: str, head: str, limit: int, last: int) -> list[tuple[Any, Any]]:
+        """
+        先頭 3-gram の転置リストを順位順に辿り、上位 limit 件が確定した時点で打ち切る。
+        クエリの一致位置は先頭 3-gram の初出位置以上なので、リストの並び
+        (初出位置, 名称長, 行番号) が上位 limit 件の最下位を超えたら以降は入らない。
+        """
+        norms = snap.norms
+        heap: list[int] = []  # _pack の値を符号反転した最大ヒープ
+        for row_id, first in zip(snap.postings[head], snap.positions[head]):
+            norm = norms[row_id]
+            if len(heap) == limit and _pack(first, len(norm), row_id) > -heap[0]:
+                break
+            pos = norm.find(query, first)
+            if pos < 0:
+                continue
+            key = _pack(pos, len(norm), row_id)
+            if key <= last:
+                continue
+            if len(heap) < limit:
+                heapq.heappush(heap, -key)
+            elif -key > heap[0]:
+                heapq.heapreplace(heap, -key)
+        top = sorted(-k for k in heap)
+        return [(snap.codes[k & _MASK32], snap.names[k & _MASK32]) for k in top]
+
+    def stats(self) -> dict[str, Any]:
+        snap = self._snap
+        return {
+            "ready": snap is not None,
+            "rows": len(snap.codes) if snap else 0,
+            "grams": len(snap.postings) if snap else 0,
+            "loaded_at": snap.loaded_at if snap else None,
+            "load_sec": self.load_sec,
+            "last_error": self.last_error,
+        }
+
+
+_INDEXES: dict[str, NameIndex] = {}
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+
+
+def name_index_enabled() -> bool:
+    return env_bool("NAME_INDEX_ENABLED", True)
+
+
+def get_name_index(name: str) -> Optional[NameIndex]:
+    """読み込み済みの索引。未読込・無効なら None（SQL 経路を使う）。"""
+    index = _INDEXES.get(name)
+    if index is None or not index.ready:
+        return None
+    return index
+
+
+def _refresh_loop(indexes: list[NameIndex]) -> None:
+    from app.db import get_conn
+
+    interval = env_float("NAME_INDEX_REFRESH_SEC", 600)
+    while not _STOP.is_set():
+        for index in indexes:
+            try:
+                with get_conn() as conn:
+                    with conn.cursor() as cur:
+                        index.load(cur)
+                index.last_error = None
+            except Exception as exc:
+                index.last_error = str(exc)
+                logger.warning("name_index %s refresh failed: %s", index.name, exc)
+        _STOP.wait(interval)
+
+
+def start_name_index() -> None:
+    global _THREAD
+    if not name_index_enabled() or _THREAD is not None:
+        return
+    for name, sql in _SOURCES.items():
+        _INDEXES.setdefault(name, NameIndex(name, sql))
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_refresh_loop, args=(list(_INDEXES.values()),), name="name-index", daemon=True)
+    _THREAD.start()
+
+
+def stop_name_index() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+
+
+def name_index_stats() -> dict[str, Any]:
+    return {name: index.stats() for name, index in _INDEXES.items()}
@@ -0,0 +1,124 @@
+# 受注リクエスト → PDF 描画用データへの変換
+"""
+/api/orders/pdf_v2 と /api/orders/pdf_bulk で共用する。
+欠けている仕入先名だけ app.supplier_cache（キャッシュ → マスタスナップショット → 仕入先マスタV）で補完する。
+"""
+from __future__ import annotations
+
+import logging
+import zipfile
+from io import BytesIO
+from typing import Any, Iterable
+
+from pypdf import PdfReader, PdfWriter
+
+from app.schemas import OrderRequestV2
+from app.supplier_cache import resolve_supplier_names
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_supplier_names(codes: set[str]) -> dict[str, str]:
+    if not codes:
+        return {}
+    return resolve_supplier_names(codes)
+
+
+def missing_supplier_codes(reqs: Iterable[OrderRequestV2]) -> set[str]:
+    """仕入先コードはあるが仕入先名が空の明細のコード。"""
+    return {
+        it.supplier_code
+        for req in reqs
+        for it in req.items
+        if (it.supplier_code not in (None, "")) and not (it.supplier_name and it.supplier_name.strip())
+    }
+
+
+def lookup_supplier_names(reqs: Iterable[OrderRequestV2]) -> dict[str, str]:
+    """補完が必要な仕入先名を引く。DB エラー時は空（名前なしで帳票を出す）。"""
+    codes = missing_supplier_codes(reqs)
+    if not codes:
+        return {}
+    try:
+        return fetch_supplier_names(codes)
+    except Exception as exc:  # pragma: no cover - defensive
+        logger.warning("Supplier name lookup failed: %s", exc)
+        return {}
+
+
+def to_pdf_payload(
+    req: OrderRequestV2,
+    supplier_name_map: dict[str, str],
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """build_order_pdf_bytes に渡す (header, items) を作る。"""
+    header = req.header.model_dump()
+    pdf_header = {
+        "order_date": header.get("order_date"),
+        "delivery_date": header.get("delivery_date"),
+     #   "nyuka_shidai": header.get("nyuka_shidai"),
+     #   "drafter_name": header.get("drafter_name"),
+        "customer_cd": header.get("customer_cd") or header.get("tcode"),
+        "customer_name": header.get("customer_name"),
+        "tantou_cd": header.get("tantou_cd"),
+        "tantou_name": header.get("tantou_name"),
+        "shipto_cd": header.get("shipto_cd") or header.get("jcode"),
+        "shipto_name": header.get("shipto_name"),
+        "order_no": header.get("order_no"),
+    }
+
+    pdf_items = []
+    for it in req.items:
+        qty = it.qty
+        sales_unit_price = it.price
+        sales_amount = it.sales_amount
+        if sales_amount is None and sales_unit_price is not None:
+            sales_amount = sales_unit_price * qty
+
+        buy_amount = it.purchase_amount
+        if buy_amount is None and it.purchase_price is not None:
+            buy_amount = it.purchase_price * qty
+
+        supplier_name = it.supplier_name or supplier_name_map.get(it.supplier_code or "", "")
+
+        pdf_items.append({
+            "item_name": it.name,
+            "qty": qty,
+            "sales_unit_price": sales_unit_price,
+            "sales_amount": sales_amount,
+            "spec": it.spec,
+            "unit_name": it.unit_name,
+            "irisu_name": it.irisu_name,
+            "buy_unit_price": it.purchase_price,
+            "buy_amount": buy_amount,
+            "item_cd": it.scode,
+            "supplier_cd": it.supplier_code,
+            "supplier_name": supplier_name,
+            "delivery_place_cd": it.delivery_place_cd,
+            "delivery_place_name": it.delivery_place_name,
+            "line_note": it.line_note,
+        })
+
+    return pdf_header, pdf_items
+
+
+def order_pdf_filename(req: OrderRequestV2) -> str:
+    return f"order_{req.header.order_date}.pdf"
+
+
+def combine_pdfs(pdfs: list[bytes]) -> bytes:
+    """複数の PDF を1ファイルに連結する。"""
+    writer = PdfWriter()
+    for data in pdfs:
+        writer.append(PdfReader(BytesIO(data)))
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def zip_pdfs(names: list[str], pdfs: list[bytes]) -> bytes:
+    """PDF を ZIP にまとめる（PDF は圧縮済みなので無圧縮で格納）。名前の重複を避けるため連番を付ける。"""
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for idx, (name, data) in enumerate(zip(names, pdfs), start=1):
+            zf.writestr(f"{idx:04d}_{name}", data)
+    return out.getvalue()
@@ -1,19 +1,46 @@
 # PDF生成
 from __future__ import annotations
 
+from bisect import bisect_right
+from functools import lru_cache
 from io import BytesIO
+from itertools import accumulate
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
+from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
+import pypdf
+import reportlab
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream, PDFText, xObjectName
 from reportlab.pdfbase.ttfonts import TTFont
 
 from pypdf import PdfReader, PdfWriter, PageObject  # pip install pypdf
+from pypdf.generic import (
+    ArrayObject,
+    BooleanObject,
+    ByteStringObject,
+    DictionaryObject,
+    FloatObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+    TextStringObject,
+)
+
+from app.metrics import span
+from app.settings import env_int, env_str
 
 
 # ---- 設定 ----
@@ -22,9 +49,21 @@ _FONT_NAME = "IPAexGothic"
 
 DEFAULT_TEMPLATE_ID = "default"
 
+# 描画エンジン（PDF_RENDER_ENGINE）
+#   merge  : 文字だけのPDFを作り、pypdf でテンプレと合成（2パス）
+#   xobject: テンプレをフォームXObjectとして取り込み、その上に直接描画（1パス）
+RENDER_ENGINES = ("merge", "xobject")
+DEFAULT_RENDER_ENGINE = "merge"
+
 LayoutDict = dict[str, Any]
 _LAYOUT_CACHE: dict[str, tuple[float, LayoutDict]] = {}
 
+# テンプレPDF: パス -> (mtime, 白紙+テンプレ合成済みのベースページ, 読み出し用ロック)
+_TEMPLATE_CACHE: dict[str, tuple[float, list[PageObject], threading.Lock]] = {}
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
 # 文字サイズ
 FONT_SIZE_HEADER = 8
 FONT_SIZE_MAIN = 8
@@ -57,15 +96,18 @@ DEFAULT_ITEM_FONT_SIZES: dict[str, float] = {
 }
 
 # ---- フォント ----
+def _font_path() -> str:
+    # プロジェクトルート（appの1つ上）
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(project_root, "assets", "fonts", "IPAexGothic.ttf")
+
+
 def ensure_japanese_font() -> None:
     global _FONT_REGISTERED
     if _FONT_REGISTERED:
         return
 
-    # プロジェクトルート（appの1つ上）
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    font_path = os.path.join(project_root, "assets", "fonts", "IPAexGothic.ttf")
-
+    font_path = _font_path()
     if not os.path.exists(font_path):
         raise FileNotFoundError(
             f"Japanese font not found: {font_path}\n"
@@ -228,6 +270,7 @@ def _normalize_layout(config: dict[str, Any]) -> LayoutDict:
         "item_fields": _convert_field_configs(item_fields_raw, "item_fields"),
         "item_name_max_width": _mm_to_pt(item_name_max_width_mm),
     }
+    layout["program"] = _compile_layout(layout)
     return layout
 
 
@@ -250,11 +293,6 @@ def _load_layout(template_id: str) -> LayoutDict:
     return layout
 
 
-def _pos(layout: LayoutDict, x: float, y: float) -> tuple[float, float]:
-    """全体オフセット込み座標"""
-    return x + float(layout["offset_x"]), y + float(layout["offset_y"])
-
-
 def _safe_str(v: Any) -> str:
     return "" if v is None else str(v)
 
@@ -293,106 +331,238 @@ def _fmt_ymd(v: Any) -> str:
     return s
 
 
+_CLIP_SUFFIX = "…"
+
+
 def clip_text_to_width(text: str, font_name: str, font_size: float, max_width_pt: float) -> str:
-    """等幅でないため、幅で切る。"""
+    """等幅でないため、幅で切る（同じ品名の繰り返しが多いので結果を覚えておく）。"""
     if not text:
         return ""
+    return _clip_text(pdfmetrics.getFont(font_name), text, font_size, max_width_pt)
 
-    if pdfmetrics.stringWidth(text, font_name, font_size) <= max_width_pt:
+
+@lru_cache(maxsize=4096)
+def _clip_text(font: Any, text: str, font_size: float, max_width_pt: float) -> str:
+    # 登録済みのフォントオブジェクトをキーにする（同名で登録し直したら別キー）
+    width = _TextWidth(font, text, font_size)
+    if width.fits(len(text), max_width_pt):
         return text
 
-    suffix = "…"
-    max_width_pt2 = max_width_pt - pdfmetrics.stringWidth(suffix, font_name, font_size)
+    max_width_pt2 = max_width_pt - font.stringWidth(_CLIP_SUFFIX, font_size)
     if max_width_pt2 <= 0:
         return ""
 
-    out = ""
-    for ch in text:
-        if pdfmetrics.stringWidth(out + ch, font_name, font_size) > max_width_pt2:
-            break
-        out += ch
-    return out + suffix
-
-
-# ---- 描画（ヘッダ）----
-def _draw_header(layout: LayoutDict, c: canvas.Canvas, header: dict[str, Any]) -> None:
-    fields = layout["header"]
-
-    def draw_field(key: str, text: str, default_font: float) -> None:
-        cfg = fields[key]
-        font_size = _resolve_font_size(cfg, key, DEFAULT_HEADER_FONT_SIZES, default_font)
-        c.setFont(_FONT_NAME, font_size)
-        x0, y0 = cfg["pos"]
-        x, y = _pos(layout, float(x0), float(y0))
-        c.drawString(x, y, text)
-
-    draw_field("order_date", _fmt_ymd(header.get("order_date", "")), FONT_SIZE_HEADER)
-    draw_field("tantou", _safe_str(header.get("tantou_name", "")), FONT_SIZE_HEADER)
-    draw_field("customer_cd", _safe_str(header.get("customer_cd", "")), FONT_SIZE_SMALL)
-    draw_field("customer_name", _safe_str(header.get("customer_name", "")), FONT_SIZE_SMALL)
-    draw_field("shipto_cd", _safe_str(header.get("shipto_cd", "")), FONT_SIZE_SMALL)
-    draw_field("shipto_name", _safe_str(header.get("shipto_name", "")), FONT_SIZE_SMALL)
-
-
-# ---- 描画（明細）----
-def _draw_item_block(layout: LayoutDict, c: canvas.Canvas, block_top_y: float, it: dict[str, Any]) -> None:
-    fields = layout["item_fields"]
-
-    def _field_cfg(key: str) -> dict[str, Any]:
-        return fields[key]
-
-    def _xy(cfg: dict[str, Any]) -> tuple[float, float]:
-        x, rel_y = cfg["pos"]
-        return _pos(layout, float(x), float(block_top_y) - float(rel_y))
-
-    def _field_font_size(key: str, default_font: float) -> float:
-        return _resolve_font_size(_field_cfg(key), key, DEFAULT_ITEM_FONT_SIZES, default_font)
-
-    def _draw_with_font(key: str, text: str, font_size: float, *, align: str = "left") -> None:
-        cfg = _field_cfg(key)
-        x, y = _xy(cfg)
-        c.setFont(_FONT_NAME, font_size)
-        if align == "right":
-            c.drawRightString(x, y, text)
+    # 先頭から1文字ずつ足して超えた所で止めるのと同じ文字数（見当から前後に詰める）
+    n = width.guess(max_width_pt2)
+    while n > 0 and not width.fits(n, max_width_pt2):
+        n -= 1
+    while n < len(text) and width.fits(n + 1, max_width_pt2):
+        n += 1
+    return text[:n] + _CLIP_SUFFIX
+
+
+class _CharWidths(dict):
+    """TTF 1フォントの文字 → 幅（フォント単位）。stringWidth と同じく未定義の文字は defaultWidth。"""
+
+    def __init__(self, face: Any) -> None:
+        super().__init__()
+        self._get = face.charWidths.get
+        self._default = face.defaultWidth
+
+    def __missing__(self, ch: str) -> float:
+        w = self[ch] = self._get(ord(ch), self._default)
+        return w
+
+
+@lru_cache(maxsize=16)
+def _char_widths(font: Any) -> Optional[_CharWidths]:
+    face = getattr(font, "face", None)
+    return _CharWidths(face) if hasattr(face, "charWidths") else None
+
+
+class _TextWidth:
+    """text[:k] の幅と上限を比べる。
+
+    TTF は文字幅の累積和（stringWidth と同じ足し方）で比べ、丸め誤差の範囲で際どいときと
+    TTF 以外のフォントは stringWidth で比べる。
+    """
+
+    __slots__ = ("font", "text", "size", "scale", "prefix")
+
+    def __init__(self, font: Any, text: str, size: float) -> None:
+        self.font = font
+        self.text = text
+        self.size = size
+        self.scale = 0.001 * size
+        widths = _char_widths(font) if size > 0 else None
+        self.prefix = list(accumulate(map(widths.__getitem__, text))) if widths is not None else None
+
+    def fits(self, k: int, limit: float) -> bool:
+        """k >= 1"""
+        if self.prefix is not None:
+            w = self.scale * self.prefix[k - 1]
+            if abs(w - limit) > 1e-9 * max(abs(limit), 1.0):
+                return w <= limit
+        return self.font.stringWidth(self.text[:k], self.size) <= limit
+
+    def guess(self, limit: float) -> int:
+        """幅が limit 以下に収まる文字数の見当（TTF 以外は 0）。"""
+        if self.prefix is None:
+            return 0
+        return bisect_right(self.prefix, limit / self.scale)
+
+
+# ---- レイアウトのコンパイル（描画命令列）----
+# (レイアウトのキー, データのキー, 既定の文字サイズ, 右寄せ, 整形)。並びが描画順
+_FieldSpec = tuple[tuple[str, str, float, bool, Callable[[Any], str]], ...]
+
+_HEADER_FIELDS: _FieldSpec = (
+    ("order_date", "order_date", FONT_SIZE_HEADER, False, _fmt_ymd),
+    ("tantou", "tantou_name", FONT_SIZE_HEADER, False, _safe_str),
+    ("customer_cd", "customer_cd", FONT_SIZE_SMALL, False, _safe_str),
+    ("customer_name", "customer_name", FONT_SIZE_SMALL, False, _safe_str),
+    ("shipto_cd", "shipto_cd", FONT_SIZE_SMALL, False, _safe_str),
+    ("shipto_name", "shipto_name", FONT_SIZE_SMALL, False, _safe_str),
+)
+
+_ITEM_FIELDS: _FieldSpec = (
+    ("item_name", "item_name", FONT_SIZE_SMALL, False, _safe_str),  # 幅で切る
+    ("spec", "spec", FONT_SIZE_SMALL, False, _safe_str),
+    ("item_cd", "item_cd", FONT_SIZE_SMALL, False, _safe_str),
+    ("qty", "qty", FONT_SIZE_MAIN, True, _safe_str),
+    ("unit_name", "unit_name", FONT_SIZE_SMALL, True, _safe_str),
+    ("irisu_name", "irisu_name", FONT_SIZE_SMALL, True, _safe_str),
+    ("sales_unit", "sales_unit_price", FONT_SIZE_MAIN, True, _fmt_int_or_raw),
+    ("sales_amount", "sales_amount", FONT_SIZE_MAIN, True, _fmt_int_or_raw),
+    ("buy_unit", "buy_unit_price", FONT_SIZE_MAIN, True, _fmt_int_or_raw),
+    ("buy_amount", "buy_amount", FONT_SIZE_MAIN, True, _fmt_int_or_raw),
+    ("supplier_cd", "supplier_cd", FONT_SIZE_SMALL, False, _safe_str),
+    ("supplier_name", "supplier_name", FONT_SIZE_SMALL, False, _safe_str),
+    ("delivery_place_name", "delivery_place_name", FONT_SIZE_SMALL, False, _safe_str),
+    ("line_note", "line_note", FONT_SIZE_SMALL, False, _safe_str),
+)
+
+
+@dataclass(frozen=True)
+class _DrawOp:
+    """1項目の描画命令。x は全体オフセット込み。y はヘッダなら絶対座標、明細ならブロック上端からの距離。"""
+
+    source: str
+    fmt: Callable[[Any], str]
+    x: float
+    y: float
+    font_size: float
+    right: bool
+    clip_width: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class _LayoutProgram:
+    header: tuple[_DrawOp, ...]
+    item: tuple[_DrawOp, ...]
+    offset_y: float
+
+
+def _compile_layout(layout: LayoutDict) -> _LayoutProgram:
+    """項目設定・文字サイズ・オフセットを描画命令列にまとめる（レイアウト読み込み時に1回）。"""
+    offset_x = float(layout["offset_x"])
+    offset_y = float(layout["offset_y"])
+
+    def ops(
+        section: str, fields: dict[str, dict[str, Any]], spec: _FieldSpec, defaults: dict[str, float], header: bool
+    ) -> tuple[_DrawOp, ...]:
+        out = []
+        for key, source, default_font, right, fmt in spec:
+            cfg = fields.get(key)
+            if cfg is None:
+                raise ValueError(f"{section}.{key} is required in layout config")
+            x, y = (float(v) for v in cfg["pos"])
+            clip = float(layout["item_name_max_width"]) if key == "item_name" else None
+            out.append(_DrawOp(
+                source=source,
+                fmt=fmt,
+                x=x + offset_x,
+                y=y + offset_y if header else y,
+                font_size=_resolve_font_size(cfg, key, defaults, default_font),
+                right=right,
+                clip_width=clip,
+            ))
+        return tuple(out)
+
+    return _LayoutProgram(
+        header=ops("header", layout["header"], _HEADER_FIELDS, DEFAULT_HEADER_FONT_SIZES, True),
+        item=ops("item_fields", layout["item_fields"], _ITEM_FIELDS, DEFAULT_ITEM_FONT_SIZES, False),
+        offset_y=offset_y,
+    )
+
+
+class _FontSize:
+    """ページ内で直前に setFont した文字サイズ（同じなら setFont を省く）。"""
+
+    __slots__ = ("size",)
+
+    def __init__(self) -> None:
+        self.size: Optional[float] = None
+
+    def set(self, c: canvas.Canvas, size: float) -> None:
+        if size != self.size:
+            c.setFont(_FONT_NAME, size)
+            self.size = size
+
+
+# ---- 描画（ヘッダ・明細）----
+def _draw_header(program: _LayoutProgram, c: canvas.Canvas, font: _FontSize, header: dict[str, Any]) -> None:
+    for op in program.header:
+        font.set(c, op.font_size)
+        c.drawString(op.x, op.y, op.fmt(header.get(op.source, "")))
+
+
+def _draw_item_block(
+    program: _LayoutProgram, c: canvas.Canvas, font: _FontSize, block_top_y: float, it: dict[str, Any]
+) -> None:
+    offset_y = program.offset_y
+    for op in program.item:
+        text = op.fmt(it.get(op.source, ""))
+        if op.clip_width is not None:
+            text = clip_text_to_width(text, _FONT_NAME, op.font_size, op.clip_width)
+        font.set(c, op.font_size)
+        if op.right:
+            c.drawRightString(op.x, block_top_y - op.y + offset_y, text)
         else:
-            c.drawString(x, y, text)
-
-    def _draw(key: str, text: str, *, align: str = "left", default_font: float = FONT_SIZE_MAIN) -> None:
-        font_size = _field_font_size(key, default_font)
-        _draw_with_font(key, text, font_size, align=align)
-
-    # 商品名（幅で切る）
-    name_font = _field_font_size("item_name", FONT_SIZE_SMALL)
-    name = _safe_str(it.get("item_name", ""))
-    name = clip_text_to_width(name, _FONT_NAME, name_font, float(layout["item_name_max_width"]))
-    _draw_with_font("item_name", name, name_font)
+            c.drawString(op.x, block_top_y - op.y + offset_y, text)
 
-    # 規格・商品CD
-    _draw("spec", _safe_str(it.get("spec", "")), default_font=FONT_SIZE_SMALL)
-    _draw("item_cd", _safe_str(it.get("item_cd", "")), default_font=FONT_SIZE_SMALL)
 
-    # 数量（右寄せ）
-    _draw("qty", _safe_str(it.get("qty", "")), align="right", default_font=FONT_SIZE_MAIN)
-
-    # 単位名 / 入数名
-    _draw("unit_name", _safe_str(it.get("unit_name", "")), align="right", default_font=FONT_SIZE_SMALL)
-    _draw("irisu_name", _safe_str(it.get("irisu_name", "")), align="right", default_font=FONT_SIZE_SMALL)
+# ---- ページ描画 ----
+def _draw_pages(
+    layout: LayoutDict,
+    c: canvas.Canvas,
+    header: dict[str, Any],
+    items: list[dict[str, Any]],
+    *,
+    before_page=None,
+) -> None:
+    per_page = int(layout["items_per_page"])
+    pages = (len(items) + per_page - 1) // per_page
+    pages = max(pages, 1)
 
-    # 売単価・売上金額
-    _draw("sales_unit", _fmt_int_or_raw(it.get("sales_unit_price", "")), align="right", default_font=FONT_SIZE_MAIN)
-    _draw("sales_amount", _fmt_int_or_raw(it.get("sales_amount", "")), align="right", default_font=FONT_SIZE_MAIN)
+    block_top_y = float(layout["block_top_y"])
+    pitch = float(layout["block_pitch"])
+    program: _LayoutProgram = layout["program"]
 
-    # 仕入単価・仕入金額
-    _draw("buy_unit", _fmt_int_or_raw(it.get("buy_unit_price", "")), align="right", default_font=FONT_SIZE_MAIN)
-    _draw("buy_amount", _fmt_int_or_raw(it.get("buy_amount", "")), align="right", default_font=FONT_SIZE_MAIN)
+    for page_idx in range(pages):
+        if before_page is not None:
+            before_page(page_idx)
+        # showPage で canvas の文字サイズは初期値に戻るので、ページ毎に最初の setFont からやり直す
+        font = _FontSize()
+        _draw_header(program, c, font, header)
 
-    # 仕入先 / 納品場所 / 行備考
-    _draw("supplier_cd", _safe_str(it.get("supplier_cd", "")), default_font=FONT_SIZE_SMALL)
-    _draw("supplier_name", _safe_str(it.get("supplier_name", "")), default_font=FONT_SIZE_SMALL)
-    _draw("delivery_place_name", _safe_str(it.get("delivery_place_name", "")), default_font=FONT_SIZE_SMALL)
-    _draw("line_note", _safe_str(it.get("line_note", "")), default_font=FONT_SIZE_SMALL)
+        start = page_idx * per_page
+        chunk = items[start:start + per_page]
 
+        for i, it in enumerate(chunk):
+            _draw_item_block(program, c, font, block_top_y - i * pitch, it)
 
+        c.showPage()
 
 
 # ---- オーバーレイPDF（文字のみ）----
@@ -401,59 +571,329 @@ def _make_overlay_pdf_bytes(layout: LayoutDict, header: dict[str, Any], items: l
 
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
+    with span("pdf.overlay"):
+        _draw_pages(layout, c, header, items)
+    with span("pdf.serialize"):
+        c.save()
+    return buf.getvalue()
 
-    per_page = int(layout["items_per_page"])
-    pages = (len(items) + per_page - 1) // per_page
-    pages = max(pages, 1)
-
-    block_top_y = float(layout["block_top_y"])
-    pitch = float(layout["block_pitch"])
-
-    for page_idx in range(pages):
-        _draw_header(layout, c, header)
 
-        start = page_idx * per_page
-        chunk = items[start:start + per_page]
+# ---- テンプレPDF（解析結果をキャッシュ）----
+def _load_template_pages(template_pdf_path: str) -> tuple[list[PageObject], threading.Lock]:
+    """
+    テンプレを白紙ページに合成したベースページを返す。mtime が変わるまで再解析しない。
+    ベースページは元の PdfReader を遅延参照するため、複製時は返却するロックを取ること。
+    """
+    current_mtime = os.path.getmtime(template_pdf_path)
+    cached = _TEMPLATE_CACHE.get(template_pdf_path)
+    if cached and cached[0] == current_mtime:
+        return cached[1], cached[2]
 
-        for i, it in enumerate(chunk):
-            _draw_item_block(layout, c, block_top_y - i * pitch, it)
+    with _TEMPLATE_CACHE_LOCK:
+        cached = _TEMPLATE_CACHE.get(template_pdf_path)
+        if cached and cached[0] == current_mtime:
+            return cached[1], cached[2]
 
-        c.showPage()
+        tmpl = PdfReader(template_pdf_path)
+        bases: list[PageObject] = []
+        for template_page in tmpl.pages:
+            base = PageObject.create_blank_page(
+                width=float(template_page.mediabox.width),
+                height=float(template_page.mediabox.height),
+            )
+            base.merge_page(template_page)
+            bases.append(base)
 
-    c.save()
-    return buf.getvalue()
+        lock = threading.Lock()
+        _TEMPLATE_CACHE[template_pdf_path] = (current_mtime, bases, lock)
+        return bases, lock
 
 
 # ---- テンプレPDFに合成 ----
-def _merge_with_template(template_pdf_path: str, overlay_pdf_bytes: bytes) -> bytes:
-    tmpl = PdfReader(template_pdf_path)
+def _merge_with_template(template_pdf_path: str, overlay_pdf_bytes: bytes, page_offset: int = 0) -> bytes:
+    bases, lock = _load_template_pages(template_pdf_path)
     over = PdfReader(BytesIO(overlay_pdf_bytes))
 
     writer = PdfWriter()
 
-    for i in range(len(over.pages)):
-        template_page = tmpl.pages[i % len(tmpl.pages)]
-        base = PageObject.create_blank_page(
-            width=float(template_page.mediabox.width),
-            height=float(template_page.mediabox.height),
-        )
-        base.merge_page(template_page)
-        base.merge_page(over.pages[i])
-        writer.add_page(base)
+    with span("pdf.merge"):
+        for i in range(len(over.pages)):
+            # add_page はベースページを writer 側へ複製するので、キャッシュ側は変更されない
+            with lock:
+                page = writer.add_page(bases[(page_offset + i) % len(bases)])
+            page.merge_page(over.pages[i])
 
     out = BytesIO()
-    writer.write(out)
+    with span("pdf.serialize"):
+        writer.write(out)
     return out.getvalue()
 
 
+# ---- テンプレをフォームXObjectとして取り込む（xobject エンジン）----
+def _rl_object(doc, obj: Any, memo: dict[tuple[int, int], Any]) -> Any:
+    """pypdf のオブジェクトを ReportLab の pdfdoc オブジェクトへ変換（間接参照は doc に登録）。"""
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in memo:
+            return memo[key]
+        target = obj.get_object()
+        # 循環参照に備え、中身を詰める前に参照を登録する
+        if isinstance(target, StreamObject):
+            holder = PDFStream(PDFDictionary(), b"")
+            memo[key] = doc.Reference(holder)
+            _fill_rl_stream(doc, holder, target, memo)
+        elif isinstance(target, DictionaryObject):
+            holder = PDFDictionary()
+            memo[key] = doc.Reference(holder)
+            holder.dict.update({k[1:]: _rl_object(doc, v, memo) for k, v in target.items()})
+        elif isinstance(target, ArrayObject):
+            holder = PDFArray([])
+            memo[key] = doc.Reference(holder)
+            holder.sequence = [_rl_object(doc, v, memo) for v in target]
+        else:
+            memo[key] = _rl_object(doc, target, memo)
+        return memo[key]
+
+    if isinstance(obj, StreamObject):
+        holder = PDFStream(PDFDictionary(), b"")
+        _fill_rl_stream(doc, holder, obj, memo)
+        return holder
+    if isinstance(obj, DictionaryObject):
+        return PDFDictionary({k[1:]: _rl_object(doc, v, memo) for k, v in obj.items()})
+    if isinstance(obj, ArrayObject):
+        return PDFArray([_rl_object(doc, v, memo) for v in obj])
+    if isinstance(obj, NameObject):
+        return PDFName(obj[1:])
+    if isinstance(obj, BooleanObject):
+        return "true" if obj else "false"
+    if isinstance(obj, NullObject) or obj is None:
+        return "null"
+    if isinstance(obj, NumberObject):
+        return int(obj)
+    if isinstance(obj, FloatObject):
+        return float(obj)
+    if isinstance(obj, TextStringObject):
+        return PDFText(obj.original_bytes)
+    if isinstance(obj, ByteStringObject):
+        return PDFText(bytes(obj))
+    raise TypeError(f"unsupported PDF object in template: {type(obj).__name__}")
+
+
+def _fill_rl_stream(doc, holder: PDFStream, stream: StreamObject, memo: dict) -> None:
+    # 圧縮済みのデータはそのまま（/Filter 等も維持）、/Length は ReportLab が付け直す
+    holder.dictionary.dict.update(
+        {k[1:]: _rl_object(doc, v, memo) for k, v in stream.items() if k != "/Length"}
+    )
+    holder.content = stream._data
+
+
+def _register_template_forms(c: canvas.Canvas, bases: list[PageObject]) -> list[tuple[str, float, float]]:
+    """テンプレ各ページをフォームXObjectとして文書に1回だけ登録し、(名前, 幅, 高さ) を返す。"""
+    doc = c._doc
+    memo: dict[tuple[int, int], Any] = {}
+    forms: list[tuple[str, float, float]] = []
+    for i, page in enumerate(bases):
+        box = page.mediabox
+        contents = page.get_contents()
+        form = PDFStream(
+            PDFDictionary({
+                "Type": PDFName("XObject"),
+                "Subtype": PDFName("Form"),
+                "FormType": 1,
+                "BBox": PDFArray([float(box.left), float(box.bottom), float(box.right), float(box.top)]),
+                "Resources": _rl_object(doc, page.get("/Resources", DictionaryObject()), memo),
+            }),
+            contents.get_data() if contents is not None else b"",
+        )
+        name = f"OrderTemplate{i}"
+        doc.Reference(form, xObjectName(name))
+        forms.append((name, float(box.width), float(box.height)))
+    return forms
+
+
+def _render_with_xobject(
+    layout: LayoutDict,
+    header: dict[str, Any],
+    items: list[dict[str, Any]],
+    page_offset: int = 0,
+) -> bytes:
+    ensure_japanese_font()
+    bases, lock = _load_template_pages(layout["template_pdf_path"])
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    with lock:
+        forms = _register_template_forms(c, bases)
+
+    def _stamp_template(page_idx: int) -> None:
+        name, width, height = forms[(page_offset + page_idx) % len(forms)]
+        c.setPageSize((width, height))
+        c.doForm(name)
+
+    with span("pdf.render"):
+        _draw_pages(layout, c, header, items, before_page=_stamp_template)
+    with span("pdf.serialize"):
+        c.save()
+    return buf.getvalue()
+
+
+def render_engine() -> str:
+    engine = env_str("PDF_RENDER_ENGINE", DEFAULT_RENDER_ENGINE).lower()
+    return engine if engine in RENDER_ENGINES else DEFAULT_RENDER_ENGINE
+
+
+# ---- 出力の版（生成済みPDFのキャッシュ用）----
+# 描画処理を変えて同じ入力でも出力が変わるときに上げる
+RENDER_REVISION = 1
+
+# パス -> ((mtime_ns, size), 内容のハッシュ)
+_FILE_DIGESTS: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def _file_digest(path: str) -> str:
+    """ファイル内容のハッシュ。mtime・サイズが変わるまで読み直さない。無ければ "-"。"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "-"
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _FILE_DIGESTS.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+    _FILE_DIGESTS[path] = (stamp, digest)
+    return digest
+
+
+def render_version(template_id: str = DEFAULT_TEMPLATE_ID, engine: Optional[str] = None) -> str:
+    """
+    同じ header / items から同じPDFが出る範囲を表す版。レイアウト・テンプレPDF・フォントの内容、
+    描画エンジン、reportlab / pypdf の版、RENDER_REVISION のどれかが変われば変わる。
+    """
+    normalized_id = template_id or DEFAULT_TEMPLATE_ID
+    layout = _load_layout(normalized_id)
+    parts = (
+        f"rev={RENDER_REVISION}",
+        f"engine={engine or render_engine()}",
+        f"reportlab={reportlab.Version}",
+        f"pypdf={pypdf.__version__}",
+        f"layout={_file_digest(_layout_config_path(normalized_id))}",
+        f"template={_file_digest(layout['template_pdf_path'])}",
+        f"font={_file_digest(_font_path())}",
+    )
+    return hashlib.blake2b(";".join(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _render_chunk(
+    engine: str,
+    layout: LayoutDict,
+    header: dict[str, Any],
+    items: list[dict[str, Any]],
+    page_offset: int = 0,
+) -> bytes:
+    if engine == "xobject":
+        return _render_with_xobject(layout, header, items, page_offset)
+    overlay = _make_overlay_pdf_bytes(layout, header, items)
+    return _merge_with_template(layout["template_pdf_path"], overlay, page_offset)
+
+
+# ---- ストリーミング出力 ----
+class _CountingWriter:
+    def __init__(self, fp) -> None:
+        self.fp = fp
+        self.pos = 0
+
+    def write(self, data: bytes) -> int:
+        self.fp.write(data)
+        self.pos += len(data)
+        return len(data)
+
+
+class _PdfPageAppender:
+    """
+    PDF のページを読み込んだ順に出力へ追記する最小限のライタ。
+    書き出したオブジェクトは保持せず、最後にページツリーと xref だけを書く。
+    """
+
+    _PAGES_ID = 1
+    _CATALOG_ID = 2
+
+    def __init__(self, fp) -> None:
+        self.out = _CountingWriter(fp)
+        self.offsets: list[Optional[int]] = [None, None, None]  # 0番は未使用、1,2 は予約
+        self.page_ids: list[int] = []
+        self.out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _new_id(self) -> int:
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _write_obj(self, obj_id: int, obj: Any) -> None:
+        self.offsets[obj_id] = self.out.pos
+        self.out.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        obj.write_to_stream(self.out)
+        self.out.write(b"\nendobj\n")
+
+    def _copy(self, obj: Any, memo: dict[tuple[int, int], int]) -> Any:
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in memo:
+                memo[key] = self._new_id()
+                self._write_obj(memo[key], self._copy(obj.get_object(), memo))
+            return IndirectObject(memo[key], 0, None)
+        if isinstance(obj, StreamObject):
+            copied = obj.__class__()
+            copied.update({k: self._copy(v, memo) for k, v in obj.items() if k != "/Length"})
+            copied._data = obj._data
+            return copied
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({k: self._copy(v, memo) for k, v in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(v, memo) for v in obj)
+        return obj
+
+    def append_pdf(self, data: bytes) -> None:
+        reader = PdfReader(BytesIO(data))
+        memo: dict[tuple[int, int], int] = {}
+        for page in reader.pages:
+            page_id = self._new_id()
+            ref = page.indirect_reference
+            if ref is not None:
+                memo[(ref.idnum, ref.generation)] = page_id
+            copied = DictionaryObject({k: self._copy(v, memo) for k, v in page.items() if k != "/Parent"})
+            copied[NameObject("/MediaBox")] = self._copy(page.mediabox, memo)
+            copied[NameObject("/Parent")] = IndirectObject(self._PAGES_ID, 0, None)
+            self._write_obj(page_id, copied)
+            self.page_ids.append(page_id)
+
+    def close(self) -> None:
+        self._write_obj(self._PAGES_ID, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(i, 0, None) for i in self.page_ids),
+            NameObject("/Count"): NumberObject(len(self.page_ids)),
+        }))
+        self._write_obj(self._CATALOG_ID, DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(self._PAGES_ID, 0, None),
+        }))
+        xref_pos = self.out.pos
+        lines = [f"xref\n0 {len(self.offsets)}\n", "0000000000 65535 f \n"]
+        lines += [f"{off:010d} 00000 n \n" for off in self.offsets[1:]]
+        lines.append(f"trailer\n<< /Size {len(self.offsets)} /Root {self._CATALOG_ID} 0 R >>\n")
+        lines.append(f"startxref\n{xref_pos}\n%%EOF\n")
+        self.out.write("".join(lines).encode("ascii"))
+
+
 # ---- 公開：PDFバイト列生成 ----
 def build_order_pdf_bytes(
     header: dict,
     items: list[dict],
     *,
     template_id: str = DEFAULT_TEMPLATE_ID,
+    engine: Optional[str] = None,
 ) -> bytes:
-    """テンプレPDFに文字を重ねたPDF(bytes)を返す。"""
+    """テンプレPDFに文字を重ねたPDF(bytes)を返す。engine 未指定時は PDF_RENDER_ENGINE。"""
 
     layout = _load_layout(template_id)
     template_pdf_path = layout["template_pdf_path"]
@@ -464,5 +904,64 @@ def build_order_pdf_bytes(
             "Place template under assets/templates/."
         )
 
+    engine = engine or render_engine()
+    if engine == "xobject":
+        start = time.perf_counter()
+        pdf_bytes = _render_with_xobject(layout, header, items)
+        logger.info(
+            "pdf stages: engine=xobject items=%d render=%.3f sec bytes=%d",
+            len(items), time.perf_counter() - start, len(pdf_bytes),
+        )
+        return pdf_bytes
+
+    start = time.perf_counter()
     overlay = _make_overlay_pdf_bytes(layout, header, items)
-    return _merge_with_template(template_pdf_path, overlay)
+    overlay_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pdf_bytes = _merge_with_template(template_pdf_path, overlay)
+    merge_sec = time.perf_counter() - start
+
+    logger.info(
+        "pdf stages: engine=merge items=%d overlay=%.3f sec merge=%.3f sec bytes=%d",
+        len(items), overlay_sec, merge_sec, len(pdf_bytes),
+    )
+    return pdf_bytes
+
+
+def write_order_pdf(
+    fp,
+    header: dict,
+    items: list[dict],
+    *,
+    template_id: str = DEFAULT_TEMPLATE_ID,
+    engine: Optional[str] = None,
+    chunk_pages: Optional[int] = None,
+) -> int:
+    """
+    build_order_pdf_bytes のストリーミング版。chunk_pages ページずつ描画して fp へ追記し、書いたバイト数を返す。
+    メモリに載るのは1チャンク分だけ（フォントのサブセットはチャンク毎に埋め込まれる）。
+    """
+    layout = _load_layout(template_id)
+    if not os.path.exists(layout["template_pdf_path"]):
+        raise FileNotFoundError(
+            f"Template PDF not found: {layout['template_pdf_path']}\n"
+            "Place template under assets/templates/."
+        )
+
+    engine = engine or render_engine()
+    chunk_pages = max(chunk_pages or env_int("PDF_STREAM_CHUNK_PAGES", 20), 1)
+    chunk_items = int(layout["items_per_page"]) * chunk_pages
+
+    start = time.perf_counter()
+    appender = _PdfPageAppender(fp)
+    for page_offset, pos in enumerate(range(0, max(len(items), 1), chunk_items)):
+        chunk = _render_chunk(engine, layout, header, items[pos:pos + chunk_items], page_offset * chunk_pages)
+        appender.append_pdf(chunk)
+    appender.close()
+
+    logger.info(
+        "pdf stages: engine=%s streamed items=%d pages=%d render=%.3f sec bytes=%d",
+        engine, len(items), len(appender.page_ids), time.perf_counter() - start, appender.out.pos,
+    )
+    return appender.out.pos
@@ -0,0 +1,317 @@
+# 生成済み受注PDFのキャッシュ（内容アドレス）
+"""
+/api/orders/pdf_v2 の出力を、描画に渡す内容と描画の版から作ったキーで保持する。
+同じ受注のボタンを何度も押したときや、変わっていない下書きを刷り直したときは、
+描画・テンプレ合成をせずに前回のバイト列を返す。
+
+- キーは to_pdf_payload 後の header / items（補完した仕入先名を含む）を正規化した JSON と
+  app.pdf.render_version（レイアウト・テンプレPDF・フォントの内容、描画エンジン等）のハッシュ。
+  どれかが変われば別のキーになるので、明示的な無効化は要らない
+- メモリは合計バイト数の上限で LRU。あふれた分はディスクへ書き出し、ディスクも合計バイト数を
+  超えたら最終利用（mtime）の古い順に上限の 9 割まで削除する。ディスクで見つかった分はメモリへ戻す
+- ディスクは複数ワーカーで共有してよい（一時ファイルから置き換えて書く）
+- 同じキーの同時要求は先の描画を待って結果を共用する
+- ETag はPDFバイト列のハッシュ（強い ETag）
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| PDF_CACHE_ENABLED | true | false で毎回描画 |
+| PDF_CACHE_MEMORY_BYTES | 67108864 | メモリに置くPDFの合計バイト数（0 ならディスクのみ） |
+| PDF_CACHE_DISK_BYTES | 536870912 | ディスクに置くPDFの合計バイト数（0 でディスクを使わない） |
+| PDF_CACHE_DIR | var/pdf_cache | ディスクの保存先 |
+| PDF_CACHE_MAX_ENTRY_BYTES | 16777216 | これより大きいPDFは保持しない |
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from app.pdf import DEFAULT_TEMPLATE_ID, render_version
+from app.settings import env_bool, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+# 落ちたワーカーが残した一時ファイルを消すまでの秒数
+_STALE_TMP_SEC = 3600
+
+
+@dataclass(frozen=True)
+class CachedPdf:
+    body: bytes
+    etag: str
+
+
+def pdf_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def pdf_cache_key(
+    header: dict[str, Any],
+    items: list[dict[str, Any]],
+    *,
+    template_id: str = DEFAULT_TEMPLATE_ID,
+    engine: Optional[str] = None,
+) -> str:
+    """キー順を揃えた JSON と描画の版のハッシュ。"""
+    canonical = json.dumps(
+        {"header": header, "items": items},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str,
+    )
+    h = hashlib.blake2b(digest_size=20)
+    h.update(render_version(template_id, engine).encode("ascii"))
+    h.update(b"\n")
+    h.update(canonical.encode("utf-8"))
+    return h.hexdigest()
+
+
+class PdfCache:
+    """メモリ（LRU）+ ディスクの2段。スレッドセーフ。"""
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        disk_dir: Optional[Path],
+        disk_bytes: int,
+        max_entry_bytes: int,
+    ) -> None:
+        self.memory_bytes = max(int(memory_bytes), 0)
+        self.disk_dir = disk_dir if disk_dir is not None and disk_bytes > 0 else None
+        self.disk_bytes = max(int(disk_bytes), 0)
+        self.max_entry_bytes = max(int(max_entry_bytes), 0)
+        self._mem: OrderedDict[str, CachedPdf] = OrderedDict()
+        self._mem_used = 0
+        self._disk_used: Optional[int] = None  # 初回の書き込みで数える
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._inflight: dict[str, list] = {}
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.spills = 0
+        self.evictions_disk = 0
+        self.skipped_large = 0
+
+    # ---- 参照・登録 ----
+    def get(self, key: str) -> Optional[CachedPdf]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.hits_memory += 1
+                return entry
+
+        body = self._disk_read(key)
+        if body is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        entry = CachedPdf(body, pdf_etag(body))
+        with self._lock:
+            self.hits_disk += 1
+        self._put_memory(key, entry)
+        return entry
+
+    def put(self, key: str, body: bytes) -> CachedPdf:
+        entry = CachedPdf(body, pdf_etag(body))
+        if len(body) > self.max_entry_bytes:
+            with self._lock:
+                self.skipped_large += 1
+            return entry
+        self._put_memory(key, entry)
+        return entry
+
+    @contextmanager
+    def single_flight(self, key: str) -> Iterator[None]:
+        """同じキーの処理を1つずつにする（後から来た方は先の結果をキャッシュから得る）。"""
+        with self._lock:
+            slot = self._inflight.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._inflight[key]
+
+    def _put_memory(self, key: str, entry: CachedPdf) -> None:
+        spilled: list[tuple[str, bytes]] = []
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_used -= len(old.body)
+            self._mem[key] = entry
+            self._mem_used += len(entry.body)
+            while self._mem_used > self.memory_bytes and self._mem:
+                k, e = self._mem.popitem(last=False)
+                self._mem_used -= len(e.body)
+                spilled.append((k, e.body))
+        # ディスクへの書き出しはロックの外で
+        for k, body in spilled:
+            self._disk_write(k, body)
+
+    # ---- ディスク ----
+    def _disk_path(self, key: str) -> Path:
+        assert self.disk_dir is not None
+        return self.disk_dir / f"{key}.pdf"
+
+    def _disk_read(self, key: str) -> Optional[bytes]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            body = path.read_bytes()
+            os.utime(path)  # mtime を最終利用時刻として使う
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            logger.warning("pdf_cache: read %s failed: %s", path.name, exc)
+            return None
+        return body
+
+    def _disk_write(self, key: str, body: bytes) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            if path.exists():
+                os.utime(path)
+                return
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("pdf_cache: spill %s failed: %s", path.name, exc)
+            return
+
+        with self._disk_lock:
+            self.spills += 1
+            if self._disk_used is None:
+                self._disk_used = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_used += len(body)
+            if self._disk_used > self.disk_bytes:
+                self._sweep_disk()
+
+    def _disk_files(self) -> list[tuple[float, int, Path]]:
+        """(mtime, サイズ, パス)。古い一時ファイルはここで消す。"""
+        files: list[tuple[float, int, Path]] = []
+        now = time.time()
+        assert self.disk_dir is not None
+        try:
+            entries = list(os.scandir(self.disk_dir))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".pdf"):
+                files.append((st.st_mtime, st.st_size, Path(entry.path)))
+            elif entry.name.endswith(".tmp") and now - st.st_mtime > _STALE_TMP_SEC:
+                Path(entry.path).unlink(missing_ok=True)
+        return files
+
+    def _sweep_disk(self) -> None:
+        # 他のワーカーが書いた分もあるので、数え直してから古い順に上限の 9 割まで消す
+        files = sorted(self._disk_files(), key=lambda f: f[0])
+        total = sum(size for _, size, _ in files)
+        target = self.disk_bytes * 9 // 10
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self._disk_used = total
+        self.evictions_disk += removed
+        if removed:
+            logger.info("pdf_cache: disk swept: removed=%d remaining_bytes=%d", removed, total)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "enabled": True,
+                "memory_entries": len(self._mem),
+                "memory_bytes": self._mem_used,
+                "memory_max_bytes": self.memory_bytes,
+                "disk_dir": str(self.disk_dir) if self.disk_dir is not None else None,
+                "disk_bytes": self._disk_used,
+                "disk_max_bytes": self.disk_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_ratio": ((self.hits_memory + self.hits_disk) / lookups) if lookups else 0.0,
+                "spills": self.spills,
+                "evictions_disk": self.evictions_disk,
+                "skipped_large": self.skipped_large,
+            }
+
+
+_CACHE: Optional[PdfCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def pdf_cache_enabled() -> bool:
+    return env_bool("PDF_CACHE_ENABLED", True)
+
+
+def get_pdf_cache() -> Optional[PdfCache]:
+    """無効なら None。"""
+    global _CACHE
+    if not pdf_cache_enabled():
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = PdfCache(
+                    memory_bytes=env_int("PDF_CACHE_MEMORY_BYTES", 64 * 1024 * 1024),
+                    disk_dir=Path(env_str("PDF_CACHE_DIR", str(PROJECT_DIR / "var" / "pdf_cache"))),
+                    disk_bytes=env_int("PDF_CACHE_DISK_BYTES", 512 * 1024 * 1024),
+                    max_entry_bytes=env_int("PDF_CACHE_MAX_ENTRY_BYTES", 16 * 1024 * 1024),
+                )
+    return _CACHE
+
+
+def cached_order_pdf(
+    header: dict[str, Any],
+    items: list[dict[str, Any]],
+    render: Callable[[], bytes],
+    *,
+    template_id: str = DEFAULT_TEMPLATE_ID,
+    engine: Optional[str] = None,
+) -> tuple[CachedPdf, bool]:
+    """(PDF, キャッシュから返したか)。無ければ render() で作って登録する。"""
+    cache = get_pdf_cache()
+    if cache is None:
+        body = render()
+        return CachedPdf(body, pdf_etag(body)), False
+
+    key = pdf_cache_key(header, items, template_id=template_id, engine=engine)
+    with cache.single_flight(key):
+        entry = cache.get(key)
+        if entry is not None:
+            return entry, True
+        return cache.put(key, render()), False
+
+
+def pdf_cache_stats() -> dict[str, Any]:
+    cache = get_pdf_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
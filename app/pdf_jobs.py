@@ -0,0 +1,352 @@
+# 受注PDFの非同期ジョブ
+"""
+受注を投入するとジョブIDを返し、バックグラウンドで PDF を生成する。
+キューはディスク上のジョブディレクトリそのもので、再起動時に未完了のジョブを積み直す。
+
+    <PDF_JOB_DIR>/<job_id>/job.json      状態・各段階の所要時間
+    <PDF_JOB_DIR>/<job_id>/request.json  受注（OrderRequestV2）
+    <PDF_JOB_DIR>/<job_id>/result.pdf    生成結果
+    <PDF_JOB_DIR>/<job_id>/claim         実行権（実行するワーカーが O_EXCL で作る）
+
+ジョブディレクトリは複数ワーカー（uvicorn --workers）で共有する。各ワーカーが起動時に
+未完了のジョブを積み直すため、実行前に claim を排他作成できたワーカーだけが実行する。
+実行中は claim の mtime を更新し続け、PDF_JOB_CLAIM_TIMEOUT_SEC 更新されない claim は
+ワーカーが落ちたものとして外し、積み直す（空き時の定期処理でも確認する）。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| PDF_JOB_DIR | var/pdf_jobs | ジョブの保存先 |
+| PDF_JOB_WORKERS | 2 | 同時に処理するジョブ数（描画は pdf_pool のプロセスで行う） |
+| PDF_JOB_RETENTION_SEC | 86400 | 完了/失敗ジョブを残す秒数 |
+| PDF_JOB_MAX_BYTES | 1073741824 | 完了ジョブの結果PDFの合計上限（超過分は古い順に削除） |
+| PDF_JOB_CLAIM_TIMEOUT_SEC | 300 | 実行中ジョブの claim がこの秒数更新されなければ積み直す |
+
+状態: queued → running → done / failed
+終了処理でプールが止まった実行中のジョブは running のまま残し、次回起動時に積み直す。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError
+from pathlib import Path
+from typing import Any, Optional
+
+from app.settings import env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+JOB_FILE = "job.json"
+REQUEST_FILE = "request.json"
+RESULT_FILE = "result.pdf"
+CLAIM_FILE = "claim"
+
+FINISHED = ("done", "failed")
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_SWEEP_INTERVAL_SEC = 60
+
+_QUEUE: "queue.Queue[Optional[str]]" = queue.Queue()
+_THREADS: list[threading.Thread] = []
+_STOP = threading.Event()
+_META_LOCK = threading.Lock()
+# claim に書く実行者（調査用。判定には mtime だけを使う）
+_OWNER = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def job_dir_root() -> Path:
+    return Path(env_str("PDF_JOB_DIR", str(PROJECT_DIR / "var" / "pdf_jobs")))
+
+
+def _job_path(job_id: str) -> Path:
+    if not _JOB_ID_RE.match(job_id):
+        raise KeyError(job_id)
+    return job_dir_root() / job_id
+
+
+def _write_json(path: Path, data: dict[str, Any]) -> None:
+    # 途中で落ちても壊れたファイルを残さないよう、一時ファイルから置き換える
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_meta(job_id: str) -> dict[str, Any]:
+    try:
+        return json.loads((_job_path(job_id) / JOB_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError) as exc:
+        raise KeyError(job_id) from exc
+
+
+def _update_meta(job_id: str, **changes: Any) -> dict[str, Any]:
+    with _META_LOCK:
+        meta = _read_meta(job_id)
+        meta.update(changes)
+        _write_json(_job_path(job_id) / JOB_FILE, meta)
+        return meta
+
+
+# ---- 実行権 ----
+def _claim_timeout() -> float:
+    return max(env_int("PDF_JOB_CLAIM_TIMEOUT_SEC", 300), 1)
+
+
+def _claim(job_id: str) -> bool:
+    """実行権を取る。他のワーカーが取得済みなら False。"""
+    path = _job_path(job_id) / CLAIM_FILE
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    except FileNotFoundError as exc:
+        raise KeyError(job_id) from exc
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(_OWNER)
+    return True
+
+
+def _touch_claim(job_id: str) -> None:
+    try:
+        os.utime(_job_path(job_id) / CLAIM_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def _release_claim(job_id: str) -> None:
+    (_job_path(job_id) / CLAIM_FILE).unlink(missing_ok=True)
+
+
+def _claim_is_live(job_id: str) -> bool:
+    """期限内の claim があれば True。期限切れの claim は外して False。"""
+    path = _job_path(job_id) / CLAIM_FILE
+    timeout = _claim_timeout()
+    try:
+        if time.time() - path.stat().st_mtime <= timeout:
+            return True
+    except FileNotFoundError:
+        return False
+    # 同時に外そうとした他のワーカーとは、名前の変更に成功した方だけが進む
+    expired = path.with_name(f"{CLAIM_FILE}.{uuid.uuid4().hex}.expired")
+    try:
+        os.rename(path, expired)
+    except FileNotFoundError:
+        return False
+    try:
+        if time.time() - expired.stat().st_mtime <= timeout:
+            # 判定の直後に別のワーカーが取り直した claim だった。戻して積まない
+            try:
+                os.link(expired, path)
+            except OSError:
+                pass
+            return True
+    finally:
+        expired.unlink(missing_ok=True)
+    logger.warning("pdf job claim expired: id=%s", job_id)
+    return False
+
+
+# ---- 公開 ----
+def submit_job(order: dict[str, Any]) -> dict[str, Any]:
+    """受注（OrderRequestV2 の dict）をディスクに書いてキューへ積む。"""
+    job_id = uuid.uuid4().hex
+    path = job_dir_root() / job_id
+    path.mkdir(parents=True)
+    _write_json(path / REQUEST_FILE, order)
+    meta = {
+        "job_id": job_id,
+        "status": "queued",
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "timings": {},
+        "bytes": None,
+        "filename": f"order_{order.get('header', {}).get('order_date')}.pdf",
+        "error": None,
+    }
+    _write_json(path / JOB_FILE, meta)
+    _QUEUE.put(job_id)
+    return meta
+
+
+def get_job(job_id: str) -> dict[str, Any]:
+    """ジョブの状態。存在しない（期限切れで削除済みを含む）場合は KeyError。"""
+    return _read_meta(job_id)
+
+
+def result_path(job_id: str) -> Path:
+    return _job_path(job_id) / RESULT_FILE
+
+
+# ---- 実行 ----
+def _run_job(job_id: str) -> None:
+    from app.order_pdf import lookup_supplier_names, to_pdf_payload
+    from app.pdf import DEFAULT_TEMPLATE_ID
+    from app.pdf_pool import PdfPoolClosed, submit_render
+    from app.schemas import OrderRequestV2
+
+    if not _claim(job_id):
+        # 他のワーカーが実行中・実行済み
+        return
+    if _read_meta(job_id)["status"] in FINISHED:
+        return
+    meta = _update_meta(job_id, status="running", started_at=time.time())
+    timings: dict[str, float] = {"queued": round(meta["started_at"] - meta["created_at"], 3)}
+    path = _job_path(job_id)
+    try:
+        start = time.perf_counter()
+        req = OrderRequestV2.model_validate_json((path / REQUEST_FILE).read_bytes())
+        supplier_name_map = lookup_supplier_names([req])
+        header, items = to_pdf_payload(req, supplier_name_map)
+        timings["prepare"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        future = submit_render(header, items, DEFAULT_TEMPLATE_ID)
+        heartbeat = _claim_timeout() / 3
+        while True:
+            try:
+                pdf_bytes = future.result(timeout=heartbeat)
+                break
+            except TimeoutError:
+                if future.done():  # 描画自体が TimeoutError で失敗した
+                    raise
+                _touch_claim(job_id)
+        timings["render"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        tmp = path / (RESULT_FILE + ".tmp")
+        tmp.write_bytes(pdf_bytes)
+        os.replace(tmp, path / RESULT_FILE)
+        timings["write"] = round(time.perf_counter() - start, 3)
+
+        _update_meta(job_id, status="done", finished_at=time.time(), timings=timings, bytes=len(pdf_bytes))
+        logger.info("pdf job done: id=%s items=%d timings=%s", job_id, len(items), timings)
+    except (CancelledError, PdfPoolClosed):
+        # 終了処理でプールが止まった。失敗にはせず running のまま実行権を返し、次回起動時に積み直す
+        _release_claim(job_id)
+        logger.info("pdf job interrupted by shutdown: id=%s", job_id)
+    except Exception as exc:
+        _update_meta(job_id, status="failed", finished_at=time.time(), timings=timings, error=str(exc))
+        logger.warning("pdf job failed: id=%s %s", job_id, exc)
+
+
+def _worker() -> None:
+    while not _STOP.is_set():
+        try:
+            job_id = _QUEUE.get(timeout=_SWEEP_INTERVAL_SEC)
+        except queue.Empty:
+            _requeue_pending(include_queued=False)
+            sweep_jobs()
+            continue
+        if job_id is None:
+            break
+        try:
+            _run_job(job_id)
+        except KeyError:
+            # 投入直後に削除されたジョブ
+            pass
+        sweep_jobs()
+
+
+def _requeue_pending(include_queued: bool = True) -> int:
+    """
+    未完了で実行中のワーカーがいないジョブを作成順に積み直す。
+    起動時は queued も積む（前回終了時に積まれていた分）。空き時の定期処理では、
+    claim の期限が切れた running だけを拾う（queued は投入したワーカーのキューにある）。
+    """
+    pending: list[tuple[float, str]] = []
+    root = job_dir_root()
+    if not root.exists():
+        return 0
+    for path in root.iterdir():
+        try:
+            meta = _read_meta(path.name)
+        except KeyError:
+            continue
+        if meta["status"] in FINISHED or (meta["status"] == "queued" and not include_queued):
+            continue
+        if not _claim_is_live(path.name):
+            pending.append((meta["created_at"], path.name))
+    for _, job_id in sorted(pending):
+        try:
+            if _read_meta(job_id)["status"] == "running":
+                _update_meta(job_id, status="queued", started_at=None)
+        except KeyError:
+            continue
+        _QUEUE.put(job_id)
+    return len(pending)
+
+
+def sweep_jobs() -> int:
+    """保持期間切れ・合計サイズ超過の完了ジョブを削除し、削除件数を返す。"""
+    root = job_dir_root()
+    if not root.exists():
+        return 0
+    retention = env_int("PDF_JOB_RETENTION_SEC", 86400)
+    max_bytes = env_int("PDF_JOB_MAX_BYTES", 1024 ** 3)
+    now = time.time()
+
+    finished: list[tuple[float, int, Path]] = []
+    for path in root.iterdir():
+        try:
+            meta = _read_meta(path.name)
+        except KeyError:
+            continue
+        if meta["status"] in FINISHED:
+            finished.append((meta["finished_at"] or meta["created_at"], meta.get("bytes") or 0, path))
+
+    removed = 0
+    finished.sort(key=lambda x: x[0])
+    total = sum(size for _, size, _ in finished)
+    for finished_at, size, path in finished:
+        if now - finished_at <= retention and total <= max_bytes:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed:
+        logger.info("pdf jobs swept: removed=%d remaining_bytes=%d", removed, total)
+    return removed
+
+
+def start_pdf_jobs() -> None:
+    if _THREADS:
+        return
+    _STOP.clear()
+    job_dir_root().mkdir(parents=True, exist_ok=True)
+    requeued = _requeue_pending()
+    if requeued:
+        logger.info("pdf jobs requeued: %d", requeued)
+    sweep_jobs()
+    for i in range(max(env_int("PDF_JOB_WORKERS", 2), 1)):
+        t = threading.Thread(target=_worker, name=f"pdf-job-{i}", daemon=True)
+        t.start()
+        _THREADS.append(t)
+
+
+def stop_pdf_jobs() -> None:
+    """
+    実行中のジョブは終わるまで待たない。この後の shutdown_pdf_executor で描画が取り消された
+    ジョブは running のまま実行権を返し、次回起動時に積み直す。
+    """
+    _STOP.set()
+    for _ in _THREADS:
+        _QUEUE.put(None)
+    for t in _THREADS:
+        t.join(timeout=5)
+    _THREADS.clear()
+    # 次回 start までに積まれた分は再起動時に _requeue_pending で拾う
+    while not _QUEUE.empty():
+        _QUEUE.get_nowait()
+
+
+def pdf_jobs_stats() -> dict[str, Any]:
+    return {"workers": len(_THREADS), "queued": _QUEUE.qsize(), "dir": str(job_dir_root())}
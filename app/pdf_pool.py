@@ -0,0 +1,178 @@
+# PDF 一括生成用のプロセスプール
+"""
+build_order_pdf_bytes は CPU バウンドで GIL を握るため、一括生成はワーカープロセスで行う。
+各ワーカーは起動時にフォント登録・レイアウト・テンプレ解析を済ませておく（_warm_worker）。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| PDF_POOL_WORKERS | CPU数 | ワーカープロセス数 |
+| PDF_BULK_MAX_ORDERS | 500 | 1リクエストあたりの受注数の上限 |
+| PDF_BULK_JOB_CONCURRENCY | 4 | 1リクエストが同時にプールへ投入する受注数 |
+| PDF_BULK_MAX_JOBS | 2 | 同時に処理する一括リクエスト数（超過は 503 + Retry-After） |
+
+同時実行の上限により、1件の大きな一括リクエストがプールを占有して
+他のリクエストや pdf_v2 の応答を止めないようにする。
+
+shutdown_pdf_executor の後は open_pdf_executor を呼ぶまで投入を受け付けない（PdfPoolClosed）。
+終了処理中に黙ってプールを作り直さないため。
+
+ワーカーは spawn で起動する。プールは初回の投入で作るので、その時点では DB プール・索引の更新など
+のスレッドが動いており、fork だとそれらが握っていたロックを子が引き継いで止まることがある。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Optional
+
+from app.settings import env_int
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_CLOSED = False
+
+_ACTIVE_JOBS = 0
+_JOBS_LOCK = threading.Lock()
+
+
+class PdfPoolBusy(Exception):
+    """一括生成の同時実行数が上限に達している。"""
+
+
+class PdfPoolClosed(Exception):
+    """shutdown_pdf_executor の後にプールへ投入しようとした。"""
+
+
+def _warm_worker(template_id: str) -> None:
+    """ワーカー起動時に1回だけ、フォント・レイアウト・テンプレを読み込む。"""
+    from app import pdf
+
+    try:
+        pdf.ensure_japanese_font()
+        layout = pdf._load_layout(template_id)
+        pdf._load_template_pages(layout["template_pdf_path"])
+    except Exception as exc:
+        # 失敗してもプールは壊さない（描画時に同じ例外がリクエスト側へ返る）
+        logger.warning("PDF worker warm-up failed: %s", exc)
+
+
+def _render(header: dict[str, Any], items: list[dict[str, Any]], template_id: str) -> bytes:
+    from app.pdf import build_order_pdf_bytes
+
+    return build_order_pdf_bytes(header=header, items=items, template_id=template_id)
+
+
+def pool_workers() -> int:
+    return max(env_int("PDF_POOL_WORKERS", os.cpu_count() or 1), 1)
+
+
+def open_pdf_executor() -> None:
+    """アプリ起動時に呼ぶ。プール自体は初回の投入で作る。"""
+    global _CLOSED
+    with _EXECUTOR_LOCK:
+        _CLOSED = False
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """プールを返す（無ければ作る）。shutdown 後は PdfPoolClosed。"""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _CLOSED:
+                raise PdfPoolClosed()
+            if _EXECUTOR is None:
+                from app.pdf import DEFAULT_TEMPLATE_ID
+
+                _EXECUTOR = ProcessPoolExecutor(
+                    max_workers=pool_workers(),
+                    initializer=_warm_worker,
+                    initargs=(DEFAULT_TEMPLATE_ID,),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.info("PDF process pool created: workers=%s", _EXECUTOR._max_workers)
+    return _EXECUTOR
+
+
+def shutdown_pdf_executor() -> None:
+    """アプリ終了時に呼ぶ。実行待ちのタスクは破棄する（その Future は CancelledError になる）。"""
+    global _EXECUTOR, _CLOSED
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+        _CLOSED = True
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("PDF process pool shut down")
+
+
+def submit_render(header: dict[str, Any], items: list[dict[str, Any]], template_id: str) -> Future:
+    """1件をプールへ投入（同期側から使う）。shutdown 後は PdfPoolClosed。"""
+    return get_pdf_executor().submit(_render, header, items, template_id)
+
+
+def max_bulk_orders() -> int:
+    return max(env_int("PDF_BULK_MAX_ORDERS", 500), 1)
+
+
+class _JobSlot:
+    """with で一括リクエスト1件分の枠を確保する。空きが無ければ PdfPoolBusy。"""
+
+    def __enter__(self) -> "_JobSlot":
+        global _ACTIVE_JOBS
+        with _JOBS_LOCK:
+            if _ACTIVE_JOBS >= max(env_int("PDF_BULK_MAX_JOBS", 2), 1):
+                raise PdfPoolBusy()
+            _ACTIVE_JOBS += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _ACTIVE_JOBS
+        with _JOBS_LOCK:
+            _ACTIVE_JOBS -= 1
+
+
+def job_slot() -> _JobSlot:
+    return _JobSlot()
+
+
+async def render_many(
+    payloads: list[tuple[dict[str, Any], list[dict[str, Any]]]],
+    *,
+    template_id: str,
+    concurrency: Optional[int] = None,
+) -> list[bytes]:
+    """
+    (header, items) のリストをプールで描画し、入力順の PDF bytes を返す。
+    1件でも失敗したら残りは取り消し（実行前のものは投入しない）、その例外を投げる。
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+    sem = asyncio.Semaphore(max(concurrency or env_int("PDF_BULK_JOB_CONCURRENCY", 4), 1))
+
+    async def _one(header: dict[str, Any], items: list[dict[str, Any]]) -> bytes:
+        async with sem:
+            return await loop.run_in_executor(executor, _render, header, items, template_id)
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(_one(h, its)) for h, its in payloads]
+    except BaseExceptionGroup as eg:
+        # 呼び出し側は個々の例外（PdfPoolClosed 等）で扱うので最初の1件を投げ直す
+        raise eg.exceptions[0] from None
+    return [t.result() for t in tasks]
+
+
+def pdf_pool_stats() -> dict[str, Any]:
+    return {
+        "created": _EXECUTOR is not None,
+        "closed": _CLOSED,
+        "workers": pool_workers(),
+        "active_jobs": _ACTIVE_JOBS,
+        "max_jobs": max(env_int("PDF_BULK_MAX_JOBS", 2), 1),
+        "job_concurrency": max(env_int("PDF_BULK_JOB_CONCURRENCY", 4), 1),
+    }
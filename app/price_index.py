@@ -0,0 +1,426 @@
+# 単価マスタのメモリ索引
+"""
+SQL_PRICE_PICK が参照する5ビューを丸ごと読み込み、需商→得商→定価の判定をメモリ上で行う。
+PRICING_ENGINE=memory のときだけ使う（既定は sql）。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| PRICING_ENGINE | sql | memory で本索引を使う |
+| PRICE_INDEX_REFRESH_SEC | 300 | 差分更新の間隔 |
+| PRICE_INDEX_FULL_REFRESH_SEC | 3600 | 全件再読込の間隔（削除行の反映用） |
+| PRICE_INDEX_UPDATED_COLUMN | (なし) | 各ビューの更新日時列。未設定なら毎回全件再読込 |
+| PRICE_INDEX_DELTA_LAG_SEC | 600 | 差分更新で前回の最大更新日時から遡って読み直す秒数（遅れてコミットされた行の取りこぼし防止） |
+
+キーの照合は Oracle に合わせる。NUMBER 列（得意先コード等）はリクエスト文字列を数値に変換して比べ
+（前後の空白・先頭ゼロは同じ値、数値にならなければ InvalidCode = ORA-01722 相当）、
+VARCHAR2 列はそのまま完全一致で比べる。列の型は読み込んだ値から判定する。
+
+判定結果が SQL 経路と一致することは `python -m app.price_index diff`（実 DB）と
+tests/test_price_index.py（スタンドイン DB）で確認する。
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Optional
+
+from app.pricing import PricingKey, PricingResult, decide_pricing, pick_pricing
+from app.settings import env_float, env_str
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCode(ValueError):
+    """NUMBER 列のキーに数値でない値が来た（SQL 経路では ORA-01722）。"""
+
+
+# Oracle が暗黙変換で受け付ける数値表記（前後の空白は呼び出し側で除く）
+_NUMBER_TEXT = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)
+
+
+def _db_code(v: Any) -> Any:
+    """DB のキー値。NUMBER は整数なら int（Decimal / float と同じハッシュ）、VARCHAR2 はそのまま。"""
+    if isinstance(v, str):
+        return sys.intern(v)
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, Decimal) and v.is_finite() and v == v.to_integral_value():
+        return int(v)
+    return v
+
+
+def _request_code(v: Any, numeric: bool) -> Any:
+    """リクエストの値を列の型に合わせて DB のキー値にそろえる。None は一致しない（空文字は Oracle では NULL）。"""
+    if v is None:
+        return None
+    if not numeric:
+        s = v if isinstance(v, str) else str(v)
+        return s or None
+    if _is_number(v):
+        return _db_code(v)
+    s = str(v).strip(" ")
+    if not s:
+        return None
+    if not _NUMBER_TEXT.fullmatch(s):
+        raise InvalidCode(f"not a number: {v!r}")
+    return _db_code(Decimal(s))
+
+
+# ビュー毎の読み込み定義: (名前, ビュー, キー列, 値列)
+_VIEWS: tuple[tuple[str, str, tuple[str, ...], tuple[str, ...]], ...] = (
+    ("ju", "需要先商品売上単価マスタV", ("得意先コード", "需要先コード", "商品コード", "入数ランク"), ("売上単価",)),
+    ("js", "需要先商品仕入単価マスタV", ("得意先コード", "需要先コード", "商品コード", "入数ランク"),
+     ("CAST(仕入先コード AS VARCHAR2(20))", "仕入単価")),
+    ("tu", "得意先商品売上単価マスタV", ("得意先コード", "商品コード", "入数ランク"), ("売上単価",)),
+    ("ts", "得意先商品仕入単価マスタV", ("得意先コード", "商品コード", "入数ランク"),
+     ("CAST(仕入先コード AS VARCHAR2(20))", "仕入単価")),
+    ("teika", "商品単価マスタV", ("商品コード", "入数ランク"), ("定価", "売上単価", "仕入単価")),
+)
+
+
+def _select_sql(view: str, key_cols: tuple[str, ...], value_cols: tuple[str, ...], updated_col: str, delta: bool) -> str:
+    cols = list(key_cols) + list(value_cols)
+    if updated_col:
+        cols.append(updated_col)
+    sql = f"SELECT {', '.join(cols)} FROM {view}"
+    if delta:
+        # 同じ時刻・遅れてコミットされた行も拾うよう、呼び出し側で遡らせた since 以上を読む（再読込は冪等）
+        sql += f" WHERE {updated_col} >= :since"
+    return sql
+
+
+def _overlap(since: Any, lag_sec: float) -> Any:
+    """差分読み込みの下限。日時型なら lag_sec 遡らせ、それ以外（数値の更新番号等）はそのまま。"""
+    if isinstance(since, datetime):
+        return since - timedelta(seconds=lag_sec)
+    return since
+
+
+@dataclass
+class _Snapshot:
+    # name -> {キー tuple: 値 tuple}
+    tables: dict[str, dict[tuple, tuple]] = field(default_factory=dict)
+    watermarks: dict[str, Any] = field(default_factory=dict)
+    loaded_at: float = 0.0
+    rows: int = 0
+    # name -> キー列ごとの NUMBER 判定（データが無い列は False = 文字列として比べる）
+    kinds: dict[str, tuple[bool, ...]] = field(default_factory=dict)
+
+
+class PriceIndex:
+    def __init__(self, *, updated_col: str = "") -> None:
+        self.updated_col = updated_col
+        self._snap: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self.full_loads = 0
+        self.delta_loads = 0
+        self.last_refresh_sec = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snap is not None
+
+    # ---- 読み込み ----
+    def _load_view(self, cur, table: dict, view: str, key_cols, value_cols,
+                   *, since: Any = None) -> tuple[int, Any, Optional[tuple[bool, ...]]]:
+        """table に読み込む。同一キー複数行は先勝ち（単発SQLの FETCH FIRST と同様に不定）。"""
+        delta = since is not None
+        sql = _select_sql(view, key_cols, value_cols, self.updated_col, delta)
+        cur.arraysize = 5000
+        cur.execute(sql, {"since": since} if delta else {})
+
+        nkey = len(key_cols)
+        nval = len(value_cols)
+        watermark = None
+        kinds: Optional[tuple[bool, ...]] = None
+        count = 0
+        while True:
+            rows = cur.fetchmany()
+            if not rows:
+                break
+            for row in rows:
+                if self.updated_col:
+                    stamp = row[-1]
+                    if stamp is not None and (watermark is None or stamp > watermark):
+                        watermark = stamp
+                count += 1
+                raw = row[:nkey]
+                if None in raw:
+                    continue  # NULL キーは SQL でも一致しない
+                if kinds is None:
+                    kinds = tuple(_is_number(v) for v in raw)
+                table.setdefault(tuple(_db_code(v) for v in raw), tuple(row[nkey:nkey + nval]))
+        return count, watermark, kinds
+
+    def load_full(self, cur) -> None:
+        start = time.perf_counter()
+        snap = _Snapshot()
+        for name, view, key_cols, value_cols in _VIEWS:
+            table: dict[tuple, tuple] = {}
+            count, watermark, kinds = self._load_view(cur, table, view, key_cols, value_cols)
+            snap.tables[name] = table
+            snap.watermarks[name] = watermark
+            snap.kinds[name] = kinds or (False,) * len(key_cols)
+            snap.rows += count
+        snap.loaded_at = time.time()
+        with self._lock:
+            self._snap = snap
+            self.full_loads += 1
+        self.last_refresh_sec = time.perf_counter() - start
+        logger.info("price_index full load: rows=%d %.3f sec", snap.rows, self.last_refresh_sec)
+
+    def load_delta(self, cur) -> int:
+        """
+        更新日時列が設定されていれば前回の最大更新日時から PRICE_INDEX_DELTA_LAG_SEC 遡って読み直し、
+        変わったキーだけ反映した新しいスナップショットに差し替える（読み取り中の索引は書き換えない）。
+        更新日時がまだ無いビューは全件読み直す。列が未設定なら全件再読込。
+        """
+        snap = self._snap
+        if snap is None or not self.updated_col:
+            self.load_full(cur)
+            return self._snap.rows if self._snap else 0
+
+        start = time.perf_counter()
+        lag = env_float("PRICE_INDEX_DELTA_LAG_SEC", 600)
+        new = _Snapshot(tables=dict(snap.tables), watermarks=dict(snap.watermarks),
+                        rows=snap.rows, kinds=dict(snap.kinds))
+        changed = 0
+        for name, view, key_cols, value_cols in _VIEWS:
+            since = snap.watermarks.get(name)
+            if since is None:
+                table: dict[tuple, tuple] = {}
+                count, watermark, kinds = self._load_view(cur, table, view, key_cols, value_cols)
+                new.rows += len(table) - len(snap.tables[name])
+                new.tables[name] = table
+                new.watermarks[name] = watermark
+                new.kinds[name] = kinds or (False,) * len(key_cols)
+                changed += count
+                continue
+
+            rows: dict[tuple, tuple] = {}
+            _, watermark, kinds = self._load_view(
+                cur, rows, view, key_cols, value_cols, since=_overlap(since, lag)
+            )
+            old = snap.tables[name]
+            updates = {k: v for k, v in rows.items() if old.get(k) != v}
+            if updates:
+                table = dict(old)
+                table.update(updates)
+                new.tables[name] = table
+                new.rows += len(table) - len(old)
+                if kinds and not any(snap.kinds[name]):
+                    new.kinds[name] = kinds
+            if watermark is not None and watermark > since:
+                new.watermarks[name] = watermark
+            changed += len(updates)
+        new.loaded_at = time.time()
+        with self._lock:
+            # 途中で全件再読込が入っていればそちらを残す
+            if self._snap is snap:
+                self._snap = new
+            self.delta_loads += 1
+        self.last_refresh_sec = time.perf_counter() - start
+        logger.info("price_index delta load: rows=%d %.3f sec", changed, self.last_refresh_sec)
+        return changed
+
+    # ---- 判定 ----
+    def resolve(self, key: PricingKey) -> PricingResult:
+        snap = self._snap
+        if snap is None:
+            raise RuntimeError("price index is not loaded")
+        codes = (key.tcode, key.jcode, key.scode, key.irank)
+        cache: dict[tuple[int, bool], Any] = {}
+        tables = snap.tables
+        kinds = snap.kinds
+
+        def lookup(name: str, positions: tuple[int, ...]) -> Optional[tuple]:
+            parts = []
+            for pos, numeric in zip(positions, kinds[name]):
+                ck = (pos, numeric)
+                if ck not in cache:
+                    cache[ck] = _request_code(codes[pos], numeric)
+                parts.append(cache[ck])
+            return tables[name].get(tuple(parts))
+
+        # pick_pricing の行形式 (定価, 売上単価, 仕入先コード, 仕入単価) にそろえる
+        tiers: dict[str, tuple] = {}
+        v = lookup("ju", (0, 1, 2, 3))
+        if v is not None:
+            tiers["ju"] = (None, v[0], None, None)
+        v = lookup("js", (0, 1, 2, 3))
+        if v is not None:
+            tiers["js"] = (None, None, v[0], v[1])
+        v = lookup("tu", (0, 2, 3))
+        if v is not None:
+            tiers["tu"] = (None, v[0], None, None)
+        v = lookup("ts", (0, 2, 3))
+        if v is not None:
+            tiers["ts"] = (None, None, v[0], v[1])
+        v = lookup("teika", (2, 3))
+        if v is not None:
+            tiers["teika"] = (v[0], v[1], None, v[2])
+        return pick_pricing(tiers)
+
+    def resolve_many(self, keys: list[PricingKey]) -> list[PricingResult]:
+        return [self.resolve(k) for k in keys]
+
+    def stats(self) -> dict[str, Any]:
+        snap = self._snap
+        return {
+            "ready": snap is not None,
+            "rows": snap.rows if snap else 0,
+            "tables": {name: len(t) for name, t in snap.tables.items()} if snap else {},
+            "loaded_at": snap.loaded_at if snap else None,
+            "full_loads": self.full_loads,
+            "delta_loads": self.delta_loads,
+            "last_refresh_sec": self.last_refresh_sec,
+            "last_error": self.last_error,
+        }
+
+    def sample_keys(self, n: int, *, seed: int = 0) -> list[PricingKey]:
+        """差分検証用。各ビューのキーと、わざと外したキーを混ぜて返す（n <= 0 なら全ビューの全キー）。"""
+        snap = self._snap
+        if snap is None:
+            return []
+        rnd = random.Random(seed)
+        tables = snap.tables
+
+        def pick(name: str) -> list[tuple]:
+            # リクエストと同じく文字列で渡す
+            keys = [tuple(str(v) for v in k) for k in tables[name]]
+            if n <= 0:
+                return keys
+            return rnd.sample(keys, min(len(keys), max(n // 5, 1)))
+
+        jcodes = [k[1] for k in pick("ju")] or ["0"]
+        out: list[PricingKey] = []
+        for t, j, s, r in pick("ju") + pick("js"):
+            out.append(PricingKey(t, j, s, r))
+        for t, s, r in pick("tu") + pick("ts"):
+            out.append(PricingKey(t, rnd.choice(jcodes), s, r))
+        tcodes = [k.tcode for k in out] or ["0"]
+        for s, r in pick("teika"):
+            out.append(PricingKey(rnd.choice(tcodes), rnd.choice(jcodes), s, r))
+        # 未ヒット
+        out.append(PricingKey("-1", "-1", "__none__", "__none__"))
+        rnd.shuffle(out)
+        return out[:n] if n > 0 else out
+
+
+def diff_against_sql(index: PriceIndex, cur, keys: list[PricingKey]) -> list[tuple[PricingKey, PricingResult, PricingResult]]:
+    """SQL_PRICE_PICK と索引の結果が異なるキーを返す（空なら一致）。"""
+    mismatches = []
+    for key in keys:
+        expected = decide_pricing(cur, tcode=key.tcode, jcode=key.jcode, scode=key.scode, irank=key.irank)
+        actual = index.resolve(key)
+        if expected != actual:
+            mismatches.append((key, expected, actual))
+    return mismatches
+
+
+# ---- プロセス内シングルトン / 定期更新 ----
+_INDEX: Optional[PriceIndex] = None
+_STOP = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+
+
+def memory_engine_enabled() -> bool:
+    return env_str("PRICING_ENGINE", "sql").lower() == "memory"
+
+
+def get_price_index() -> Optional[PriceIndex]:
+    """memory エンジンで読み込み済みのときだけ索引を返す。"""
+    index = _INDEX
+    if index is None or not index.ready:
+        return None
+    return index
+
+
+def _refresh_loop(index: PriceIndex) -> None:
+    from app.db import get_conn
+
+    interval = env_float("PRICE_INDEX_REFRESH_SEC", 300)
+    full_interval = env_float("PRICE_INDEX_FULL_REFRESH_SEC", 3600)
+    last_full = 0.0
+    while not _STOP.is_set():
+        try:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    if not index.ready or time.monotonic() - last_full >= full_interval:
+                        index.load_full(cur)
+                        last_full = time.monotonic()
+                    else:
+                        index.load_delta(cur)
+            index.last_error = None
+        except Exception as exc:
+            index.last_error = str(exc)
+            logger.warning("price_index refresh failed: %s", exc)
+        _STOP.wait(interval)
+
+
+def start_price_index() -> None:
+    """PRICING_ENGINE=memory のときバックグラウンドで読み込みと定期更新を開始。"""
+    global _INDEX, _THREAD
+    if not memory_engine_enabled() or _THREAD is not None:
+        return
+    _INDEX = PriceIndex(updated_col=env_str("PRICE_INDEX_UPDATED_COLUMN"))
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_refresh_loop, args=(_INDEX,), name="price-index", daemon=True)
+    _THREAD.start()
+
+
+def stop_price_index() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+
+
+def price_index_stats() -> dict[str, Any]:
+    index = _INDEX
+    if index is None:
+        return {"engine": "sql"}
+    return {"engine": "memory", **index.stats()}
+
+
+# ---- 差分検証 ----
+def _main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="price index / SQL 差分検証")
+    parser.add_argument("command", choices=["diff"])
+    parser.add_argument("--sample", type=int, default=1000, help="検証キー数 (0=全件)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from app.db import get_conn
+
+    load_dotenv()
+    index = PriceIndex(updated_col=env_str("PRICE_INDEX_UPDATED_COLUMN"))
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            index.load_full(cur)
+            keys = index.sample_keys(args.sample, seed=args.seed)
+            mismatches = diff_against_sql(index, cur, keys)
+
+    for key, expected, actual in mismatches[:50]:
+        print(f"MISMATCH {key}\n  sql:    {expected}\n  memory: {actual}")
+    print(f"checked={len(keys)} mismatches={len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
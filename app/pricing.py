@@ -110,17 +110,7 @@ def _to_int(v) -> int:
       return 0
 
 
-  #需商 → 得商 → 定価
-def decide_pricing(cur, *, tcode: str, jcode: str, scode: str, irank: str) -> PricingResult:
-
-  cur.execute(
-    SQL_PRICE_PICK,
-    tcode=tcode,
-    jcode=jcode,
-    scode=scode,
-    irank=irank,
-  )
-  row = cur.fetchone()
+def pricing_from_row(row) -> PricingResult:
   if not row:
     return PricingResult(source="未設定", teika=0, sales_price=0, purchase_price=0, supplier_code=None)
 
@@ -138,3 +128,137 @@ def decide_pricing(cur, *, tcode: str, jcode: str, scode: str, irank: str) -> Pr
     purchase_price=purchase,
     supplier_code=supplier,
   )
+
+
+  #需商 → 得商 → 定価
+def decide_pricing(cur, *, tcode: str, jcode: str, scode: str, irank: str) -> PricingResult:
+
+  cur.execute(
+    SQL_PRICE_PICK,
+    tcode=tcode,
+    jcode=jcode,
+    scode=scode,
+    irank=irank,
+  )
+  return pricing_from_row(cur.fetchone())
+
+
+# ---- 一括解決 ----
+
+@dataclass(frozen=True)
+class PricingKey:
+  tcode: str
+  jcode: str
+  scode: str
+  irank: str
+
+
+# 1回のSQLで解決するキー数。端数は末尾キーで埋めてSQL文を固定形にする（文キャッシュ再利用）
+BATCH_CHUNK_SIZE = 50
+
+# ビュー毎の行を tier タグ付きで返す。列順: idx, tag, 定価, 売上単価, 仕入先コード, 仕入単価
+_SQL_PRICE_BATCH_BODY = """
+SELECT k.idx, 'ju', CAST(NULL AS NUMBER), v.売上単価, CAST(NULL AS VARCHAR2(20)), CAST(NULL AS NUMBER)
+  FROM k JOIN 需要先商品売上単価マスタV v
+    ON v.得意先コード = k.tcode AND v.需要先コード = k.jcode AND v.商品コード = k.scode AND v.入数ランク = k.irank
+UNION ALL
+SELECT k.idx, 'js', CAST(NULL AS NUMBER), CAST(NULL AS NUMBER), CAST(v.仕入先コード AS VARCHAR2(20)), v.仕入単価
+  FROM k JOIN 需要先商品仕入単価マスタV v
+    ON v.得意先コード = k.tcode AND v.需要先コード = k.jcode AND v.商品コード = k.scode AND v.入数ランク = k.irank
+UNION ALL
+SELECT k.idx, 'tu', CAST(NULL AS NUMBER), v.売上単価, CAST(NULL AS VARCHAR2(20)), CAST(NULL AS NUMBER)
+  FROM k JOIN 得意先商品売上単価マスタV v
+    ON v.得意先コード = k.tcode AND v.商品コード = k.scode AND v.入数ランク = k.irank
+UNION ALL
+SELECT k.idx, 'ts', CAST(NULL AS NUMBER), CAST(NULL AS NUMBER), CAST(v.仕入先コード AS VARCHAR2(20)), v.仕入単価
+  FROM k JOIN 得意先商品仕入単価マスタV v
+    ON v.得意先コード = k.tcode AND v.商品コード = k.scode AND v.入数ランク = k.irank
+UNION ALL
+SELECT k.idx, 'teika', v.定価, v.売上単価, CAST(NULL AS VARCHAR2(20)), v.仕入単価
+  FROM k JOIN 商品単価マスタV v
+    ON v.商品コード = k.scode AND v.入数ランク = k.irank
+"""
+
+
+def _batch_sql(size: int) -> str:
+  keys = "\n  UNION ALL ".join(
+    f"SELECT {i} AS idx, :t{i} AS tcode, :j{i} AS jcode, :s{i} AS scode, :r{i} AS irank FROM dual"
+    for i in range(size)
+  )
+  return f"WITH k AS (\n  {keys}\n)" + _SQL_PRICE_BATCH_BODY
+
+
+SQL_PRICE_BATCH = _batch_sql(BATCH_CHUNK_SIZE)
+
+
+def _batch_params(chunk: list[PricingKey]) -> dict[str, str]:
+  padded = chunk + [chunk[-1]] * (BATCH_CHUNK_SIZE - len(chunk))
+  params: dict[str, str] = {}
+  for i, key in enumerate(padded):
+    params[f"t{i}"] = key.tcode
+    params[f"j{i}"] = key.jcode
+    params[f"s{i}"] = key.scode
+    params[f"r{i}"] = key.irank
+  return params
+
+
+def pick_pricing(tiers: dict[str, tuple]) -> PricingResult:
+  """
+  ビュー毎の1行（tag -> (定価, 売上単価, 仕入先コード, 仕入単価)）から SQL_PRICE_PICK と同じ優先順位で決める。
+  需商/得商は売上・仕入のどちらかが非NULLならヒット、定価は3項目のどれかが非NULLならヒット。
+  """
+  for sales_tag, buy_tag, source in (("ju", "js", "需商"), ("tu", "ts", "得商")):
+    sales_row = tiers.get(sales_tag)
+    buy_row = tiers.get(buy_tag)
+    sales = sales_row[1] if sales_row else None
+    supplier = buy_row[2] if buy_row else None
+    purchase = buy_row[3] if buy_row else None
+    if sales is not None or purchase is not None:
+      return pricing_from_row((source, None, sales, supplier, purchase))
+
+  teika_row = tiers.get("teika")
+  if teika_row and (teika_row[0] is not None or teika_row[1] is not None or teika_row[3] is not None):
+    return pricing_from_row(("定価", teika_row[0], teika_row[1], None, teika_row[3]))
+
+  return pricing_from_row(None)
+
+
+def _batch_chunks(keys: list[PricingKey]):
+  unique = list(dict.fromkeys(keys))
+  for start in range(0, len(unique), BATCH_CHUNK_SIZE):
+    chunk = unique[start:start + BATCH_CHUNK_SIZE]
+    yield chunk, _batch_params(chunk)
+
+
+def _pick_chunk(chunk: list[PricingKey], rows) -> dict[PricingKey, PricingResult]:
+  tiers_by_idx: dict[int, dict[str, tuple]] = {}
+  for idx, tag, teika, sales, supplier, purchase in rows:
+    # 同一ビューに複数行ある場合は先勝ち（単発SQLの FETCH FIRST 1 ROW と同様に不定）
+    tiers_by_idx.setdefault(int(idx), {}).setdefault(tag, (teika, sales, supplier, purchase))
+  return {key: pick_pricing(tiers_by_idx.get(i, {})) for i, key in enumerate(chunk)}
+
+
+def decide_pricing_batch(cur, keys: list[PricingKey]) -> list[PricingResult]:
+  """
+  複数キーをまとめて解決し、入力順で返す。
+  重複キーは1回だけ問い合わせ、BATCH_CHUNK_SIZE 件ずつ1クエリで5ビューを引く。
+  """
+  resolved: dict[PricingKey, PricingResult] = {}
+  for chunk, params in _batch_chunks(keys):
+    cur.execute(SQL_PRICE_BATCH, params)
+    resolved.update(_pick_chunk(chunk, cur.fetchall()))
+  return [resolved[key] for key in keys]
+
+
+# ---- async 版（fetch_one / fetch_all は app.db のもの） ----
+
+async def decide_pricing_async(fetch_one, *, tcode: str, jcode: str, scode: str, irank: str) -> PricingResult:
+  row = await fetch_one(SQL_PRICE_PICK, {"tcode": tcode, "jcode": jcode, "scode": scode, "irank": irank})
+  return pricing_from_row(row)
+
+
+async def decide_pricing_batch_async(fetch_all, keys: list[PricingKey]) -> list[PricingResult]:
+  resolved: dict[PricingKey, PricingResult] = {}
+  for chunk, params in _batch_chunks(keys):
+    resolved.update(_pick_chunk(chunk, await fetch_all(SQL_PRICE_BATCH, params)))
+  return [resolved[key] for key in keys]
@@ -0,0 +1,203 @@
+# 単価決定結果のキャッシュ
+"""
+decide_pricing の結果をプロセス内で保持する（LRU + TTL）。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| PRICING_CACHE_SIZE | 10000 | 保持するキー数の上限 (0=無効) |
+| PRICING_CACHE_TTL_SEC | 300 | 1件の有効秒数 |
+
+単価マスタ更新時は flush_pricing_cache(tcode=.., scode=..) で破棄する。
+- 破棄は <MASTER_SNAPSHOT_DIR>/pricing_cache_flush.json に連番付きで追記し、各ワーカーは
+  このファイルを1秒毎（と読み込み結果を入れる直前）に確認して未適用の破棄を行うので、
+  どのワーカーで flush しても全ワーカーに効く。直近 _FLUSH_KEEP 件より遅れたワーカーは全件破棄
+- 読み込み前にキャッシュの generation を控え、読み込み中に破棄が入ればその結果は入れない
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from app.pricing import PricingKey, PricingResult
+from app.settings import env_float, env_int
+from app.ttl_cache import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+FLUSH_FILE = "pricing_cache_flush.json"
+# flush ファイルの確認間隔と、ファイルに残す破棄の件数
+_FLUSH_CHECK_SEC = 1.0
+_FLUSH_KEEP = 100
+
+
+class PricingCache(TtlLruCache[PricingKey, PricingResult]):
+    def invalidate(self, *, tcode: Optional[str] = None, scode: Optional[str] = None) -> int:
+        """得意先 / 商品に該当するキーを破棄。両方指定時は両方に一致するもの。"""
+        if tcode is None and scode is None:
+            return self.clear()
+        return self.invalidate_where(
+            lambda k: (tcode is None or k.tcode == tcode) and (scode is None or k.scode == scode)
+        )
+
+
+_CACHE: Optional[PricingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_pricing_cache() -> PricingCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = PricingCache(
+                    maxsize=env_int("PRICING_CACHE_SIZE", 10000),
+                    ttl_sec=env_float("PRICING_CACHE_TTL_SEC", 300),
+                )
+    return _CACHE
+
+
+# ---- flush（ワーカー間で共有するファイル）----
+
+def flush_file_path() -> Path:
+    from app.master_snapshot import snapshot_dir
+
+    return snapshot_dir() / FLUSH_FILE
+
+
+def read_flush_file(path: Path) -> dict[str, Any]:
+    """{"seq": 最後の連番, "entries": [{"seq", "tcode", "scode"}, ...]}"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    try:
+        entries = [{"seq": int(e["seq"]), "tcode": e.get("tcode"), "scode": e.get("scode")} for e in data["entries"]]
+        return {"seq": int(data["seq"]), "entries": entries}
+    except (KeyError, TypeError, AttributeError) as exc:
+        raise ValueError(f"{path.name} is not a flush log") from exc
+
+
+class _FlushFile:
+    """flush ファイルを間隔を空けて確認し、未適用の破棄をこのワーカーのキャッシュに行う。"""
+
+    def __init__(self) -> None:
+        self._checked = 0.0
+        self._stamp: Optional[tuple[int, int]] = None
+        # 適用済みの連番。None は未確認（起動直後はキャッシュが空なので既存の破棄は適用しない）
+        self._applied: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def sync(self, force: bool = False) -> int:
+        """適用した破棄で消えた件数を返す。"""
+        now = time.monotonic()
+        if not force and now - self._checked < _FLUSH_CHECK_SEC:
+            return 0
+        with self._lock:
+            if not force and now - self._checked < _FLUSH_CHECK_SEC:
+                return 0
+            self._checked = now
+            path = flush_file_path()
+            try:
+                st = path.stat()
+                stamp: Optional[tuple[int, int]] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp == self._stamp and self._applied is not None:
+                return 0
+            try:
+                log = read_flush_file(path) if stamp is not None else {"seq": 0, "entries": []}
+            except (OSError, ValueError) as exc:
+                logger.warning("pricing_cache: read %s failed: %s", path.name, exc)
+                return 0
+            self._stamp = stamp
+            applied, self._applied = self._applied, log["seq"]
+            if applied is None or log["seq"] == applied:
+                return 0
+            pending = [e for e in log["entries"] if e["seq"] > applied]
+            cache = get_pricing_cache()
+            if log["seq"] < applied or len(pending) < log["seq"] - applied:
+                # ファイルが作り直された / 古い破棄が既に消えている
+                removed = cache.clear()
+            else:
+                removed = sum(cache.invalidate(tcode=e["tcode"], scode=e["scode"]) for e in pending)
+        logger.info("pricing_cache: applied flushes up to %d removed=%d", log["seq"], removed)
+        return removed
+
+
+_FLUSH = _FlushFile()
+_FLUSH_WRITE_LOCK = threading.Lock()
+
+
+def flush_pricing_cache(*, tcode: Optional[str] = None, scode: Optional[str] = None) -> int:
+    """得意先 / 商品に該当するキーを全ワーカーで破棄（両方省略で全件）。このワーカーで消えた件数を返す。"""
+    _FLUSH.sync(force=True)  # 既存の破棄を適用済みにしてから追記する
+    path = flush_file_path()
+    with _FLUSH_WRITE_LOCK:
+        try:
+            log = read_flush_file(path)
+        except FileNotFoundError:
+            log = {"seq": 0, "entries": []}
+        except ValueError:
+            # 壊れていれば作り直す（連番が戻るので各ワーカーは全件破棄する）
+            log = {"seq": 0, "entries": []}
+        seq = log["seq"] + 1
+        entries = [*log["entries"], {"seq": seq, "tcode": tcode, "scode": scode}][-_FLUSH_KEEP:]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{FLUSH_FILE}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"seq": seq, "entries": entries}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    return _FLUSH.sync(force=True)
+
+
+def pricing_cache_stats() -> dict[str, Any]:
+    return {**get_pricing_cache().stats(), "flush_file": str(flush_file_path()), "flush_seq": _FLUSH._applied}
+
+
+# ---- 解決 ----
+
+def _split(keys: list[PricingKey]) -> tuple[dict[PricingKey, PricingResult], list[PricingKey], int]:
+    """キャッシュにある結果と無いキー、読み込み前の generation を返す。"""
+    _FLUSH.sync()
+    cache = get_pricing_cache()
+    generation = cache.generation
+    found: dict[PricingKey, PricingResult] = {}
+    missing: list[PricingKey] = []
+    for key in dict.fromkeys(keys):
+        hit = cache.get(key)
+        if hit is None:
+            missing.append(key)
+        else:
+            found[key] = hit
+    return found, missing, generation
+
+
+def _store(found: dict, missing: list[PricingKey], loaded: list[PricingResult], generation: int) -> None:
+    """読み込み中に破棄（他ワーカーの flush を含む）が入っていれば、結果は返すがキャッシュしない。"""
+    _FLUSH.sync(force=True)
+    cache = get_pricing_cache()
+    for key, value in zip(missing, loaded):
+        cache.put(key, value, generation=generation)
+        found[key] = value
+
+
+def resolve_cached(
+    keys: list[PricingKey],
+    load: Callable[[list[PricingKey]], list[PricingResult]],
+) -> list[PricingResult]:
+    """キャッシュに無いキーだけ load() で解決し、入力順で返す。"""
+    found, missing, generation = _split(keys)
+    if missing:
+        _store(found, missing, load(missing), generation)
+    return [found[key] for key in keys]
+
+
+async def resolve_cached_async(
+    keys: list[PricingKey],
+    load: Callable[[list[PricingKey]], Awaitable[list[PricingResult]]],
+) -> list[PricingResult]:
+    found, missing, generation = _split(keys)
+    if missing:
+        _store(found, missing, await load(missing), generation)
+    return [found[key] for key in keys]
@@ -0,0 +1,375 @@
+# 商品検索のメモリ索引
+"""
+商品マスタV（+ メーカマスタV の社内用メーカ名）を読み込み、項目毎の 1〜3-gram 転置リストで検索する。
+/products/search の LIKE '%…%' 組み合わせ（全件走査 + 商品コード順ソート）を置き換える。
+
+- 正規化: 名称系は app.textnorm.normalize、メーカ品番は normalize_code（"ABC-12 3" == "abc123"）
+- 項目指定（maker_name / maker_part_no / product_name / spec）: 各項目の部分一致の AND、商品コード順
+- キーワード q: 空白区切りの各語がいずれかの項目に一致する行を、項目の重み付きスコア順
+  （完全一致 > 前方一致 > 部分一致 × 重み）。maker_cd・項目指定があればその AND で絞る
+- ページング: keyset。after（前ページ最後の商品コード）より後ろの行を limit 件、行タプルのまま返す。
+  行は読み込み時に商品コードの文字列順に並べ直す（DB の照合順序に依らず after の位置を決めるため）
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| PRODUCT_INDEX_ENABLED | true | false で索引を作らず常に SQL |
+| PRODUCT_INDEX_REFRESH_SEC | 600 | 再読込の間隔 |
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+import heapq
+import logging
+import threading
+import time
+from array import array
+from typing import Any, Iterable, Iterator, Optional
+
+from app.settings import env_bool, env_float
+from app.textnorm import normalize, normalize_code
+
+logger = logging.getLogger(__name__)
+
+MAX_GRAM = 3
+
+SQL_PRODUCT_INDEX = """
+    SELECT
+        P.商品コード,
+        P.商品名,
+        P.規格,
+        P.メーカコード,
+        M.社内用メーカ名,
+        P.メーカ品番
+      FROM 商品マスタV P
+      LEFT JOIN メーカマスタV M
+        ON M.メーカコード = P.メーカコード
+     ORDER BY P.商品コード
+"""
+
+# SELECT 列順（API の戻り値キー）
+COLUMNS = ("product_cd", "product_name", "spec", "maker_cd", "maker_name", "maker_part_no")
+
+# 検索対象の項目と q 検索での重み
+FIELD_WEIGHTS: dict[str, float] = {
+    "maker_part_no": 3.0,
+    "product_name": 2.0,
+    "maker_name": 1.0,
+    "spec": 1.0,
+}
+
+_EXACT_BONUS = 2.0
+_PREFIX_BONUS = 1.5
+
+def _normalizer(field: str):
+    return normalize_code if field == "maker_part_no" else normalize
+
+
+def _grams(text: str, n: int) -> set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _field_score(field: str, norm: str, term: str) -> float:
+    bonus = _EXACT_BONUS if norm == term else _PREFIX_BONUS if norm.startswith(term) else 1.0
+    return FIELD_WEIGHTS[field] * bonus
+
+
+class InvalidAfter(ValueError):
+    """after が今の結果の並びに存在しない（再読込で消えた・検索条件が変わった）。"""
+
+
+class _FieldIndex:
+    __slots__ = ("norms", "postings")
+
+    def __init__(self, values: list[Any], normalizer) -> None:
+        self.norms = [normalizer(v) for v in values]
+        building: dict[str, list[int]] = {}
+        for row_id, norm in enumerate(self.norms):
+            for n in range(1, MAX_GRAM + 1):
+                for gram in _grams(norm, n):
+                    entries = building.get(gram)
+                    if entries is None:
+                        building[gram] = [row_id]
+                    else:
+                        entries.append(row_id)
+        # 行番号は昇順に追加されるので、そのままソート済み
+        self.postings: dict[str, array] = {g: array("I", ids) for g, ids in building.items()}
+
+    def matches(self, term: str) -> Iterable[int]:
+        """term を部分一致で含む行番号（昇順）。"""
+        if len(term) <= MAX_GRAM:
+            return self.postings.get(term, ())
+        shortest = None
+        for gram in _grams(term, MAX_GRAM):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return ()
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+        norms = self.norms
+        return [row_id for row_id in shortest if term in norms[row_id]]
+
+
+class _Snapshot:
+    __slots__ = ("rows", "row_of_code", "maker_rows", "fields", "loaded_at")
+
+    def __init__(self, rows: list[tuple]) -> None:
+        # SQL は ORDER BY 済みだが、照合順序が Python の文字列順と違っても bisect できるよう並べ直す
+        rows = sorted(rows, key=lambda r: str(r[0]))
+        self.rows = rows
+        self.row_of_code = {str(r[0]): i for i, r in enumerate(rows)}
+        maker_rows: dict[str, list[int]] = {}
+        for i, r in enumerate(rows):
+            maker_rows.setdefault(str(r[3]), []).append(i)
+        self.maker_rows = maker_rows
+        self.fields = {
+            field: _FieldIndex([r[COLUMNS.index(field)] for r in rows], _normalizer(field))
+            for field in FIELD_WEIGHTS
+        }
+        self.loaded_at = time.time()
+
+    def filter_lists(
+        self,
+        maker_cd: str,
+        maker_name: str,
+        maker_part_no: str,
+        product_name: str,
+        spec: str,
+    ) -> list[Iterable[int]]:
+        """maker_cd・項目指定それぞれに一致する行番号リスト（昇順）。指定の無い項目は含めない。"""
+        lists: list[Iterable[int]] = []
+        if maker_cd:
+            lists.append(self.maker_rows.get(str(maker_cd), ()))
+        for field, value in (
+            ("maker_name", maker_name),
+            ("maker_part_no", maker_part_no),
+            ("product_name", product_name),
+            ("spec", spec),
+        ):
+            term = _normalizer(field)(value)
+            if term:
+                lists.append(self.fields[field].matches(term))
+        return lists
+
+
+def _intersect(lists: list[Iterable[int]]) -> Iterator[int]:
+    """昇順の行番号リストの積集合を昇順で返す。最短のリストを軸に、他は二分探索で確認する。"""
+    lists = sorted((l if isinstance(l, (list, array)) else list(l) for l in lists), key=len)
+    if not lists:
+        return iter(())
+    if len(lists) == 1:
+        return iter(lists[0])
+
+    def _contains(seq, row_id: int) -> bool:
+        i = bisect_left(seq, row_id)
+        return i < len(seq) and seq[i] == row_id
+
+    others = lists[1:]
+    return (row_id for row_id in lists[0] if all(_contains(seq, row_id) for seq in others))
+
+
+class ProductIndex:
+    def __init__(self) -> None:
+        self._snap: Optional[_Snapshot] = None
+        self.last_error: Optional[str] = None
+        self.load_sec: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snap is not None
+
+    def load(self, cur) -> None:
+        start = time.perf_counter()
+        cur.arraysize = 5000
+        cur.execute(SQL_PRODUCT_INDEX)
+        rows = cur.fetchall()
+        # 索引の列は商品参照（/products/{scode}）が返す仕入先を含まないので、HTTP キャッシュの
+        # 版の提供元にはしない（版はマスタスナップショット・更新日時列の確認から）
+        self.load_rows(rows)
+        self.load_sec = time.perf_counter() - start
+        logger.info("product_index loaded: rows=%d %.3f sec", len(self._snap.rows), self.load_sec)
+
+    def load_rows(self, rows: list[tuple]) -> None:
+        self._snap = _Snapshot(rows)
+
+    def _snapshot(self) -> _Snapshot:
+        snap = self._snap
+        if snap is None:
+            raise RuntimeError("product index is not loaded")
+        return snap
+
+    def search(
+        self,
+        *,
+        maker_cd: str = "",
+        maker_name: str = "",
+        maker_part_no: str = "",
+        product_name: str = "",
+        spec: str = "",
+        limit: int = 200,
+        after: Optional[str] = None,
+    ) -> list[tuple]:
+        """項目指定の AND 検索（商品コード順）。after の商品コードより後ろを最大 limit 行。"""
+        snap = self._snapshot()
+        after_row = -1
+        if after:
+            # 再読込で消えた商品でも、コード順の位置から続けられる
+            after_row = snap.row_of_code.get(after)
+            if after_row is None:
+                after_row = bisect_right(snap.rows, after, key=lambda r: str(r[0])) - 1
+
+        lists = snap.filter_lists(maker_cd, maker_name, maker_part_no, product_name, spec)
+        matched = _intersect(lists) if lists else iter(range(after_row + 1, len(snap.rows)))
+        page: list[tuple] = []
+        for row_id in matched:
+            if row_id <= after_row:
+                continue
+            page.append(snap.rows[row_id])
+            if len(page) >= limit:
+                break
+        return page
+
+    def search_keywords(
+        self,
+        q: str,
+        *,
+        maker_cd: str = "",
+        maker_name: str = "",
+        maker_part_no: str = "",
+        product_name: str = "",
+        spec: str = "",
+        limit: int = 200,
+        after: Optional[str] = None,
+    ) -> list[tuple]:
+        """
+        キーワード検索（項目の重み付きスコア順、同点は商品コード順）。after の行より後ろを最大 limit 行。
+        maker_cd・項目指定は search と同じ条件で AND する。
+        """
+        snap = self._snapshot()
+
+        # 絞り込みの効く語から順に処理し、2語目以降は残った候補だけを文字列で確認する
+        words = sorted(
+            (w for w in q.split() if any(_normalizer(f)(w) for f in FIELD_WEIGHTS)),
+            key=lambda w: self._estimate(snap, w),
+        )
+        scores: dict[int, float] = {}
+        for i, word in enumerate(words):
+            terms = {f: _normalizer(f)(word) for f in FIELD_WEIGHTS}
+            if i == 0:
+                for field, term in terms.items():
+                    if not term:
+                        continue
+                    norms = snap.fields[field].norms
+                    for row_id in snap.fields[field].matches(term):
+                        score = _field_score(field, norms[row_id], term)
+                        if score > scores.get(row_id, 0.0):
+                            scores[row_id] = score
+            else:
+                narrowed: dict[int, float] = {}
+                for row_id, total in scores.items():
+                    best = 0.0
+                    for field, term in terms.items():
+                        norm = snap.fields[field].norms[row_id]
+                        if term and term in norm:
+                            best = max(best, _field_score(field, norm, term))
+                    if best:
+                        narrowed[row_id] = total + best
+                scores = narrowed
+            if not scores:
+                break
+
+        lists = snap.filter_lists(maker_cd, maker_name, maker_part_no, product_name, spec)
+        if lists and scores:
+            allowed = set(_intersect(lists))
+            scores = {r: s for r, s in scores.items() if r in allowed}
+
+        keys = ((-s, r) for r, s in scores.items())
+        if after:
+            # スコアは同じ条件で計算し直したもの。after が結果に無ければ続きの位置が決まらない
+            after_row = snap.row_of_code.get(after)
+            if after_row not in scores:
+                raise InvalidAfter(f"after={after} is not in the results")
+            last = (-scores[after_row], after_row)
+            keys = (k for k in keys if k > last)
+        top = heapq.nsmallest(limit, keys)
+        return [snap.rows[r] for _, r in top]
+
+    @staticmethod
+    def _estimate(snap: _Snapshot, word: str) -> int:
+        """語に一致しうる行数の上限（各項目で最も短い n-gram リストの長さの和）。"""
+        total = 0
+        for field, ix in snap.fields.items():
+            term = _normalizer(field)(word)
+            if not term:
+                continue
+            n = min(len(term), MAX_GRAM)
+            total += min((len(ix.postings.get(g, ())) for g in _grams(term, n)), default=0)
+        return total
+
+    def stats(self) -> dict[str, Any]:
+        snap = self._snap
+        return {
+            "ready": snap is not None,
+            "rows": len(snap.rows) if snap else 0,
+            "grams": {f: len(ix.postings) for f, ix in snap.fields.items()} if snap else {},
+            "loaded_at": snap.loaded_at if snap else None,
+            "load_sec": self.load_sec,
+            "last_error": self.last_error,
+        }
+
+
+_INDEX: Optional[ProductIndex] = None
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+
+
+def product_index_enabled() -> bool:
+    return env_bool("PRODUCT_INDEX_ENABLED", True)
+
+
+def get_product_index() -> Optional[ProductIndex]:
+    """読み込み済みの索引。未読込・無効なら None（SQL 経路を使う）。"""
+    index = _INDEX
+    if index is None or not index.ready:
+        return None
+    return index
+
+
+def _refresh_loop(index: ProductIndex) -> None:
+    from app.db import get_conn
+
+    interval = env_float("PRODUCT_INDEX_REFRESH_SEC", 600)
+    while not _STOP.is_set():
+        try:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    index.load(cur)
+            index.last_error = None
+        except Exception as exc:
+            index.last_error = str(exc)
+            logger.warning("product_index refresh failed: %s", exc)
+        _STOP.wait(interval)
+
+
+def start_product_index() -> None:
+    global _INDEX, _THREAD
+    if not product_index_enabled() or _THREAD is not None:
+        return
+    _INDEX = _INDEX or ProductIndex()
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_refresh_loop, args=(_INDEX,), name="product-index", daemon=True)
+    _THREAD.start()
+
+
+def stop_product_index() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+
+
+def product_index_stats() -> dict[str, Any]:
+    index = _INDEX
+    if index is None:
+        return {"ready": False, "enabled": product_index_enabled()}
+    return index.stats()
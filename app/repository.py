@@ -0,0 +1,257 @@
+# マスタ・単価の取得元（Oracle / ローカルレプリカ）
+"""
+コード参照（得意先・需要先・メーカ・商品・単位・仕入先名）と単価決定は、ルートから SQL を直接投げず
+get_repository() が返す Repository を通す。
+
+- OracleRepository（既定）: マスタスナップショットにあればそこから、無いコードだけ Oracle を引く。
+  単価は PRICING_ENGINE=memory の索引、それ以外は単価キャッシュ + SQL
+- ReplicaRepository: マスタスナップショット（SQLite）だけを引く。単価ビューもスナップショットに
+  書き出しておき（MASTER_SNAPSHOT_PRICES）、需商→得商→定価の判定も SQLite 上で行う。
+  Oracle に触れるのはスナップショットの作成（同期）だけで、スナップショットに無いコードは未ヒット
+- スナップショット（sqlite3 は同期 API）の参照は asyncio.to_thread で行い、イベントループを止めない
+- DATA_BACKEND=replica でも、単価入りのスナップショットを開けるまでは OracleRepository を返す
+
+部分一致検索はこれまでどおり各ルートの索引 / SQL 経路（ここには含めない）。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| DATA_BACKEND | oracle | replica でコード参照・単価決定をローカルレプリカから返す |
+"""
+from __future__ import annotations
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from app.concurrency import limit
+from app.db import fetch_all, fetch_all_by_keys, fetch_all_by_keys_sync, fetch_one
+from app.master_snapshot import MasterSnapshot, get_master_snapshot
+from app.price_index import get_price_index
+from app.pricing import PricingKey, PricingResult, decide_pricing_async, decide_pricing_batch_async
+from app.pricing_cache import resolve_cached_async
+from app.settings import env_str
+
+SQL_CUSTOMERS_BY_KEYS = """
+    SELECT k.COLUMN_VALUE, V.得意先名
+      FROM TABLE(:keys) k
+      JOIN 得意先マスタV V
+        ON V.得意先コード = k.COLUMN_VALUE
+"""
+
+SQL_MAKERS_BY_KEYS = """
+    SELECT k.COLUMN_VALUE, V.社内用メーカ名
+      FROM TABLE(:keys) k
+      JOIN メーカマスタV V
+        ON V.メーカコード = k.COLUMN_VALUE
+"""
+
+SQL_SUPPLIERS_BY_KEYS = """
+    SELECT k.COLUMN_VALUE, V.仕入先名
+      FROM TABLE(:keys) k
+      JOIN 仕入先マスタV V
+        ON V.仕入先コード = k.COLUMN_VALUE
+"""
+
+# 列順は routes/products.py の _PRODUCT_COLS と同じ。最後の列がキー
+SQL_PRODUCTS_BY_KEYS = """
+    SELECT
+        M_商品.メーカコード,
+        M_メカ.社内用メーカ名,
+        M_商品.商品名,
+        M_商品.メーカ品番,
+        M_商品.規格,
+        M_商品.仕入先コード,
+        M_仕入.仕入先名
+        ,k.COLUMN_VALUE
+      FROM TABLE(:keys) k
+      JOIN 商品マスタV M_商品
+        ON M_商品.商品コード = k.COLUMN_VALUE
+      LEFT JOIN メーカマスタV M_メカ
+        ON M_商品.メーカコード = M_メカ.メーカコード
+      LEFT JOIN 仕入先マスタV M_仕入
+        ON M_商品.仕入先コード = M_仕入.仕入先コード
+"""
+
+# 単位名, 入数名, 入数ランク, 商品コード（商品毎に 順序 の昇順）
+SQL_UNITS_BY_KEYS = """
+    SELECT 単位.単位名 AS unit_name
+          ,入数.入数名 AS irisu_name
+          ,入数.入数ランク AS irisu_rank
+          ,k.COLUMN_VALUE AS product_cd
+      FROM TABLE(:keys) k
+      JOIN 商品入数マスタV 入数 ON (入数.商品コード = k.COLUMN_VALUE)
+      LEFT JOIN 単位マスタV 単位 ON (入数.単位コード = 単位.単位コード)
+     ORDER BY k.COLUMN_VALUE, 入数.順序
+"""
+
+
+class Repository(ABC):
+    """メソッドは見つかったコードだけを dict で返す（units は全コード。単位・商品が無ければ []）。"""
+
+    name = ""
+
+    @abstractmethod
+    async def customer_names(self, codes: list[int]) -> dict[int, Any]:
+        ...
+
+    @abstractmethod
+    async def maker_names(self, codes: list[str]) -> dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def products(self, codes: list[str]) -> dict[str, tuple]:
+        """商品コード → get_product の列順の行。"""
+
+    @abstractmethod
+    async def units(self, codes: list[str]) -> dict[str, list[tuple]]:
+        """商品コード → (単位名, 入数名, 入数ランク) の行。"""
+
+    @abstractmethod
+    async def pricing(self, key: PricingKey) -> PricingResult:
+        ...
+
+    @abstractmethod
+    async def pricing_many(self, keys: list[PricingKey]) -> list[PricingResult]:
+        """結果は入力順。"""
+
+    @abstractmethod
+    def supplier_names_sync(self, codes: list[str]) -> dict[str, Any]:
+        """PDF 生成（ワーカースレッド）から呼ぶ同期版。"""
+
+
+class OracleRepository(Repository):
+    name = "oracle"
+
+    async def customer_names(self, codes: list[int]) -> dict[int, Any]:
+        snap = get_master_snapshot()
+        names = await asyncio.to_thread(snap.customer_names, codes) if snap is not None else {}
+        missing = [c for c in dict.fromkeys(codes) if c not in names]
+        if missing:
+            async with limit("lookup"):
+                rows = await fetch_all_by_keys(SQL_CUSTOMERS_BY_KEYS, missing, numeric=True)
+            names.update({int(r[0]): r[1] for r in rows})
+        return names
+
+    async def maker_names(self, codes: list[str]) -> dict[str, Any]:
+        snap = get_master_snapshot()
+        names = await asyncio.to_thread(snap.maker_names, codes) if snap is not None else {}
+        missing = [c for c in dict.fromkeys(codes) if c not in names]
+        if missing:
+            async with limit("lookup"):
+                rows = await fetch_all_by_keys(SQL_MAKERS_BY_KEYS, missing)
+            names.update(rows)
+        return names
+
+    async def products(self, codes: list[str]) -> dict[str, tuple]:
+        snap = get_master_snapshot()
+        found = await asyncio.to_thread(snap.products, codes) if snap is not None else {}
+        missing = [c for c in dict.fromkeys(codes) if c not in found]
+        if missing:
+            async with limit("lookup"):
+                rows = await fetch_all_by_keys(SQL_PRODUCTS_BY_KEYS, missing)
+            found.update({r[-1]: r[:-1] for r in rows})
+        return found
+
+    async def units(self, codes: list[str]) -> dict[str, list[tuple]]:
+        codes = list(dict.fromkeys(codes))
+        snap = get_master_snapshot()
+        found = await asyncio.to_thread(snap.units, codes) if snap is not None else {}
+        units = {code: list(found.get(code, ())) for code in codes}
+        missing = [c for c in codes if c not in found]
+        if missing:
+            async with limit("lookup"):
+                rows = await fetch_all_by_keys(SQL_UNITS_BY_KEYS, missing)
+            for r in rows:
+                units[r[3]].append(r[:3])
+        return units
+
+    @staticmethod
+    async def _resolve(keys: list[PricingKey], load) -> list[PricingResult]:
+        # memory エンジンが読み込み済みなら索引で判定、それ以外はキャッシュ経由でSQL
+        index = get_price_index()
+        if index is not None:
+            return index.resolve_many(keys)
+        return await resolve_cached_async(keys, load)
+
+    async def pricing(self, key: PricingKey) -> PricingResult:
+        async def _load(keys: list[PricingKey]) -> list[PricingResult]:
+            async with limit("pricing"):
+                return [
+                    await decide_pricing_async(fetch_one, tcode=k.tcode, jcode=k.jcode, scode=k.scode, irank=k.irank)
+                    for k in keys
+                ]
+
+        return (await self._resolve([key], _load))[0]
+
+    async def pricing_many(self, keys: list[PricingKey]) -> list[PricingResult]:
+        async def _load(keys: list[PricingKey]) -> list[PricingResult]:
+            async with limit("pricing"):
+                return await decide_pricing_batch_async(fetch_all, keys)
+
+        return await self._resolve(keys, _load)
+
+    def supplier_names_sync(self, codes: list[str]) -> dict[str, Any]:
+        snap = get_master_snapshot()
+        names = snap.supplier_names(codes) if snap is not None else {}
+        missing = [c for c in dict.fromkeys(codes) if c not in names]
+        if missing:
+            names.update({str(r[0]): r[1] for r in fetch_all_by_keys_sync(SQL_SUPPLIERS_BY_KEYS, sorted(missing))})
+        return names
+
+
+class ReplicaRepository(Repository):
+    """開いているスナップショット1版だけを引く（Oracle には行かない）。"""
+
+    name = "replica"
+
+    def __init__(self, snap: MasterSnapshot) -> None:
+        self.snap = snap
+
+    async def customer_names(self, codes: list[int]) -> dict[int, Any]:
+        return await asyncio.to_thread(self.snap.customer_names, codes)
+
+    async def maker_names(self, codes: list[str]) -> dict[str, Any]:
+        return await asyncio.to_thread(self.snap.maker_names, codes)
+
+    async def products(self, codes: list[str]) -> dict[str, tuple]:
+        return await asyncio.to_thread(self.snap.products, codes)
+
+    async def units(self, codes: list[str]) -> dict[str, list[tuple]]:
+        found = await asyncio.to_thread(self.snap.units, codes)
+        return {code: found.get(code, []) for code in dict.fromkeys(codes)}
+
+    async def pricing(self, key: PricingKey) -> PricingResult:
+        return (await asyncio.to_thread(self.snap.pricing, [key]))[key]
+
+    async def pricing_many(self, keys: list[PricingKey]) -> list[PricingResult]:
+        found = await asyncio.to_thread(self.snap.pricing, keys)
+        return [found[key] for key in keys]
+
+    def supplier_names_sync(self, codes: list[str]) -> dict[str, Any]:
+        return self.snap.supplier_names(codes)
+
+
+_ORACLE = OracleRepository()
+
+
+def data_backend() -> str:
+    return env_str("DATA_BACKEND", "oracle").lower()
+
+
+def get_repository() -> Repository:
+    """DATA_BACKEND=replica かつ単価入りのスナップショットが開いていればレプリカ、それ以外は Oracle。"""
+    if data_backend() == "replica":
+        snap = get_master_snapshot()
+        if snap is not None and snap.has_prices:
+            return ReplicaRepository(snap)
+    return _ORACLE
+
+
+def repository_stats() -> dict[str, Any]:
+    snap: Optional[MasterSnapshot] = get_master_snapshot()
+    return {
+        "backend": data_backend(),
+        "active": get_repository().name,
+        "snapshot": snap.path.name if snap is not None else None,
+        "snapshot_prices": snap.has_prices if snap is not None else False,
+    }
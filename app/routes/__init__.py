@@ -5,6 +5,8 @@ from .shipto import router as shipto_router
 from .makers import router as makers_router
 from .products import router as products_router
 from .pricing import router as pricing_router
+from .orders import router as orders_router
+from .order_rows import router as order_rows_router
 
 api_router = APIRouter()
 api_router.include_router(customers_router)
@@ -12,3 +14,5 @@ api_router.include_router(shipto_router)
 api_router.include_router(makers_router)
 api_router.include_router(products_router)
 api_router.include_router(pricing_router)
+api_router.include_router(orders_router)
+api_router.include_router(order_rows_router)
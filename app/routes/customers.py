@@ -1,41 +1,74 @@
 # 得意先マスタ検索API
-from fastapi import APIRouter, Query
-from app.db import get_conn
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.schemas import CodeLookupRequest
+from app.name_index import InvalidAfter, get_name_index
+from app.search_cache import cached_search, search_key
+from app.repository import get_repository
+from app.search_page import ORDER_CODE, ORDER_RANK, InvalidCursor, decode_cursor, page_bytes, page_response, stream_page
 
 #router = APIRouter(tags=["customers"])
 router = APIRouter(prefix="/customers", tags=["customers"])
 
+# search の SELECT 列順
+_SEARCH_COLS = ("tcode", "customer_name")
+
 @router.get("/search")
-def search_customers(q: str = Query("", description="得意先名の部分一致")):
+async def search_customers(
+    q: str = Query("", description="得意先名の部分一致"),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, max_length=60, description="前ページの next_after"),
+):
+    """{"items": [...], "has_more": 続きの有無, "next_after": 続きを取るときの after}"""
     q = (q or "").strip()
     if not q:
-        return {"items": []}
+        return {"items": [], "has_more": False, "next_after": None}
+
+    index = get_name_index("customers")
+    if index is not None:
+        key = search_key("customers", {"q": q}, limit=limit, after=after)
+        try:
+            after_code = decode_cursor(after, ORDER_RANK)
+            body = await cached_search(key, lambda: _search_index(index, q, limit, after_code))
+        except (InvalidAfter, InvalidCursor) as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return page_response(body)
 
     sql = """
     SELECT 得意先コード, 得意先名
       FROM 得意先マスタV
      WHERE UTL_I18N.TRANSLITERATE(得意先名, 'hwkatakana_fwkatakana') LIKE UTL_I18N.TRANSLITERATE(:kw, 'hwkatakana_fwkatakana')
+       AND (:after IS NULL OR 得意先コード > :after)
      ORDER BY 得意先コード
-     FETCH FIRST 100 ROWS ONLY
+     FETCH FIRST :n ROWS ONLY
     """
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, {"kw": f"%{q}%"})
-            rows = cur.fetchall()
+    try:
+        after_code = decode_cursor(after, ORDER_CODE)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # 得意先コードは NUMBER。数字以外を渡すと ORA-01722 になるので先に弾く
+    if after_code is not None and not (after_code.isascii() and after_code.isdigit()):
+        raise HTTPException(status_code=400, detail="after is not a customer code")
+    return await stream_page(sql, {"kw": f"%{q}%", "after": after_code, "n": limit + 1}, _SEARCH_COLS, limit)
+
 
-    return {"items": [{"tcode": r[0], "customer_name": r[1]} for r in rows]}
+async def _search_index(index, q: str, limit: int, after: Optional[str]) -> bytes:
+    # limit+1 件目で続きの有無を判定する
+    return page_bytes(index.search(q, limit + 1, after=after), _SEARCH_COLS, limit, order=ORDER_RANK)
 
 
 @router.get("/{tcode}")
-def get_customer(tcode: int):
-    sql = """
-    SELECT 得意先名
-    FROM 得意先マスタV
-    WHERE 得意先コード = :tcode
-    """
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, {"tcode": tcode})
-            row = cur.fetchone()
+async def get_customer(tcode: int):
+    names = await get_repository().customer_names([tcode])
+    return {"tcode": tcode, "customer_name": names.get(tcode)}
+
+
+@router.post("/lookup")
+async def lookup_customers(req: CodeLookupRequest):
+    """get_customer の一括版。{"items": [...]} を codes と同じ順で返す（未ヒットは名称 None）"""
+    # 得意先コードは数値列。数字以外のコードは引かずに未ヒットとする
+    numbers = {code: int(code) for code in req.codes if code.strip().isdigit()}
+    names = await get_repository().customer_names(list(dict.fromkeys(numbers.values())))
 
-    return {"tcode": tcode, "customer_name": row[0] if row else None}
+    return {"items": [{"tcode": code, "customer_name": names.get(numbers.get(code))} for code in req.codes]}
@@ -1,47 +1,73 @@
 # メーカマスタ検索API
-from fastapi import APIRouter, Query
-from app.db import get_conn
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.schemas import CodeLookupRequest
+from app.name_index import InvalidAfter, get_name_index
+from app.search_cache import cached_search, search_key
+from app.repository import get_repository
+from app.search_page import ORDER_CODE, ORDER_RANK, InvalidCursor, decode_cursor, page_bytes, page_response, stream_page
 
 #router = APIRouter(tags=["makers"])
 router = APIRouter(prefix="/makers", tags=["makers"])
 
+# search の SELECT 列順
+_SEARCH_COLS = ("maker_cd", "maker_name")
+
 @router.get("/search")
-def search_makers(q: str = Query("", description="メーカ名(社内用メーカ名)の部分一致")):
+async def search_makers(
+    q: str = Query("", description="メーカ名(社内用メーカ名)の部分一致"),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, max_length=60, description="前ページの next_after"),
+):
+    """{"items": [...], "has_more": 続きの有無, "next_after": 続きを取るときの after}"""
     q = (q or "").strip()
     if not q:
-        return {"items": []}
+        return {"items": [], "has_more": False, "next_after": None}
+
+    index = get_name_index("makers")
+    if index is not None:
+        key = search_key("makers", {"q": q}, limit=limit, after=after)
+        try:
+            after_code = decode_cursor(after, ORDER_RANK)
+            body = await cached_search(key, lambda: _search_index(index, q, limit, after_code))
+        except (InvalidAfter, InvalidCursor) as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return page_response(body)
 
     sql = """
     SELECT メーカコード, 社内用メーカ名
       FROM メーカマスタV
      WHERE UTL_I18N.TRANSLITERATE(社内用メーカ名, 'hwkatakana_fwkatakana') LIKE UTL_I18N.TRANSLITERATE(:kw, 'hwkatakana_fwkatakana')
+       AND (:after IS NULL OR メーカコード > :after)
      ORDER BY メーカコード
-     FETCH FIRST 100 ROWS ONLY
+     FETCH FIRST :n ROWS ONLY
     """
+    try:
+        after_code = decode_cursor(after, ORDER_CODE)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return await stream_page(sql, {"kw": f"%{q}%", "after": after_code, "n": limit + 1}, _SEARCH_COLS, limit)
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, {"kw": f"%{q}%"})
-            rows = cur.fetchall()
 
-    return {"items": [{"maker_cd": r[0], "maker_name": r[1]} for r in rows]}
+async def _search_index(index, q: str, limit: int, after: Optional[str]) -> bytes:
+    # limit+1 件目で続きの有無を判定する
+    return page_bytes(index.search(q, limit + 1, after=after), _SEARCH_COLS, limit, order=ORDER_RANK)
 
 
 @router.get("/{maker_cd}")
-def get_maker(maker_cd: str):
+async def get_maker(maker_cd: str):
     """
     メーカコードから社内用メーカ名を返す。
     未ヒットは200でNoneを返す。
     """
-    sql = """
-    SELECT 社内用メーカ名
-    FROM メーカマスタV
-    WHERE メーカコード = :maker_cd
-    """
+    names = await get_repository().maker_names([maker_cd])
+    return {"maker_cd": maker_cd, "maker_name": names.get(maker_cd)}
+
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, {"maker_cd": maker_cd})
-            row = cur.fetchone()
+@router.post("/lookup")
+async def lookup_makers(req: CodeLookupRequest):
+    """get_maker の一括版。{"items": [...]} を codes と同じ順で返す（未ヒットは名称 None）"""
+    names = await get_repository().maker_names(list(dict.fromkeys(req.codes)))
 
-    return {"maker_cd": maker_cd, "maker_name": row[0] if row else None}
+    return {"items": [{"maker_cd": code, "maker_name": names.get(code)} for code in req.codes]}
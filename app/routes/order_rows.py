@@ -0,0 +1,85 @@
+# 明細行の一括取得API（商品・単位・入数ランク毎の単価）
+"""
+グリッドで商品コードを入力したときの get_product → get_units → pricing/resolve の
+3往復を1回にする。
+
+- 商品・単位・（irank 指定時は）その単価を同時に実行する（それぞれプールから別の接続）
+- 単位が分かったら、残りの入数ランクの単価を resolve_batch と同じ経路で一括決定する
+- 所要時間は Server-Timing ヘッダ（product / units / pricing / pricing_rest / total、ミリ秒）
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable
+
+from fastapi import APIRouter, Query, Response
+
+from app.pricing import PricingKey
+from app.routes.pricing import pricing_response, resolve_pricing_many
+from app.routes.products import get_product, get_units
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/order_rows", tags=["order_rows"])
+
+
+@router.get("/hydrate")
+async def hydrate_row(
+    response: Response,
+    scode: str = Query(..., max_length=50),
+    tcode: str = Query("", max_length=50, description="得意先コード（空なら単価は決定しない）"),
+    jcode: str = Query("", max_length=50, description="需要先コード（空なら単価は決定しない）"),
+    irank: str = Query("", max_length=20, description="選択中の入数ランク（あれば単位の取得と同時に単価を決定）"),
+):
+    """
+    {"product": get_product と同じ, "units": [{..get_units と同じ, "pricing": 単価 or null}],
+     "irank": 選択すべき入数ランク or null, "pricing": その単価 or null}
+    irank は指定値が単位にあればそれ、なければ単位が1つのときだけそのランク
+    """
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    async def timed(name: str, aw: Awaitable[Any]) -> Any:
+        t0 = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            timings[name] = time.perf_counter() - t0
+
+    priced = bool(tcode and jcode)
+
+    def key(rank: str) -> PricingKey:
+        return PricingKey(tcode=tcode, jcode=jcode, scode=scode, irank=rank)
+
+    tasks = [timed("product", get_product(scode)), timed("units", get_units(product_cd=scode))]
+    if priced and irank:
+        tasks.append(timed("pricing", resolve_pricing_many([key(irank)])))
+    product, units, *first = await asyncio.gather(*tasks)
+
+    prices: dict[str, Any] = {}
+    if first:
+        prices[irank] = first[0][0]
+    ranks = [str(u["irisu_rank"]) for u in units if u["irisu_rank"] != ""]
+    rest = [r for r in dict.fromkeys(ranks) if r not in prices]
+    if priced and rest:
+        results = await timed("pricing_rest", resolve_pricing_many([key(r) for r in rest]))
+        prices.update(zip(rest, results))
+
+    selected = irank if irank in ranks else (ranks[0] if len(ranks) == 1 else None)
+
+    def priced_dict(rank: str):
+        pr = prices.get(rank)
+        return pricing_response(pr).model_dump() if pr is not None and rank in ranks else None
+
+    timings["total"] = time.perf_counter() - start
+    response.headers["Server-Timing"] = ", ".join(f"{name};dur={sec * 1000:.1f}" for name, sec in timings.items())
+    logger.info(
+        "order_rows.hydrate: %.3f sec s=%s t=%s j=%s r=%s units=%d priced=%d",
+        timings["total"], scode, tcode, jcode, irank, len(units), len(prices),
+    )
+
+    return {
+        "product": product,
+        "units": [{**u, "pricing": priced_dict(str(u["irisu_rank"]))} for u in units],
+        "irank": selected,
+        "pricing": priced_dict(selected) if selected is not None else None,
+    }
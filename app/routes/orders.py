@@ -0,0 +1,170 @@
+# 受注PDF出力API
+import time
+import asyncio
+import logging
+from tempfile import SpooledTemporaryFile
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.schemas import OrderRequestV2, OrderBulkRequest
+from app.pdf import DEFAULT_TEMPLATE_ID, build_order_pdf_bytes, write_order_pdf
+from app.settings import env_int
+from app.pdf_cache import cached_order_pdf
+from app.order_pdf import combine_pdfs, lookup_supplier_names, order_pdf_filename, to_pdf_payload, zip_pdfs
+from app.pdf_pool import PdfPoolBusy, PdfPoolClosed, job_slot, max_bulk_orders, render_many
+from app.pdf_jobs import get_job, result_path, submit_job
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+_STREAM_READ_SIZE = 64 * 1024
+
+
+def _iter_spool(spool):
+  try:
+    while True:
+      block = spool.read(_STREAM_READ_SIZE)
+      if not block:
+        break
+      yield block
+  finally:
+    spool.close()
+
+
+def _streamed_pdf_response(pdf_header: dict, pdf_items: list[dict], filename: str) -> StreamingResponse:
+  # PDF_SPOOL_MAX_BYTES を超えた分は一時ファイルへ逃がす
+  spool = SpooledTemporaryFile(max_size=env_int("PDF_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+  try:
+    size = write_order_pdf(spool, header=pdf_header, items=pdf_items)
+    spool.seek(0)
+  except Exception:
+    spool.close()
+    raise
+  headers = {
+    "Content-Disposition": f'attachment; filename="{filename}"',
+    "Content-Length": str(size),
+  }
+  return StreamingResponse(_iter_spool(spool), media_type="application/pdf", headers=headers)
+
+
+@router.post("/orders/pdf_v2")
+def create_order_pdf_v2(
+  req: OrderRequestV2,
+  stream: bool = Query(False, description="true: ページを分割描画し一時ファイル経由で返す（大きな受注向け）"),
+):
+
+  start_all = time.perf_counter()
+  logger.info("PDF(v2) generation started")
+
+  supplier_name_map = lookup_supplier_names([req])
+  pdf_header, pdf_items = to_pdf_payload(req, supplier_name_map)
+
+  if stream:
+    response = _streamed_pdf_response(pdf_header, pdf_items, order_pdf_filename(req))
+    logger.info("PDF(v2) streamed: %.3f sec", time.perf_counter() - start_all)
+    return response
+
+  # 同じ内容・同じレイアウトなら前回のPDFを返す（app.pdf_cache）
+  start_pdf = time.perf_counter()
+  pdf, cache_hit = cached_order_pdf(
+    pdf_header, pdf_items, lambda: build_order_pdf_bytes(header=pdf_header, items=pdf_items),
+  )
+  pdf_time = time.perf_counter() - start_pdf
+  logger.info("PDF(v2) build finished: %.3f sec cache=%s", pdf_time, "hit" if cache_hit else "miss")
+
+  total_time = time.perf_counter() - start_all
+  logger.info("PDF(v2) generation completed: %.3f sec", total_time)
+
+  filename = order_pdf_filename(req)
+  headers = {
+    "Content-Disposition": f'attachment; filename="{filename}"',
+    "ETag": pdf.etag,
+    "X-PDF-Cache": "hit" if cache_hit else "miss",
+  }
+  return Response(content=pdf.body, media_type="application/pdf", headers=headers)
+
+
+@router.post("/orders/pdf_bulk")
+async def create_order_pdf_bulk(req: OrderBulkRequest):
+  """
+  複数受注のPDFをプロセスプールで並列生成
+  output=pdf: 1ファイルに連結 / output=zip: 受注毎のPDFをZIP
+  同時処理数の上限を超えたら 503（Retry-After）
+  """
+  limit_orders = max_bulk_orders()
+  if len(req.orders) > limit_orders:
+    raise HTTPException(status_code=413, detail=f"too many orders: {len(req.orders)} > {limit_orders}")
+
+  try:
+    with job_slot():
+      start_all = time.perf_counter()
+      supplier_name_map = await asyncio.to_thread(lookup_supplier_names, req.orders)
+      payloads = [to_pdf_payload(order, supplier_name_map) for order in req.orders]
+
+      start_pdf = time.perf_counter()
+      pdfs = await render_many(payloads, template_id=DEFAULT_TEMPLATE_ID)
+      pdf_time = time.perf_counter() - start_pdf
+
+      if req.output == "zip":
+        body = await asyncio.to_thread(zip_pdfs, [order_pdf_filename(o) for o in req.orders], pdfs)
+        media_type, filename = "application/zip", "orders.zip"
+      else:
+        body = await asyncio.to_thread(combine_pdfs, pdfs)
+        media_type, filename = "application/pdf", "orders.pdf"
+  except PdfPoolBusy:
+    raise HTTPException(status_code=503, detail="PDF bulk generation is busy", headers={"Retry-After": "5"})
+  except PdfPoolClosed:
+    raise HTTPException(status_code=503, detail="PDF pool is shutting down", headers={"Retry-After": "5"})
+
+  logger.info(
+    "PDF(bulk) completed: orders=%d output=%s render=%.3f sec total=%.3f sec bytes=%d",
+    len(req.orders), req.output, pdf_time, time.perf_counter() - start_all, len(body),
+  )
+  headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+  return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _job_view(meta: dict) -> dict:
+  job_id = meta["job_id"]
+  view = {**meta, "status_url": f"/api/orders/jobs/{job_id}"}
+  if meta["status"] == "done":
+    view["result_url"] = f"/api/orders/jobs/{job_id}/result"
+  return view
+
+
+def _job_or_404(job_id: str) -> dict:
+  try:
+    return get_job(job_id)
+  except KeyError:
+    raise HTTPException(status_code=404, detail="job not found")
+
+
+@router.post("/orders/jobs", status_code=202)
+async def create_order_pdf_job(req: OrderRequestV2):
+  """
+  PDF生成ジョブを投入してすぐ返す
+  状態は status_url をポーリング、done になったら result_url から取得
+  """
+  meta = await asyncio.to_thread(submit_job, req.model_dump(mode="json"))
+  logger.info("PDF job queued: id=%s items=%d", meta["job_id"], len(req.items))
+  return _job_view(meta)
+
+
+@router.get("/orders/jobs/{job_id}")
+def get_order_pdf_job(job_id: str):
+  return _job_view(_job_or_404(job_id))
+
+
+@router.get("/orders/jobs/{job_id}/result")
+def get_order_pdf_job_result(job_id: str):
+  meta = _job_or_404(job_id)
+  if meta["status"] == "failed":
+    raise HTTPException(status_code=500, detail=f"job failed: {meta['error']}")
+  if meta["status"] != "done":
+    raise HTTPException(status_code=409, detail=f"job is {meta['status']}")
+  path = result_path(job_id)
+  if not path.exists():
+    raise HTTPException(status_code=404, detail="job result expired")
+  return FileResponse(path, media_type="application/pdf", filename=meta["filename"])
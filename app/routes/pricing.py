@@ -1,17 +1,42 @@
 # 単価マスタ参照API
 import time
 import logging
-from fastapi import APIRouter
+from typing import Optional
 
-from app.db import get_conn
-from app.schemas import PricingResolveRequest, PricingResolveResponse
-from app.pricing import decide_pricing
+from fastapi import APIRouter, Query
+
+from app.schemas import (
+  PricingResolveRequest,
+  PricingResolveResponse,
+  PricingResolveBatchRequest,
+  PricingResolveBatchResponse,
+)
+from app.pricing import PricingKey, PricingResult
+from app.pricing_cache import flush_pricing_cache, pricing_cache_stats as cache_stats
+from app.price_index import price_index_stats
+from app.repository import get_repository
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+
+async def resolve_pricing_many(keys: list[PricingKey]) -> list[PricingResult]:
+  """resolve_batch と同じ経路（app.repository）で複数キーを決定。結果は入力順"""
+  return await get_repository().pricing_many(keys)
+
+
+def pricing_response(pr: PricingResult) -> PricingResolveResponse:
+  return PricingResolveResponse(
+    source=pr.source,
+    teika=pr.teika,
+    sales_price=pr.sales_price,
+    purchase_price=pr.purchase_price,
+    supplier_code=pr.supplier_code,
+  )
+
+
 @router.post("/pricing/resolve", response_model=PricingResolveResponse)
-def pricing_resolve(req: PricingResolveRequest):
+async def pricing_resolve(req: PricingResolveRequest):
   """
   入力画面から1明細ずつ呼ぶ
   単価決定
@@ -19,15 +44,8 @@ def pricing_resolve(req: PricingResolveRequest):
   """
   start = time.perf_counter()
 
-  with get_conn() as conn:
-    with conn.cursor() as cur:
-      pr = decide_pricing(
-        cur,
-        tcode=req.tcode,
-        jcode=req.jcode,
-        scode=req.scode,
-        irank=req.irank,
-      )
+  key = PricingKey(tcode=req.tcode, jcode=req.jcode, scode=req.scode, irank=req.irank)
+  pr = await get_repository().pricing(key)
 
   elapsed = time.perf_counter() - start
   logger.info(
@@ -35,10 +53,52 @@ def pricing_resolve(req: PricingResolveRequest):
     elapsed, req.tcode, req.jcode, req.scode, req.irank, pr.source, pr.sales_price, pr.purchase_price, pr.teika
   )
 
-  return PricingResolveResponse(
-    source=pr.source,
-    teika=pr.teika,
-    sales_price=pr.sales_price,
-    purchase_price=pr.purchase_price,
-    supplier_code=pr.supplier_code,
+  return pricing_response(pr)
+
+
+@router.post("/pricing/resolve_batch", response_model=PricingResolveBatchResponse)
+async def pricing_resolve_batch(req: PricingResolveBatchRequest):
+  """
+  明細グリッド全体の単価をまとめて決定（結果は入力順）
+  重複キーは1回だけ解決する
+  """
+  start = time.perf_counter()
+
+  keys = [PricingKey(tcode=it.tcode, jcode=it.jcode, scode=it.scode, irank=it.irank) for it in req.items]
+  results = await resolve_pricing_many(keys)
+
+  elapsed = time.perf_counter() - start
+  logger.info(
+    "pricing.resolve_batch: %.3f sec rows=%d unique=%d",
+    elapsed, len(keys), len(set(keys)),
   )
+
+  return PricingResolveBatchResponse(items=[pricing_response(pr) for pr in results])
+
+
+# ---- 単価キャッシュ管理 ----
+
+@router.get("/pricing/cache/stats")
+def pricing_cache_stats():
+  """ヒット/ミス/追い出し件数（サイズ調整用）"""
+  return cache_stats()
+
+
+@router.post("/pricing/cache/flush")
+def pricing_cache_flush(
+  tcode: Optional[str] = Query(None, description="この得意先のキーだけ破棄"),
+  scode: Optional[str] = Query(None, description="この商品のキーだけ破棄"),
+):
+  """
+  単価マスタ更新後に呼ぶ。条件なしなら全件破棄
+  flush ファイル経由で全ワーカーに効く（removed はこのワーカーで消えた件数）
+  """
+  removed = flush_pricing_cache(tcode=tcode, scode=scode)
+  logger.info("pricing.cache.flush: t=%s s=%s removed=%d", tcode, scode, removed)
+  return {"removed": removed}
+
+
+@router.get("/pricing/index/stats")
+def pricing_index_stats():
+  """メモリ索引の読み込み状況（PRICING_ENGINE=memory 時）"""
+  return price_index_stats()
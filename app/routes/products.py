@@ -1,24 +1,89 @@
 # 商品マスタ取得API
-from fastapi import APIRouter, Query
-from app.db import get_conn
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.schemas import CodeLookupRequest
+from app.product_index import InvalidAfter, get_product_index
+from app.repository import get_repository
+from app.search_cache import cached_search, search_key
+from app.search_page import ORDER_CODE, ORDER_RANK, InvalidCursor, decode_cursor, page_bytes, page_response, stream_page
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# search_products の SELECT 列順
+_SEARCH_COLS = ("product_cd", "product_name", "spec", "maker_cd", "maker_name", "maker_part_no")
+
 
 @router.get("/search")
-def search_products(
+async def search_products(
     maker_cd: str = Query("", max_length=50),
     maker_name: str = Query("", max_length=200),
     maker_part_no: str = Query("", max_length=200),
     product_name: str = Query("", max_length=200),
     spec: str = Query("", max_length=200),
+    q: str = Query("", max_length=200, description="キーワード（空白区切り、全項目から重み付きで検索）"),
     limit: int = Query(200, ge=1, le=2000),
+    after: Optional[str] = Query(None, max_length=60, description="前ページの next_after"),
 ):
     """
     商品検索（部分一致）
-    戻り値キーは英語に統一:
+    {"items": [...], "has_more": 続きの有無, "next_after": 続きを取るときの after}
+    items のキーは英語に統一:
       product_cd, product_name, spec, maker_cd, maker_name, maker_part_no
     """
+    index = get_product_index()
+    if index is not None:
+        # キーワード検索はスコア順、項目検索は商品コード順（SQL 経路と同じ）
+        order = ORDER_RANK if q.strip() else ORDER_CODE
+
+        async def _load():
+            # limit+1 行目で続きの有無を判定する
+            filters = {
+                "maker_cd": maker_cd, "maker_name": maker_name, "maker_part_no": maker_part_no,
+                "product_name": product_name, "spec": spec,
+            }
+            if q.strip():
+                rows = index.search_keywords(q, **filters, limit=limit + 1, after=after_code)
+            else:
+                rows = index.search(**filters, limit=limit + 1, after=after_code)
+            return page_bytes(rows, _SEARCH_COLS, limit, order=order)
+
+        key = search_key(
+            "products",
+            {"maker_name": maker_name, "maker_part_no": maker_part_no, "product_name": product_name, "spec": spec, "q": q},
+            maker_cd=maker_cd, limit=limit, after=after,
+        )
+        try:
+            after_code = decode_cursor(after, order)
+            body = await cached_search(key, _load)
+        except (InvalidAfter, InvalidCursor) as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return page_response(body)
+
+    try:
+        after_code = decode_cursor(after, ORDER_CODE)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    sql, params = _search_products_sql(maker_cd, maker_name, maker_part_no, product_name, spec, q, limit, after_code)
+    return await stream_page(sql, params, _SEARCH_COLS, limit)
+
+
+def _fold(expr: str) -> str:
+    """半角カナ→全角・英字の大小を揃える（検索キャッシュのキーと同じ揺れを吸収する）。"""
+    return f"UPPER(UTL_I18N.TRANSLITERATE({expr}, 'hwkatakana_fwkatakana'))"
+
+
+def _search_products_sql(
+    maker_cd: str,
+    maker_name: str,
+    maker_part_no: str,
+    product_name: str,
+    spec: str,
+    q: str,
+    limit: int,
+    after: Optional[str],
+) -> tuple[str, dict]:
+    """索引が未読込のときの SQL 経路（商品コード順、limit+1 行まで）。"""
     where = []
     params = {}
 
@@ -28,7 +93,7 @@ def search_products(
         params["maker_cd"] = maker_cd
 
     if maker_name:
-        where.append("M.社内用メーカ名 LIKE :maker_name")
+        where.append(f"{_fold('M.社内用メーカ名')} LIKE {_fold(':maker_name')}")
         params["maker_name"] = f"%{maker_name}%"
 
     if maker_part_no:
@@ -36,16 +101,32 @@ def search_products(
         params["maker_part_no"] = f"%{maker_part_no}%"
 
     if product_name:
-        where.append("P.商品名 LIKE :product_name")
+        where.append(f"{_fold('P.商品名')} LIKE {_fold(':product_name')}")
         params["product_name"] = f"%{product_name}%"
 
     if spec:
-        where.append("P.規格 LIKE :spec")
+        where.append(f"{_fold('P.規格')} LIKE {_fold(':spec')}")
         params["spec"] = f"%{spec}%"
 
+    # キーワードは各語がいずれかの項目に含まれる
+    for i, word in enumerate(q.split()):
+        key = f"q{i}"
+        where.append(
+            "(" + " OR ".join(
+                f"{_fold(col)} LIKE {_fold(':' + key)}"
+                for col in ("P.商品名", "P.規格", "P.メーカ品番", "M.社内用メーカ名")
+            ) + ")"
+        )
+        params[key] = f"%{word}%"
+
+    if after:
+        where.append("P.商品コード > :after")
+        params["after"] = after
+
     where_sql = " AND ".join(where) if where else "1=1"
 
-    params["limit"] = int(limit)
+    # 1件多く取って続きの有無を判定する
+    params["limit"] = int(limit) + 1
 
     sql = f"""
             SELECT *
@@ -65,89 +146,56 @@ def search_products(
             )
             WHERE ROWNUM <= :limit
             """
+    return sql, params
+
+
+def _unit_dict(r) -> dict:
+    return {
+        "unit_name": r[0] or "",
+        "irisu_name": r[1] or "",
+        "irisu_rank": r[2] if r[2] is not None else "",
+    }
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            cols = [d[0].lower() for d in cur.description]  # aliasをlower化
-            return [dict(zip(cols, r)) for r in rows]
 
-# 単位取得
 @router.get("/units")
-def get_units(product_cd: str = Query(..., max_length=50)):
-    sql = """
-    SELECT 単位.単位名 AS unit_name
-          ,入数.入数名 AS irisu_name
-          ,入数.入数ランク AS irisu_rank
-      FROM 商品入数マスタV 入数
-      LEFT JOIN 単位マスタV 単位 ON (入数.単位コード = 単位.単位コード)
-     WHERE 商品コード = :product_cd
-     ORDER BY 入数.順序
+async def get_units(product_cd: str = Query(..., max_length=50)):
+    units = await get_repository().units([product_cd])
+    return [_unit_dict(r) for r in units[product_cd]]
+
+
+@router.post("/units/lookup")
+async def lookup_units(req: CodeLookupRequest):
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(sql, {"product_cd": product_cd})
-        rows = cur.fetchall()
+    get_units の一括版。{"items": {商品コード: [単位...]}}（単位の無い商品は []）
+    """
+    units = await get_repository().units(req.codes)
+    return {"items": {code: [_unit_dict(r) for r in rows] for code, rows in units.items()}}
+
+
+# get_product の戻り値キー（app.repository の SQL_PRODUCTS_BY_KEYS の列順）
+_PRODUCT_COLS = ("maker_cd", "maker_name", "product_name", "maker_part_no", "spec", "supplier_code", "supplier_name")
 
-    return [
-        {
-            "unit_name": r[0] or "",
-            "irisu_name": r[1] or "",
-            "irisu_rank": r[2] if r[2] is not None else "",
-        }
-        for r in rows
-    ]
+
+def _product_dict(scode: str, row) -> dict:
+    """未ヒット（row=None）は各項目 None。"""
+    return {"product_cd": scode, **dict(zip(_PRODUCT_COLS, row or (None,) * len(_PRODUCT_COLS)))}
 
 
 @router.get("/{scode}")
-def get_product(scode: str):
+async def get_product(scode: str):
     """
     商品コードから商品情報を返す（キーは英語）
     未ヒットは200でNoneを返す
     """
-    sql = """
-    SELECT
-        M_商品.メーカコード,
-        M_メカ.社内用メーカ名,
-        M_商品.商品名,
-        M_商品.メーカ品番,
-        M_商品.規格,
-        M_商品.仕入先コード,
-        M_仕入.仕入先名
-      FROM 商品マスタV M_商品
-      LEFT JOIN メーカマスタV M_メカ
-        ON M_商品.メーカコード = M_メカ.メーカコード
-      LEFT JOIN 仕入先マスタV M_仕入
-        ON M_商品.仕入先コード = M_仕入.仕入先コード
-     WHERE M_商品.商品コード = :scode
-    """
+    found = await get_repository().products([scode])
+    return _product_dict(scode, found.get(scode))
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, {"scode": scode})
-            row = cur.fetchone()
-
-    if not row:
-        return {
-            "product_cd": scode,
-            "maker_cd": None,
-            "maker_name": None,
-            "product_name": None,
-            "maker_part_no": None,
-            "spec": None,
-            "supplier_code": None,
-            "supplier_name": None,
-        }
 
-    return {
-        "product_cd": scode,
-        "maker_cd": row[0],
-        "maker_name": row[1],
-        "product_name": row[2],
-        "maker_part_no": row[3],
-        "spec": row[4],
-        "supplier_code": row[5],
-        "supplier_name": row[6],
-    }
+@router.post("/lookup")
+async def lookup_products(req: CodeLookupRequest):
+    """
+    get_product の一括版。{"items": [...]} を codes と同じ順で返す（未ヒットは各項目 None）
+    """
+    found = await get_repository().products(list(dict.fromkeys(req.codes)))
 
+    return {"items": [_product_dict(code, found.get(code)) for code in req.codes]}
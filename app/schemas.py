@@ -80,6 +80,19 @@ class OrderRequestV2(BaseModel):
     items: List[OrderItemConfirmed]
 
 
+class OrderBulkRequest(BaseModel):
+    """一括PDF生成。件数上限は PDF_BULK_MAX_ORDERS（ルート側で検査）。"""
+    orders: List[OrderRequestV2] = Field(..., min_length=1, description="受注（pdf_v2 と同じ形）")
+    output: Literal["pdf", "zip"] = Field("pdf", description="pdf=1ファイルに連結 / zip=受注毎のPDF")
+
+
+# ---- マスタ一括参照 ----
+
+class CodeLookupRequest(BaseModel):
+    """/lookup 系（商品・単位・得意先・需要先・メーカ）の一括参照。"""
+    codes: List[str] = Field(..., min_length=1, max_length=1000, description="コード（重複可。結果は同じ順で返す）")
+
+
 # ---- 商品マスタ----
 
 class ProductItem(BaseModel):
@@ -118,3 +131,11 @@ class PricingResolveResponse(BaseModel):
     sales_price: int            # 売上単価(未ヒットは0)
     purchase_price: int         # 仕入単価(未ヒットは0)
     supplier_code: Optional[str] = None  # 仕入先コード
+
+
+class PricingResolveBatchRequest(BaseModel):
+    items: List[PricingResolveRequest] = Field(..., max_length=1000, description="解決対象（入力順で返す）")
+
+
+class PricingResolveBatchResponse(BaseModel):
+    items: List[PricingResolveResponse]
@@ -0,0 +1,54 @@
+# マスタ検索結果のキャッシュ
+"""
+/customers, /shipto, /makers, /products の search 結果を短時間保持する。
+キーは検索語を app.textnorm で正規化したもの（"ｺｰﾋｰ" と "コーヒー" は同じエントリ）。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| SEARCH_CACHE_SIZE | 2000 | 保持する検索条件数の上限 (0=無効) |
+| SEARCH_CACHE_TTL_SEC | 60 | 1件の有効秒数 |
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+from app.settings import env_float, env_int
+from app.textnorm import normalize_key
+from app.ttl_cache import TtlLruCache
+
+SearchKey = tuple
+
+_CACHE: Optional[TtlLruCache[SearchKey, Any]] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_search_cache() -> TtlLruCache[SearchKey, Any]:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = TtlLruCache(
+                    maxsize=env_int("SEARCH_CACHE_SIZE", 2000),
+                    ttl_sec=env_float("SEARCH_CACHE_TTL_SEC", 60),
+                )
+    return _CACHE
+
+
+def search_key(kind: str, terms: dict[str, str], **extra: Any) -> SearchKey:
+    """terms（検索語）は正規化し、extra（コード・件数・cursor 等）はそのままキーにする。"""
+    return (
+        kind,
+        tuple((name, normalize_key(value or "")) for name, value in sorted(terms.items())),
+        tuple(sorted(extra.items())),
+    )
+
+
+async def cached_search(key: SearchKey, load: Callable[[], Awaitable[Any]]) -> Any:
+    cache = get_search_cache()
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    value = await load()
+    cache.put(key, value)
+    return value
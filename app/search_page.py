@@ -0,0 +1,170 @@
+# マスタ検索結果の JSON 出力（行タプルから直接組み立てる）
+"""
+/customers, /shipto, /makers, /products の search は
+{"items": [...], "has_more": bool, "next_after": cursor} を返す。
+行毎の dict と全件のリストを作らず、行タプルから JSON 文字列を直接組み立てる。
+
+- page_bytes: メモリ索引の結果（検索キャッシュにはこの bytes をそのまま入れる）
+- stream_page: SQL を実行し、arraysize 件ずつ受け取りながら StreamingResponse で送る
+  （送り終わるまで DB 接続と "search" の同時実行枠を保持する）
+
+呼び出し側は limit+1 行を渡す（取る）。limit+1 行目があれば has_more=true で、その行は出力しない。
+続きは next_after を after= に渡して取得する。
+
+cursor は "<並び順>:<最後の行のコード>"。並び順は ORDER_CODE（コード順。SQL 経路・商品の項目検索）と
+ORDER_RANK（メモリ索引の順位順）で、同じ検索でも索引の読み込み前後で経路が変わると並びが変わるため、
+別の並び順で作られた after は decode_cursor が InvalidCursor にする（ルートは 400 を返す）。
+印の無い after（従来の形）はコード順とみなす。
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| SEARCH_FETCH_ARRAYSIZE | 500 | DB から1回の往復で受け取る行数の上限（arraysize / prefetchrows） |
+"""
+from __future__ import annotations
+
+import json
+from contextlib import aclosing
+from datetime import date, datetime
+from decimal import Decimal
+from json.encoder import encode_basestring
+from typing import Any, AsyncIterator, Iterable, Optional, Sequence
+
+from fastapi.responses import Response, StreamingResponse
+
+from app.concurrency import limit as db_limit
+from app.db import iter_rows
+from app.settings import env_int
+
+MEDIA_TYPE = "application/json"
+
+ORDER_CODE = "c"
+ORDER_RANK = "r"
+
+
+class InvalidCursor(ValueError):
+    """after が別の並び順の経路で作られた（索引の読み込み・失効で経路が変わった）。"""
+
+
+def _code_text(v: Any) -> str:
+    if isinstance(v, Decimal) and v == v.to_integral_value():
+        return str(int(v))
+    return str(v)
+
+
+def encode_cursor(order: str, code: Any) -> str:
+    return f"{order}:{_code_text(code)}"
+
+
+def decode_cursor(after: Optional[str], order: str) -> Optional[str]:
+    """after= から前ページ最後のコードを取り出す。並び順が order と違えば InvalidCursor。"""
+    if not after:
+        return None
+    head, sep, code = after.partition(":")
+    if not sep:
+        head, code = ORDER_CODE, after
+    if head != order:
+        raise InvalidCursor(f"after={after} was issued for a different result order; search again from the first page")
+    return code
+
+
+def fetch_arraysize(limit: int) -> int:
+    """limit+1 行を取り切れる範囲で、1往復の行数を抑える。"""
+    return max(min(limit + 1, env_int("SEARCH_FETCH_ARRAYSIZE", 500)), 1)
+
+
+def _value(v: Any) -> str:
+    if v is None:
+        return "null"
+    if isinstance(v, str):
+        return encode_basestring(v)
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, Decimal):
+        # NUMBER 列。jsonable_encoder と同じく整数なら int、それ以外は float
+        return str(int(v)) if v == v.to_integral_value() else json.dumps(float(v))
+    if isinstance(v, (int, float)):
+        return json.dumps(v)
+    if isinstance(v, (datetime, date)):
+        return encode_basestring(v.isoformat())
+    return encode_basestring(str(v))
+
+
+class _PageWriter:
+    def __init__(self, columns: Sequence[str], limit: int, order: str) -> None:
+        self.order = order
+        self._prefixes = [("{" if i == 0 else ",") + encode_basestring(c) + ":" for i, c in enumerate(columns)]
+        self.limit = limit
+        self.count = 0
+        self.has_more = False
+        self.last: Optional[tuple] = None
+
+    def head(self) -> str:
+        return '{"items":['
+
+    def rows(self, rows: Iterable[tuple]) -> str:
+        """受け取った行を JSON 断片にする。limit 行を超えた分は has_more にするだけで出力しない。"""
+        parts = []
+        for row in rows:
+            if self.count >= self.limit:
+                self.has_more = True
+                break
+            parts.append(("," if self.count else "") + "".join([p + _value(v) for p, v in zip(self._prefixes, row)]) + "}")
+            self.count += 1
+            self.last = row
+        return "".join(parts)
+
+    def tail(self) -> str:
+        next_after = (
+            encode_basestring(encode_cursor(self.order, self.last[0]))
+            if self.has_more and self.last is not None else "null"
+        )
+        return f'],"has_more":{"true" if self.has_more else "false"},"next_after":{next_after}}}'
+
+
+def page_bytes(rows: Iterable[tuple], columns: Sequence[str], limit: int, *, order: str) -> bytes:
+    """limit+1 行までの行タプルを1ページ分の JSON にする。order は rows の並び順（cursor の印）。"""
+    w = _PageWriter(columns, limit, order)
+    return (w.head() + w.rows(rows) + w.tail()).encode("utf-8")
+
+
+def page_response(body: bytes) -> Response:
+    return Response(content=body, media_type=MEDIA_TYPE)
+
+
+async def _batches(sql: str, params: dict, limit: int) -> AsyncIterator[list[tuple]]:
+    async with db_limit("search"):
+        async with aclosing(iter_rows(sql, params, arraysize=fetch_arraysize(limit))) as rows:
+            async for batch in rows:
+                yield batch
+
+
+async def _stream(first: list[tuple], batches: AsyncIterator[list[tuple]], w: _PageWriter) -> AsyncIterator[bytes]:
+    try:
+        yield (w.head() + w.rows(first)).encode("utf-8")
+        if not w.has_more:
+            async for rows in batches:
+                part = w.rows(rows)
+                if part:
+                    yield part.encode("utf-8")
+                if w.has_more:
+                    break
+        yield w.tail().encode("utf-8")
+    finally:
+        # 途中で抜けた・切断されたときもカーソルと接続を返す
+        await batches.aclose()
+
+
+async def stream_page(
+    sql: str, params: dict, columns: Sequence[str], limit: int, *, order: str = ORDER_CODE,
+) -> StreamingResponse:
+    """
+    SQL（limit+1 行で打ち切ること）の結果を順に JSON 断片にして送る。
+    最初のバッチまではここで受け取るので、SQL のエラーは通常の 500 になる。
+    """
+    batches = _batches(sql, params, limit)
+    try:
+        first = await anext(batches, [])
+    except BaseException:
+        await batches.aclose()
+        raise
+    return StreamingResponse(_stream(first, batches, _PageWriter(columns, limit, order)), media_type=MEDIA_TYPE)
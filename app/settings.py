@@ -0,0 +1,41 @@
+# 環境変数からの設定値読み込み
+"""
+環境変数は .env (python-dotenv) を main.py の import 後に読み込むため、
+各モジュールは import 時ではなく利用時にこれらの関数で値を取得する。
+"""
+
+import os
+
+
+def env_str(name: str, default: str = "") -> str:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip()
+
+
+def env_int(name: str, default: int) -> int:
+    value = env_str(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    value = env_str(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = env_str(name).lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
@@ -0,0 +1,121 @@
+# 仕入先名キャッシュ（PDF の仕入先名補完）
+"""
+受注 PDF で仕入先名が空の明細は、仕入先コードから名称を補う。
+起動時と SUPPLIER_CACHE_REFRESH_SEC 毎に 仕入先マスタV を全件読み込んでおき、
+PDF 生成時はほぼ DB に触れない。
+
+- 引く順: このキャッシュ → app.repository（マスタスナップショット → Oracle。DATA_BACKEND=replica
+  ならスナップショットだけ）
+- Oracle へはキーの配列を1つバインドする固定の SQL（コード数によらず同じ文なので文キャッシュが効く）
+- 見つからなかったコードも空文字で TTL の間は保持する（同じ未登録コードで毎回 DB に行かない）
+
+| 変数 | 既定 | 用途 |
+| --- | --- | --- |
+| SUPPLIER_CACHE_SIZE | 20000 | 保持する仕入先数の上限 (0=無効) |
+| SUPPLIER_CACHE_TTL_SEC | 3600 | 1件の有効秒数 |
+| SUPPLIER_CACHE_REFRESH_SEC | 1800 | 全件読み込みの間隔（0 で読み込まず、未ヒット時だけ引く） |
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from app.db import get_conn
+from app.repository import get_repository
+from app.settings import env_float, env_int
+from app.ttl_cache import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+SQL_ALL_SUPPLIERS = "SELECT 仕入先コード, 仕入先名 FROM 仕入先マスタV"
+
+_CACHE: Optional[TtlLruCache[str, str]] = None
+_CACHE_LOCK = threading.Lock()
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+_LAST_WARM: dict[str, Any] = {"at": None, "rows": 0, "sec": None, "error": None}
+
+
+def get_supplier_cache() -> TtlLruCache[str, str]:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = TtlLruCache(
+                    maxsize=env_int("SUPPLIER_CACHE_SIZE", 20000),
+                    ttl_sec=env_float("SUPPLIER_CACHE_TTL_SEC", 3600),
+                )
+    return _CACHE
+
+
+def warm_supplier_cache(cur) -> int:
+    """仕入先マスタV を全件キャッシュに入れ、件数を返す。"""
+    start = time.perf_counter()
+    cache = get_supplier_cache()
+    cur.arraysize = 5000
+    cur.execute(SQL_ALL_SUPPLIERS)
+    rows = cur.fetchall()
+    for code, name in rows:
+        cache.put(str(code), name or "")
+    if len(rows) > cache.maxsize:
+        logger.warning("supplier_cache: %d suppliers > SUPPLIER_CACHE_SIZE=%d", len(rows), cache.maxsize)
+    _LAST_WARM.update(at=time.time(), rows=len(rows), sec=time.perf_counter() - start)
+    logger.info("supplier_cache warmed: rows=%d %.3f sec", len(rows), _LAST_WARM["sec"])
+    return len(rows)
+
+
+def resolve_supplier_names(codes: Iterable[str]) -> dict[str, str]:
+    """仕入先コード → 仕入先名（未登録は空文字）。"""
+    cache = get_supplier_cache()
+    names: dict[str, str] = {}
+    missing: list[str] = []
+    for code in dict.fromkeys(codes):
+        name = cache.get(code)
+        if name is None:
+            missing.append(code)
+        else:
+            names[code] = name
+
+    if missing:
+        found = get_repository().supplier_names_sync(missing)
+        for code in missing:
+            names[code] = found.get(code) or ""
+            cache.put(code, names[code])
+    return names
+
+
+def _refresh_loop(interval: float) -> None:
+    while not _STOP.is_set():
+        try:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    warm_supplier_cache(cur)
+            _LAST_WARM["error"] = None
+        except Exception as exc:
+            _LAST_WARM["error"] = str(exc)
+            logger.warning("supplier_cache warm failed: %s", exc)
+        _STOP.wait(interval)
+
+
+def start_supplier_cache() -> None:
+    global _THREAD
+    interval = env_float("SUPPLIER_CACHE_REFRESH_SEC", 1800)
+    if interval <= 0 or not get_supplier_cache().enabled or _THREAD is not None:
+        return
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_refresh_loop, args=(interval,), name="supplier-cache", daemon=True)
+    _THREAD.start()
+
+
+def stop_supplier_cache() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+
+
+def supplier_cache_stats() -> dict[str, Any]:
+    return {**get_supplier_cache().stats(), "warm": dict(_LAST_WARM)}
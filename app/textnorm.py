@@ -0,0 +1,75 @@
+# 日本語テキストの正規化（検索語・索引語・キャッシュキー共通）
+"""
+Oracle 側の UTL_I18N.TRANSLITERATE(..., 'hwkatakana_fwkatakana') 相当を含め、
+表記揺れを吸収した比較用の文字列を作る。
+
+- NFKC（半角カナ→全角、全角英数→半角、㈱→(株) など）
+- ハイフン類（‐ ‑ ‒ – — ― − ﹣ －）は "-" に統一し、かな・カナの直後なら長音 "ー" とみなす
+- 半角長音 "ｰ" は "ー" に統一（罫線 ━ ─ や 〜 は対象外）
+- 空白の連続は1つに、前後の空白は除去
+- casefold
+
+ASCII のみの文字列は NFKC を通さず、変換表（str.translate）は対象文字を含むときだけ通す。
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any
+
+# NFKC の後に残る揺れを1回の translate で潰すための変換表
+_HYPHENS = "‐‑‒–—―−﹣－"
+_LONG_VOWELS = "ｰ"  # 半角長音（NFKC 前の文字列にも効くように）
+_SPACES = "　    \t\r\n"
+
+_TABLE = str.maketrans(
+    {
+        **{ch: "-" for ch in _HYPHENS},
+        **{ch: "ー" for ch in _LONG_VOWELS},
+        **{ch: " " for ch in _SPACES},
+    }
+)
+
+# 変換表の対象文字。str.translate は非 ASCII 文字列だと遅いので、含まれるときだけ通す
+_VARIANTS = re.compile("[" + re.escape(_HYPHENS + _LONG_VOWELS + _SPACES) + "]")
+
+# かな・カナ（長音含む）の直後のハイフンは長音
+_KANA_HYPHEN = re.compile(r"(?<=[ぁ-ゖァ-ヺー])-")
+_MULTI_SPACE = re.compile(r" {2,}")
+
+# 品番・コード比較で無視する区切り
+_CODE_NOISE = re.compile(r"[\s\-ー_./・]")
+
+
+def normalize(text: Any) -> str:
+    """比較用に正規化した文字列。None は ""。"""
+    if text is None:
+        return ""
+    s = str(text)
+    if s.isascii():
+        # ASCII は NFKC・かな処理とも不要
+        if "\t" in s or "\r" in s or "\n" in s:
+            s = s.translate(_TABLE)
+    else:
+        # NFKC 済みかどうかの判定は unicodedata.normalize 自身が先に行う
+        s = unicodedata.normalize("NFKC", s)
+        if _VARIANTS.search(s) is not None:
+            s = s.translate(_TABLE)
+        # "－" や半角カナ直後の "-" は NFKC で ASCII の "-" になり、変換表を通らない
+        if "-" in s:
+            s = _KANA_HYPHEN.sub("ー", s)
+    if "  " in s:
+        s = _MULTI_SPACE.sub(" ", s)
+    return s.strip().casefold()
+
+
+def normalize_code(text: Any) -> str:
+    """品番等の比較用。normalize に加えてハイフン・長音・空白・区切り記号を除く（"ABC-12 3" == "abc123"）。"""
+    return _CODE_NOISE.sub("", normalize(text))
+
+
+@lru_cache(maxsize=4096)
+def normalize_key(text: str) -> str:
+    """キャッシュキー用（同じ語の繰り返しが多いので結果を覚えておく）。"""
+    return normalize(text)
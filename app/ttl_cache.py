@@ -0,0 +1,104 @@
+# プロセス内 LRU + TTL キャッシュ
+"""
+単価決定・マスタ検索の結果キャッシュで共用する。スレッドセーフ。
+maxsize=0 で無効（get は常に None、put は何もしない）。
+generation は clear / invalidate_where のたびに増える。読み込み前に控えた値を put に渡すと、
+読み込み中に破棄が入った結果は入れない。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TtlLruCache(Generic[K, V]):
+    def __init__(self, maxsize: int, ttl_sec: float) -> None:
+        self.maxsize = max(int(maxsize), 0)
+        self.ttl_sec = float(ttl_sec)
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: K) -> Optional[V]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V, *, generation: Optional[int] = None) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_sec
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_puts += 1
+                return
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_where(self, match: Callable[[K], bool]) -> int:
+        """match(key) が真のキーを破棄し、件数を返す。"""
+        with self._lock:
+            targets = [k for k in self._data if match(k)]
+            for k in targets:
+                del self._data[k]
+            self.invalidations += len(targets)
+            self.generation += 1
+            return len(targets)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            self.invalidations += n
+            self.generation += 1
+            return n
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+                "generation": self.generation,
+            }
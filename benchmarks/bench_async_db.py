@@ -0,0 +1,162 @@
+# sync / async ルートのスループット比較
+"""
+Oracle の代わりに「固定レイテンシで応答し、同時セッション数に上限がある」スタンドイン DB を使い、
+重い検索と軽いコード参照を混ぜた負荷で以下を比較する。
+
+- sync : 旧実装相当。def ルートを Starlette と同じくスレッドプール(既定40)で実行し、DB 待ちでスレッドを占有
+- async: app/routes の async def ルートを実際に呼ぶ。fetch_one / iter_rows だけスタンドインに差し替え
+
+    python -m benchmarks.bench_async_db --clients 200 --requests 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StandInDB:
+    """クエリ種別毎の固定レイテンシ + セッション数上限だけを持つ DB の代役。"""
+
+    def __init__(self, *, sessions: int, search_ms: float, lookup_ms: float) -> None:
+        self.sessions = sessions
+        self.search_sec = search_ms / 1000
+        self.lookup_sec = lookup_ms / 1000
+        self._sync_sem = threading.BoundedSemaphore(sessions)
+        self._async_sem: asyncio.Semaphore | None = None
+
+    def _latency(self, sql: str) -> float:
+        return self.search_sec if "LIKE" in sql else self.lookup_sec
+
+    def query_sync(self, sql: str) -> None:
+        with self._sync_sem:
+            time.sleep(self._latency(sql))
+
+    async def query_async(self, sql: str) -> None:
+        if self._async_sem is None:
+            self._async_sem = asyncio.Semaphore(self.sessions)
+        async with self._async_sem:
+            await asyncio.sleep(self._latency(sql))
+
+    async def fetch_all(self, sql: str, params=None) -> list[tuple]:
+        await self.query_async(sql)
+        return [("1", "スタンドイン")]
+
+    async def fetch_one(self, sql: str, params=None):
+        await self.query_async(sql)
+        return ("スタンドイン",)
+
+    async def iter_rows(self, sql: str, params=None, *, arraysize: int = 500):
+        await self.query_async(sql)
+        yield [("1", "スタンドイン")]
+
+
+def _workload(n: int, search_ratio: float, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    return ["search" if rnd.random() < search_ratio else "lookup" for _ in range(n)]
+
+
+def _summary(kind_latencies: dict[str, list[float]], elapsed: float, total: int) -> dict:
+    out = {"throughput_rps": round(total / elapsed, 1), "elapsed_sec": round(elapsed, 3)}
+    for kind, lat in kind_latencies.items():
+        if not lat:
+            continue
+        lat = sorted(lat)
+        out[kind] = {
+            "n": len(lat),
+            "p50_ms": round(statistics.median(lat) * 1000, 1),
+            "p95_ms": round(lat[int(len(lat) * 0.95) - 1] * 1000, 1),
+        }
+    return out
+
+
+async def _run_sync(db: StandInDB, work: list[str], clients: int, threads: int) -> dict:
+    # Starlette と同じく、def ルートはイベントループからスレッドプールへ投げられる
+    search_sql = "SELECT ... WHERE name LIKE :kw"
+    lookup_sql = "SELECT ... WHERE code = :code"
+    lat: dict[str, list[float]] = {"search": [], "lookup": []}
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for kind in work:
+        queue.put_nowait(kind)
+
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        async def client() -> None:
+            while not queue.empty():
+                kind = queue.get_nowait()
+                t0 = time.perf_counter()
+                await loop.run_in_executor(ex, db.query_sync, search_sql if kind == "search" else lookup_sql)
+                lat[kind].append(time.perf_counter() - t0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return _summary(lat, time.perf_counter() - start, len(work))
+
+
+async def _run_async(db: StandInDB, work: list[str], clients: int) -> dict:
+    import app.routes.customers as customers
+    import app.search_page as search_page
+
+    customers.fetch_one = db.fetch_one
+    search_page.iter_rows = db.iter_rows
+
+    lat: dict[str, list[float]] = {"search": [], "lookup": []}
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for kind in work:
+        queue.put_nowait(kind)
+
+    async def client() -> None:
+        while not queue.empty():
+            kind = queue.get_nowait()
+            t0 = time.perf_counter()
+            if kind == "search":
+                res = await customers.search_customers(q="スタンド", limit=100, after=None)
+                async for _ in res.body_iterator:
+                    pass
+            else:
+                await customers.get_customer(tcode=1)
+            lat[kind].append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return _summary(lat, time.perf_counter() - start, len(work))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=200, help="同時クライアント数")
+    parser.add_argument("--threads", type=int, default=40, help="sync 側のスレッド数 (Starlette 既定 40)")
+    parser.add_argument("--sessions", type=int, default=8, help="DB セッション数 (ORACLE_POOL_MAX 相当)")
+    parser.add_argument("--search-ratio", type=float, default=0.2)
+    parser.add_argument("--search-ms", type=float, default=200)
+    parser.add_argument("--lookup-ms", type=float, default=3)
+    parser.add_argument("--search-limit", type=int, default=4, help="async 側の DB_LIMIT_SEARCH")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    os.environ["DB_LIMIT_SEARCH"] = str(args.search_limit)
+    # 同じ検索語を繰り返すので、結果キャッシュは切って DB 経路を測る
+    os.environ["SEARCH_CACHE_SIZE"] = "0"
+
+    work = _workload(args.requests, args.search_ratio, args.seed)
+
+    def new_db() -> StandInDB:
+        return StandInDB(sessions=args.sessions, search_ms=args.search_ms, lookup_ms=args.lookup_ms)
+
+    result = {
+        "params": vars(args),
+        "sync": asyncio.run(_run_sync(new_db(), work, args.clients, args.threads)),
+        "async": asyncio.run(_run_async(new_db(), work, args.clients)),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+# 品名の幅切り（app.pdf.clip_text_to_width）の計測と一致確認
+"""
+合成した品名コーパスに対し、従来の実装（1文字足す毎に stringWidth）と clip_text_to_width の
+結果が完全に一致するかを確かめ、1件あたりの時間を比較する。幅は帳票の品名幅に加えて、
+各品名の途中の文字ちょうどで切れる幅（境界）も試す。
+
+- naive    : 従来の実装（O(n²)）
+- cold     : clip_text_to_width（結果のキャッシュは毎回空）
+- repeated : clip_text_to_width（同じ品名の繰り返し。帳票の実際に近い）
+
+assets/fonts/IPAexGothic.ttf が無い環境では --font で代替の TTF を指定できる。
+
+    python -m benchmarks.bench_clip_text --rows 20000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from reportlab.pdfbase import pdfmetrics
+
+from app import pdf
+from benchmarks.bench_name_index import corpus
+from benchmarks.bench_pdf_layout import _register_font
+
+_PARTS = ["ステンレス", "六角ボルト", "全ネジ", "ｽﾃﾝﾚｽ", "SUS304", "M12×40", "（白）", "φ8.5", "Ω", "ﾜｯｼｬｰ", "丸座金", "-", " "]
+
+
+def _naive(text: str, font_name: str, font_size: float, max_width_pt: float) -> str:
+    if not text:
+        return ""
+    if pdfmetrics.stringWidth(text, font_name, font_size) <= max_width_pt:
+        return text
+    suffix = "…"
+    max_width_pt2 = max_width_pt - pdfmetrics.stringWidth(suffix, font_name, font_size)
+    if max_width_pt2 <= 0:
+        return ""
+    out = ""
+    for ch in text:
+        if pdfmetrics.stringWidth(out + ch, font_name, font_size) > max_width_pt2:
+            break
+        out += ch
+    return out + suffix
+
+
+def _names(rows: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    names = [name for _, name in corpus(rows // 2, seed)]
+    names += ["".join(rnd.choice(_PARTS) for _ in range(rnd.randint(1, 16))) for _ in range(rows - len(names))]
+    names += ["", "…", "☃" * 40, "W" * 200]  # 空・記号のみ・フォントに無い文字・長い半角
+    return names
+
+
+def _cases(names: list[str], widths: list[float], sizes: list[float], seed: int) -> list[tuple[str, float, float]]:
+    rnd = random.Random(seed)
+    cases = []
+    for text in names:
+        size = rnd.choice(sizes)
+        cases.append((text, size, rnd.choice(widths)))
+        if text:
+            # 途中の文字ちょうどの幅（と「…」分を足した幅）で境界を試す
+            k = rnd.randint(1, len(text))
+            w = pdfmetrics.stringWidth(text[:k], pdf._FONT_NAME, size)
+            cases.append((text, size, w))
+            cases.append((text, size, w + pdfmetrics.stringWidth("…", pdf._FONT_NAME, size)))
+    return cases
+
+
+def _ns_per_call(fn, cases: list[tuple[str, float, float]], repeat: int, clear: bool) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if clear:
+            pdf._clip_text.cache_clear()
+        t0 = time.perf_counter()
+        for text, size, width in cases:
+            fn(text, pdf._FONT_NAME, size, width)
+        best = min(best, time.perf_counter() - t0)
+    return round(best / len(cases) * 1e9, 1)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--font", default=None, help="IPAexGothic の代わりに登録する TTF（計測用）")
+    args = parser.parse_args(argv)
+
+    _register_font(args.font)
+    layout = pdf._load_layout(pdf.DEFAULT_TEMPLATE_ID)
+    widths = [float(layout["item_name_max_width"]), 40.0, 5.0, 0.5]
+    sizes = [pdf.FONT_SIZE_SMALL, pdf.FONT_SIZE_MAIN, 9.5]
+    cases = _cases(_names(args.rows, args.seed), widths, sizes, args.seed)
+
+    pdf._clip_text.cache_clear()
+    mismatches = [
+        {"text": text, "size": size, "width": width}
+        for text, size, width in cases
+        if pdf.clip_text_to_width(text, pdf._FONT_NAME, size, width) != _naive(text, pdf._FONT_NAME, size, width)
+    ]
+    # 帳票では同じ品名が何度も出る
+    rnd = random.Random(args.seed + 1)
+    repeated = [rnd.choice(cases[:500]) for _ in range(len(cases))]
+
+    result = {
+        "params": vars(args),
+        "cases": len(cases),
+        "mismatches": len(mismatches),
+        "mismatch_examples": mismatches[:5],
+        "ns_per_call": {
+            "naive": _ns_per_call(_naive, cases, args.repeat, clear=False),
+            "cold": _ns_per_call(pdf.clip_text_to_width, cases, args.repeat, clear=True),
+            "repeated": _ns_per_call(pdf.clip_text_to_width, repeated, args.repeat, clear=True),
+        },
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+# 名称検索索引（n-gram）の検索レイテンシ
+"""
+合成した得意先名コーパスで NameIndex.search と、全件を正規化して部分一致を探す
+素朴な走査（SQL の全件 TRANSLITERATE + LIKE 相当）を比較する。
+
+    python -m benchmarks.bench_name_index --rows 100000 --queries 2000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+import unicodedata
+
+from app.name_index import NameIndex
+from app.textnorm import normalize
+
+_PREFIX = ["株式会社", "有限会社", "（株）", "ｶﾌﾞｼｷｶﾞｲｼｬ", ""]
+_SUFFIX = ["", "本社", "支店", "営業所", "工場", "センター"]
+_KANJI = "山田中川本村上井小林高橋松野木原石岡藤森池西東北南大新日光金銀和平安明星電機設備工業商事建材産業物流化学精密"
+_KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+
+
+def _word(rnd: random.Random) -> str:
+    kind = rnd.random()
+    if kind < 0.6:
+        return "".join(rnd.choices(_KANJI, k=rnd.randint(2, 4)))
+    word = "".join(rnd.choices(_KANA, k=rnd.randint(3, 6)))
+    # 半角カナ表記の揺れも混ぜる
+    return unicodedata.normalize("NFKC", word) if kind < 0.9 else _to_halfwidth(word)
+
+
+def _to_halfwidth(word: str) -> str:
+    return "".join(_HALF.get(ch, ch) for ch in word)
+
+
+_HALF = {unicodedata.normalize("NFKC", chr(c)): chr(c) for c in range(0xFF66, 0xFF9E)}
+
+
+def corpus(rows: int, seed: int) -> list[tuple[int, str]]:
+    rnd = random.Random(seed)
+    return [
+        (code, rnd.choice(_PREFIX) + "".join(_word(rnd) for _ in range(rnd.randint(1, 2))) + rnd.choice(_SUFFIX))
+        for code in range(1, rows + 1)
+    ]
+
+
+def _queries(rows: list[tuple[int, str]], n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed + 1)
+    out = []
+    for _ in range(n):
+        name = rnd.choice(rows)[1]
+        size = rnd.randint(1, min(4, len(name)))
+        start = rnd.randint(0, len(name) - size)
+        out.append(name[start:start + size])
+    return out
+
+
+def _scan(rows: list[tuple[int, str]], q: str, limit: int) -> list:
+    query = normalize(q)
+    hits = [r for r in rows if query in normalize(r[1])]
+    return hits[:limit]
+
+
+def _timeit(fn, queries: list[str]) -> dict:
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return {
+        "p50_ms": round(statistics.median(lat) * 1000, 3),
+        "p95_ms": round(lat[int(len(lat) * 0.95) - 1] * 1000, 3),
+        "p99_ms": round(lat[int(len(lat) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=20, help="素朴な走査は遅いので件数を絞る")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rows = corpus(args.rows, args.seed)
+    index = NameIndex("bench", "")
+    t0 = time.perf_counter()
+    index.load_rows(rows)
+    build_sec = time.perf_counter() - t0
+
+    queries = _queries(rows, args.queries, args.seed)
+    result = {
+        "params": vars(args),
+        "build_sec": round(build_sec, 3),
+        "index": index.stats(),
+        "index_search": _timeit(lambda q: index.search(q, 100), queries),
+        "full_scan": _timeit(lambda q: _scan(rows, q, 100), queries[:args.scan_queries]),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+# PDF 描画エンジン（merge / xobject）の比較
+"""
+同じ受注データを両エンジンで描画し、所要時間と出力サイズを比較する。
+assets/ のフォントとテンプレPDFが必要（アプリ本体と同じ）。
+
+    python -m benchmarks.bench_pdf_engines --lines 5 60 300 --repeat 20
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import statistics
+import time
+
+from pypdf import PdfReader
+
+from app import pdf
+
+HEADER = {
+    "order_date": "2026-04-01",
+    "tantou_name": "営業 太郎",
+    "customer_cd": "1001",
+    "customer_name": "ベンチマーク商事株式会社",
+    "shipto_cd": "2001",
+    "shipto_name": "ベンチマーク商事 本社倉庫",
+}
+
+
+def _items(n: int) -> list[dict]:
+    return [
+        {
+            "item_cd": f"P{i:06d}",
+            "item_name": f"ステンレス六角ボルト M{8 + i % 8}×{20 + i % 50} 全ネジ",
+            "spec": "SUS304",
+            "qty": 1 + i % 20,
+            "unit_name": "本",
+            "irisu_name": "100",
+            "sales_unit_price": 120 + i,
+            "sales_amount": (120 + i) * (1 + i % 20),
+            "buy_unit_price": 90 + i,
+            "buy_amount": (90 + i) * (1 + i % 20),
+            "supplier_cd": "S01",
+            "supplier_name": "仕入先サンプル",
+            "delivery_place_name": "本社倉庫",
+            "line_note": "至急",
+        }
+        for i in range(n)
+    ]
+
+
+def _measure(engine: str, items: list[dict], repeat: int, template_id: str) -> dict:
+    pdf.build_order_pdf_bytes(HEADER, items, template_id=template_id, engine=engine)  # ウォームアップ
+    times: list[float] = []
+    out = b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = pdf.build_order_pdf_bytes(HEADER, items, template_id=template_id, engine=engine)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "pages": len(PdfReader(io.BytesIO(out)).pages),
+        "bytes": len(out),
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p95_ms": round(times[max(int(len(times) * 0.95) - 1, 0)] * 1000, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, nargs="+", default=[5, 60, 300], help="明細行数（複数可）")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--template-id", default=pdf.DEFAULT_TEMPLATE_ID)
+    args = parser.parse_args(argv)
+
+    result: dict = {"params": vars(args), "runs": []}
+    for n in args.lines:
+        items = _items(n)
+        run = {"lines": n}
+        for engine in pdf.RENDER_ENGINES:
+            run[engine] = _measure(engine, items, args.repeat, args.template_id)
+        result["runs"].append(run)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+# PDF レイアウト描画（コンパイル済み描画命令列）の計測
+"""
+レイアウトの描画命令列へのコンパイル時間と、明細描画（_draw_pages）・PDF 書き出しの所要時間、
+setFont / drawString の呼び出し回数を行数別に出力する。テンプレPDFの合成は含めない。
+assets/fonts/IPAexGothic.ttf が無い環境では --font で代替の TTF を指定できる（サイズ・位置は同じ）。
+
+    python -m benchmarks.bench_pdf_layout --lines 60 1000 --repeat 10
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import statistics
+import time
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from app import pdf
+from benchmarks.bench_pdf_engines import HEADER, _items
+
+
+class _CountingCanvas(canvas.Canvas):
+    """setFont / drawString / drawRightString の回数を数える。"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.counts = {"setFont": 0, "drawString": 0, "drawRightString": 0}
+
+    def setFont(self, *args, **kwargs):
+        self.counts["setFont"] += 1
+        return super().setFont(*args, **kwargs)
+
+    def drawString(self, *args, **kwargs):
+        self.counts["drawString"] += 1
+        return super().drawString(*args, **kwargs)
+
+    def drawRightString(self, *args, **kwargs):
+        self.counts["drawRightString"] += 1
+        return super().drawRightString(*args, **kwargs)
+
+
+def _register_font(path: str | None) -> None:
+    if path:
+        pdfmetrics.registerFont(TTFont(pdf._FONT_NAME, path))
+        pdf._FONT_REGISTERED = True
+    pdf.ensure_japanese_font()
+
+
+def _compile_ms(layout: pdf.LayoutDict, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        pdf._compile_layout(layout)
+        times.append(time.perf_counter() - t0)
+    return round(statistics.median(times) * 1000, 3)
+
+
+def _measure(layout: pdf.LayoutDict, items: list[dict], repeat: int) -> dict:
+    draw: list[float] = []
+    save: list[float] = []
+    out = b""
+    for i in range(repeat + 1):
+        buf = io.BytesIO()
+        c = canvas.Canvas(buf, pagesize=A4, invariant=1)
+        t0 = time.perf_counter()
+        pdf._draw_pages(layout, c, HEADER, items)
+        t1 = time.perf_counter()
+        c.save()
+        t2 = time.perf_counter()
+        if i == 0:  # ウォームアップ
+            continue
+        draw.append(t1 - t0)
+        save.append(t2 - t1)
+        out = buf.getvalue()
+    draw.sort()
+
+    # 回数は計時と別に数える（数える分のオーバーヘッドを計時に含めない）
+    counter = _CountingCanvas(io.BytesIO(), pagesize=A4, invariant=1)
+    pdf._draw_pages(layout, counter, HEADER, items)
+    return {
+        "draw_p50_ms": round(statistics.median(draw) * 1000, 2),
+        "draw_p95_ms": round(draw[max(int(len(draw) * 0.95) - 1, 0)] * 1000, 2),
+        "save_p50_ms": round(statistics.median(save) * 1000, 2),
+        "bytes": len(out),
+        **counter.counts,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, nargs="+", default=[60, 1000], help="明細行数（複数可）")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--template-id", default=pdf.DEFAULT_TEMPLATE_ID)
+    parser.add_argument("--font", default=None, help="IPAexGothic の代わりに登録する TTF（計測用）")
+    args = parser.parse_args(argv)
+
+    _register_font(args.font)
+    layout = pdf._load_layout(args.template_id)
+    result: dict = {
+        "params": vars(args),
+        "compile_ms": _compile_ms(layout, max(args.repeat, 10)),
+        "ops": {"header": len(layout["program"].header), "item": len(layout["program"].item)},
+        "runs": [],
+    }
+    for n in args.lines:
+        result["runs"].append({"lines": n, **_measure(layout, _items(n), args.repeat)})
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
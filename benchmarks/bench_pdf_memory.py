@@ -0,0 +1,66 @@
+# PDF 生成のピークメモリ比較（一括 bytes / ストリーミング）
+"""
+tracemalloc で Python 側の確保量のピークを測る。
+assets/ のフォントとテンプレPDFが必要（アプリ本体と同じ）。
+
+- bytes : build_order_pdf_bytes（pdf_v2 の既定。出力全体をメモリに持つ）
+- stream: write_order_pdf を SpooledTemporaryFile へ（pdf_v2?stream=true）
+
+    python -m benchmarks.bench_pdf_memory --lines 10 1000 10000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+from tempfile import SpooledTemporaryFile
+
+from app import pdf
+from benchmarks.bench_pdf_engines import HEADER, _items
+
+
+def _measure(mode: str, items: list[dict], engine: str, spool_max: int, chunk_pages: int) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    if mode == "bytes":
+        size = len(pdf.build_order_pdf_bytes(HEADER, items, engine=engine))
+    else:
+        with SpooledTemporaryFile(max_size=spool_max) as spool:
+            size = pdf.write_order_pdf(spool, HEADER, items, engine=engine, chunk_pages=chunk_pages)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "bytes": size,
+        "peak_mib": round(peak / 1024 / 1024, 2),
+        "peak_per_output": round(peak / size, 2),
+        "sec": round(elapsed, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 1000, 10000], help="明細行数（複数可）")
+    parser.add_argument("--engine", choices=pdf.RENDER_ENGINES, default=pdf.render_engine())
+    parser.add_argument("--spool-max", type=int, default=8 * 1024 * 1024, help="PDF_SPOOL_MAX_BYTES 相当")
+    parser.add_argument("--chunk-pages", type=int, default=20, help="PDF_STREAM_CHUNK_PAGES 相当")
+    args = parser.parse_args(argv)
+
+    # フォント登録・テンプレ解析は計測から外す
+    pdf.build_order_pdf_bytes(HEADER, _items(1), engine=args.engine)
+
+    result: dict = {"params": vars(args), "runs": []}
+    for n in args.lines:
+        items = _items(n)
+        result["runs"].append({
+            "lines": n,
+            "bytes": _measure("bytes", items, args.engine, args.spool_max, args.chunk_pages),
+            "stream": _measure("stream", items, args.engine, args.spool_max, args.chunk_pages),
+        })
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
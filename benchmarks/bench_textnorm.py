@@ -0,0 +1,97 @@
+# 正規化（app.textnorm）のマイクロベンチマーク
+"""
+合成した得意先名・品番コーパスに対し、1件あたりの正規化時間を比較する。
+
+- nfkc_casefold: unicodedata.normalize("NFKC", s).casefold()（従来の索引の正規化）
+- normalize    : app.textnorm.normalize（NFKC 済みなら変換表のみ）
+- normalize_code / normalize_key（キャッシュキー用、同じ語の繰り返し）
+
+    python -m benchmarks.bench_textnorm --rows 200000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import unicodedata
+
+from app.textnorm import normalize, normalize_code, normalize_key
+from benchmarks.bench_name_index import corpus
+
+
+def _part_numbers(rows: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    seps = ["-", "‐", "－", " ", "", "/"]
+    return [
+        f"{rnd.choice(['ABC', 'ａｂｃ', 'XR', 'ＮＫ'])}{rnd.choice(seps)}{rnd.randint(0, 99999):05d}{rnd.choice(seps)}{rnd.choice('ABCDＸ')}"
+        for _ in range(rows)
+    ]
+
+
+def _ns_per_call(fn, values: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for v in values:
+            fn(v)
+        best = min(best, time.perf_counter() - t0)
+    return round(best / len(values) * 1e9, 1)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    names = [name for _, name in corpus(args.rows, args.seed)]
+    parts = _part_numbers(args.rows, args.seed)
+    # 検索語は上位の語が繰り返し使われる想定
+    rnd = random.Random(args.seed)
+    queries = [rnd.choice(names[:500]) for _ in range(args.rows)]
+
+    def baseline(s: str) -> str:
+        return unicodedata.normalize("NFKC", s).casefold()
+
+    # NFKC 済みの名称は unicodedata.normalize を通らない
+    clean = [s for s in names if unicodedata.is_normalized("NFKC", s)]
+    dirty = [s for s in names if not unicodedata.is_normalized("NFKC", s)]
+
+    result = {
+        "params": vars(args),
+        "names_ns": {
+            "nfkc_casefold": _ns_per_call(baseline, names, args.repeat),
+            "normalize": _ns_per_call(normalize, names, args.repeat),
+        },
+        "names_nfkc_clean_ns": {
+            "rows": len(clean),
+            "nfkc_casefold": _ns_per_call(baseline, clean, args.repeat),
+            "normalize": _ns_per_call(normalize, clean, args.repeat),
+        },
+        "names_needs_nfkc_ns": {
+            "rows": len(dirty),
+            "nfkc_casefold": _ns_per_call(baseline, dirty, args.repeat),
+            "normalize": _ns_per_call(normalize, dirty, args.repeat),
+        },
+        "part_numbers_ns": {
+            "nfkc_casefold": _ns_per_call(baseline, parts, args.repeat),
+            "normalize_code": _ns_per_call(normalize_code, parts, args.repeat),
+        },
+        "queries_ns": {
+            "normalize": _ns_per_call(normalize, queries, args.repeat),
+            "normalize_key": _ns_per_call(normalize_key, queries, args.repeat),
+        },
+        # 従来の正規化では別キーになっていた表記揺れの件数（品番）
+        "part_number_keys": {
+            "nfkc_casefold": len({baseline(p) for p in parts}),
+            "normalize_code": len({normalize_code(p) for p in parts}),
+        },
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
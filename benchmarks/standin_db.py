@@ -0,0 +1,436 @@
+# ベンチマーク用のスタンドイン DB（SQLite、Oracle のビューと同じ表名・列名）
+"""
+app.pricing と app/routes/* が参照する *マスタV を、乱数シードから決まる合成データで SQLite に作る。
+同じ規模・シードなら同じ内容になり、var/bench/ にキャッシュして再利用する。
+
+SQL はアプリのものをそのまま流し、Oracle 固有の構文だけを実行前に読み替える
+（dual 表、NVL、OUTER APPLY、FETCH FIRST / ROWNUM、UTL_I18N.TRANSLITERATE、TABLE(:keys)）。
+結果は Oracle と同じになるよう読み替えているが、実行計画・所要時間は SQLite のもの。
+アプリ側の処理（判定・JSON 組み立て・索引）の回帰を見るためのもので、Oracle の性能の代わりにはならない。
+StandInPool は oracledb のセッションプールの代わりで、app.db のプール・取得関数をそのまま通すとき
+（tests/）に使う。
+
+    python -m benchmarks.standin_db --products 100000 --price-rows 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from benchmarks.bench_name_index import corpus
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+CACHE_DIR = PROJECT_DIR / "var" / "bench"
+
+# 表の作成順（外部キーは張らない。ビューと同じく参照だけ）
+_DDL = """
+CREATE TABLE dual (dummy TEXT);
+INSERT INTO dual VALUES ('X');
+CREATE TABLE 得意先マスタV (得意先コード INTEGER PRIMARY KEY, 得意先名 TEXT);
+CREATE TABLE メーカマスタV (メーカコード TEXT PRIMARY KEY, 社内用メーカ名 TEXT);
+CREATE TABLE 仕入先マスタV (仕入先コード TEXT PRIMARY KEY, 仕入先名 TEXT);
+CREATE TABLE 単位マスタV (単位コード TEXT PRIMARY KEY, 単位名 TEXT);
+CREATE TABLE 商品マスタV (
+    商品コード TEXT PRIMARY KEY, 商品名 TEXT, 規格 TEXT, メーカコード TEXT, メーカ品番 TEXT, 仕入先コード TEXT
+);
+CREATE TABLE 商品入数マスタV (商品コード TEXT, 単位コード TEXT, 入数名 TEXT, 入数ランク TEXT, 順序 INTEGER);
+CREATE TABLE 商品単価マスタV (商品コード TEXT, 入数ランク TEXT, 定価 NUMERIC, 売上単価 NUMERIC, 仕入単価 NUMERIC);
+CREATE TABLE 得意先商品売上単価マスタV (得意先コード INTEGER, 商品コード TEXT, 入数ランク TEXT, 売上単価 NUMERIC);
+CREATE TABLE 得意先商品仕入単価マスタV (
+    得意先コード INTEGER, 商品コード TEXT, 入数ランク TEXT, 仕入先コード TEXT, 仕入単価 NUMERIC
+);
+CREATE TABLE 需要先商品売上単価マスタV (
+    得意先コード INTEGER, 需要先コード INTEGER, 商品コード TEXT, 入数ランク TEXT, 売上単価 NUMERIC
+);
+CREATE TABLE 需要先商品仕入単価マスタV (
+    得意先コード INTEGER, 需要先コード INTEGER, 商品コード TEXT, 入数ランク TEXT, 仕入先コード TEXT, 仕入単価 NUMERIC
+);
+"""
+
+# 読み込み後に作る索引（Oracle 側の主キー・検索用索引に相当）
+_INDEXES = """
+CREATE INDEX 商品入数_商品 ON 商品入数マスタV (商品コード, 順序);
+CREATE INDEX 商品単価_キー ON 商品単価マスタV (商品コード, 入数ランク);
+CREATE INDEX 得商売上_キー ON 得意先商品売上単価マスタV (得意先コード, 商品コード, 入数ランク);
+CREATE INDEX 得商仕入_キー ON 得意先商品仕入単価マスタV (得意先コード, 商品コード, 入数ランク);
+CREATE INDEX 需商売上_キー ON 需要先商品売上単価マスタV (得意先コード, 需要先コード, 商品コード, 入数ランク);
+CREATE INDEX 需商仕入_キー ON 需要先商品仕入単価マスタV (得意先コード, 需要先コード, 商品コード, 入数ランク);
+"""
+
+# 単価行の内訳（定価 / 得商売上 / 得商仕入 / 需商売上 / 需商仕入）
+_PRICE_SHARE = {"teika": 0.3, "tu": 0.2, "ts": 0.2, "ju": 0.15, "js": 0.15}
+
+_UNITS = [("01", "個"), ("02", "本"), ("03", "箱"), ("04", "ケース"), ("05", "袋")]
+_PRODUCT_WORDS = ["ボルト", "ナット", "ワッシャー", "ビス", "アンカー", "ﾎﾞﾙﾄ", "パイプ", "バルブ", "継手", "ホース"]
+_SPECS = ["SUS304", "SS400", "M8×20", "M10×30", "φ25", "3/8", "ユニクロ", "ドブメッキ", ""]
+
+
+class Scale:
+    def __init__(self, products: int, price_rows: int, seed: int = 0) -> None:
+        self.products = products
+        self.price_rows = price_rows
+        self.seed = seed
+        self.customers = max(products // 20, 100)
+        self.makers = max(products // 100, 10)
+        self.suppliers = max(products // 200, 10)
+
+    def key(self) -> str:
+        return f"p{self.products}-r{self.price_rows}-s{self.seed}"
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "products": self.products, "price_rows": self.price_rows, "seed": self.seed,
+            "customers": self.customers, "makers": self.makers, "suppliers": self.suppliers,
+        }
+
+
+def product_code(i: int) -> str:
+    return f"P{i:07d}"
+
+
+def _seed(db: sqlite3.Connection, scale: Scale) -> None:
+    rnd = random.Random(scale.seed)
+    db.executemany("INSERT INTO 得意先マスタV VALUES (?, ?)", corpus(scale.customers, scale.seed))
+    db.executemany(
+        "INSERT INTO メーカマスタV VALUES (?, ?)",
+        ((f"M{i:04d}", name) for i, name in corpus(scale.makers, scale.seed + 1)),
+    )
+    db.executemany(
+        "INSERT INTO 仕入先マスタV VALUES (?, ?)",
+        ((f"S{i:04d}", name) for i, name in corpus(scale.suppliers, scale.seed + 2)),
+    )
+    db.executemany("INSERT INTO 単位マスタV VALUES (?, ?)", _UNITS)
+
+    products = []
+    units = []
+    for i in range(1, scale.products + 1):
+        code = product_code(i)
+        name = "".join(rnd.choices(_PRODUCT_WORDS, k=rnd.randint(1, 3)))
+        maker = f"M{rnd.randint(1, scale.makers):04d}"
+        part_no = f"{rnd.choice(['ABC', 'ａｂｃ', 'XR', 'ＮＫ'])}-{rnd.randint(0, 99999):05d}"
+        supplier = f"S{rnd.randint(1, scale.suppliers):04d}"
+        products.append((code, name, rnd.choice(_SPECS), maker, part_no, supplier))
+        for order in range(rnd.randint(1, 3)):
+            unit_cd, unit_name = _UNITS[(i + order) % len(_UNITS)]
+            units.append((code, unit_cd, f"{10 ** order}{unit_name}", str(order + 1), order + 1))
+    db.executemany("INSERT INTO 商品マスタV VALUES (?, ?, ?, ?, ?, ?)", products)
+    db.executemany("INSERT INTO 商品入数マスタV VALUES (?, ?, ?, ?, ?)", units)
+
+    # 単価は入数の (商品, ランク) から作る。需要先は得意先コードから選ぶ
+    pairs = [(u[0], u[3]) for u in units]
+
+    def price() -> int:
+        return rnd.randint(10, 50000)
+
+    def customer() -> int:
+        return rnd.randint(1, scale.customers)
+
+    n = {k: int(scale.price_rows * share) for k, share in _PRICE_SHARE.items()}
+    teika = rnd.sample(pairs, min(n["teika"], len(pairs)))
+    db.executemany(
+        "INSERT INTO 商品単価マスタV VALUES (?, ?, ?, ?, ?)",
+        ((s, r, price(), price(), price()) for s, r in teika),
+    )
+    db.executemany(
+        "INSERT INTO 得意先商品売上単価マスタV VALUES (?, ?, ?, ?)",
+        _unique(n["tu"], lambda: (customer(), *rnd.choice(pairs)), lambda k: (*k, price())),
+    )
+    db.executemany(
+        "INSERT INTO 得意先商品仕入単価マスタV VALUES (?, ?, ?, ?, ?)",
+        _unique(n["ts"], lambda: (customer(), *rnd.choice(pairs)),
+                lambda k: (*k, f"S{rnd.randint(1, scale.suppliers):04d}", price())),
+    )
+    db.executemany(
+        "INSERT INTO 需要先商品売上単価マスタV VALUES (?, ?, ?, ?, ?)",
+        _unique(n["ju"], lambda: (customer(), customer(), *rnd.choice(pairs)), lambda k: (*k, price())),
+    )
+    db.executemany(
+        "INSERT INTO 需要先商品仕入単価マスタV VALUES (?, ?, ?, ?, ?, ?)",
+        _unique(n["js"], lambda: (customer(), customer(), *rnd.choice(pairs)),
+                lambda k: (*k, f"S{rnd.randint(1, scale.suppliers):04d}", price())),
+    )
+
+
+def _unique(n: int, make_key, make_row) -> list[tuple]:
+    """キーが重複しない行を n 件（同一キー複数行の扱いは計測対象外にする）。"""
+    seen: set[tuple] = set()
+    out: list[tuple] = []
+    attempts = 0
+    while len(out) < n and attempts < n * 3:
+        attempts += 1
+        key = make_key()
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(make_row(key))
+    return out
+
+
+def build(scale: Scale, path: Optional[Path] = None, *, force: bool = False) -> Path:
+    """スタンドイン DB を作って（同じ規模・シードのファイルがあれば再利用して）パスを返す。"""
+    path = path or CACHE_DIR / f"standin-{scale.key()}.sqlite"
+    if path.exists() and not force:
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    start = time.perf_counter()
+    db = sqlite3.connect(tmp)
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        db.executescript(_DDL)
+        _seed(db, scale)
+        db.executescript(_INDEXES)
+        db.execute("ANALYZE")
+        db.commit()
+    finally:
+        db.close()
+    tmp.replace(path)
+    print(f"standin db built: {path.name} {time.perf_counter() - start:.1f} sec")
+    return path
+
+
+# ---- Oracle 構文の読み替え ----
+
+_OUTER_APPLY = re.compile(r"OUTER APPLY\s*\(([^()]*)\)\s*(\w+)", re.S)
+_FETCH_FIRST = re.compile(r"FETCH FIRST\s+(:?\w+)\s+ROWS?\s+ONLY", re.I)
+_ROWNUM = re.compile(r"WHERE\s+ROWNUM\s*<=\s*(:\w+)", re.I)
+
+
+@lru_cache(maxsize=256)
+def translate(sql: str) -> str:
+    sql = _OUTER_APPLY.sub(r"LEFT JOIN (\1) \2 ON 1 = 1", sql)
+    sql = _FETCH_FIRST.sub(r"LIMIT \1", sql)
+    sql = _ROWNUM.sub(r"LIMIT \1", sql)
+    sql = sql.replace("UTL_I18N.TRANSLITERATE(", "TRANSLITERATE(")
+    sql = sql.replace("TABLE(:keys)", "json_each(:keys)").replace("COLUMN_VALUE", "value")
+    return sql
+
+
+def _transliterate(value: Any, _kind: str) -> Any:
+    # hwkatakana_fwkatakana 相当（半角カナ → 全角。NFKC は英数記号も変えるが LIKE の比較には影響しない）
+    return unicodedata.normalize("NFKC", value) if isinstance(value, str) else value
+
+
+def _nvl(value: Any, default: Any) -> Any:
+    return default if value is None else value
+
+
+class Cursor:
+    """oracledb の Cursor と同じ呼び方（execute の名前付き引数・arraysize・prefetchrows）を受ける。"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._cur = conn.cursor()
+        self.arraysize = 100
+        self.prefetchrows = 2
+
+    def __enter__(self) -> "Cursor":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def execute(self, sql: str, params: Optional[dict] = None, **kwargs: Any) -> "Cursor":
+        binds = {**(params or {}), **kwargs}
+        if isinstance(binds.get("keys"), list):
+            binds["keys"] = json.dumps(binds["keys"], ensure_ascii=False)
+        self._cur.execute(translate(sql), binds)
+        return self
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._cur.fetchone()
+
+    def fetchall(self) -> list[tuple]:
+        return self._cur.fetchall()
+
+    def fetchmany(self, size: Optional[int] = None) -> list[tuple]:
+        return self._cur.fetchmany(size or self.arraysize)
+
+    def close(self) -> None:
+        self._cur.close()
+
+
+class StandInDB:
+    """1接続のスタンドイン。app.db の fetch_all / fetch_one / iter_rows / fetch_all_by_keys と同じ形の関数を持つ。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.create_function("NVL", 2, _nvl, deterministic=True)
+        self.conn.create_function("TRANSLITERATE", 2, _transliterate, deterministic=True)
+        self.conn.execute("PRAGMA cache_size=-200000")
+
+    def cursor(self) -> Cursor:
+        return Cursor(self.conn)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    async def fetch_all(self, sql: str, params: Optional[dict] = None) -> list[tuple]:
+        with self.cursor() as cur:
+            return cur.execute(sql, params).fetchall()
+
+    async def fetch_one(self, sql: str, params: Optional[dict] = None) -> Optional[tuple]:
+        with self.cursor() as cur:
+            return cur.execute(sql, params).fetchone()
+
+    async def iter_rows(self, sql: str, params: Optional[dict] = None, *, arraysize: int = 500) -> AsyncIterator[list[tuple]]:
+        with self.cursor() as cur:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(arraysize)
+                if not rows:
+                    return
+                yield rows
+
+    async def fetch_all_by_keys(
+        self, sql: str, keys: list, params: Optional[dict] = None, *, numeric: bool = False
+    ) -> list[tuple]:
+        keys = [int(k) for k in keys] if numeric else [str(k) for k in keys]
+        if not keys:
+            return []
+        with self.cursor() as cur:
+            return cur.execute(sql, {**(params or {}), "keys": keys}).fetchall()
+
+    def counts(self) -> dict[str, int]:
+        tables = [r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%V'")]
+        return {t: self.conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables}
+
+
+class _CollectionType:
+    """conn.gettype() の代わり。newobject はリストのまま返す（Cursor.execute で json_each 用に直す）。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def newobject(self, values: list) -> list:
+        return list(values)
+
+
+class StandInConnection:
+    """プールから借りたセッション。close()（with 終了）でプールへ返す。"""
+
+    def __init__(self, pool: "StandInPool", db: StandInDB) -> None:
+        self._pool = pool
+        self._db: Optional[StandInDB] = db
+
+    def __enter__(self) -> "StandInConnection":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def cursor(self) -> Cursor:
+        if self._db is None:
+            raise RuntimeError("connection already released")
+        return self._db.cursor()
+
+    def gettype(self, name: str) -> _CollectionType:
+        return _CollectionType(name)
+
+    def close(self) -> None:
+        db, self._db = self._db, None
+        if db is not None:
+            self._pool.release(db)
+
+
+class StandInPool:
+    """
+    oracledb.ConnectionPool の代わり（同期 API のみ）。セッション毎に SQLite の接続を開き、返却されたものを使い回す。
+    create_pool と同じ引数を受ける（user / password / dsn / getmode 等は無視）。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        min: int = 1,
+        max: int = 8,
+        increment: int = 1,
+        stmtcachesize: int = 50,
+        ping_interval: int = 60,
+        timeout: int = 300,
+        wait_timeout: int = 5000,
+        **_ignored: Any,
+    ) -> None:
+        self.path = path
+        self.min = min
+        self.max = max
+        self.increment = increment
+        self.stmtcachesize = stmtcachesize
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+        self.opened = 0
+        self.busy = 0
+        self.acquires = 0
+        self.closed = False
+        self._idle: list[StandInDB] = []
+        self._cond = threading.Condition()
+
+    def acquire(self) -> StandInConnection:
+        with self._cond:
+            if self.closed:
+                raise RuntimeError("pool is closed")
+            while not self._idle and self.opened >= self.max:
+                if not self._cond.wait(timeout=(self.wait_timeout / 1000) or None):
+                    raise TimeoutError("pool wait timeout")
+            if self._idle:
+                db = self._idle.pop()
+            else:
+                db = StandInDB(self.path)
+                self.opened += 1
+            self.busy += 1
+            self.acquires += 1
+        return StandInConnection(self, db)
+
+    def release(self, db: StandInDB) -> None:
+        with self._cond:
+            self.busy -= 1
+            if self.closed:
+                db.close()
+                self.opened -= 1
+            else:
+                self._idle.append(db)
+            self._cond.notify()
+
+    def close(self, force: bool = False) -> None:
+        with self._cond:
+            if self.busy and not force:
+                raise RuntimeError("pool has busy connections")
+            self.closed = True
+            for db in self._idle:
+                db.close()
+            self.opened -= len(self._idle)
+            self._idle.clear()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--price-rows", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="キャッシュがあっても作り直す")
+    args = parser.parse_args(argv)
+
+    path = build(Scale(args.products, args.price_rows, args.seed), force=args.force)
+    db = StandInDB(path)
+    try:
+        print(json.dumps({"path": str(path), "rows": db.counts()}, ensure_ascii=False, indent=2))
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,405 @@
+# 再現可能な性能ベンチマーク一式（スタンドイン DB・JSON 出力・回帰比較）
+"""
+benchmarks.standin_db の合成データ（同じ規模・シードなら同じ内容）に対して、単価決定・マスタ検索・
+コード参照・受注 PDF 生成を決まった入力で繰り返し、シナリオ毎の p50/p95/p99 を JSON に書く。
+compare で2つの JSON を比べ、閾値を超えて遅くなったシナリオがあれば終了コード 1 を返す。
+
+    python -m benchmarks.suite run --products 100000 --price-rows 1000000 --out var/bench/base.json
+    python -m benchmarks.suite run --products 100000 --price-rows 1000000 --out var/bench/new.json
+    python -m benchmarks.suite compare var/bench/base.json var/bench/new.json --threshold 0.10
+
+シナリオ（--only で名前の前方一致で絞る）:
+- pricing.*: SQL_PRICE_PICK の単発・SQL_PRICE_BATCH の 50 件一括・PriceIndex のメモリ判定・
+  ローカルレプリカ（単価入りマスタスナップショット、DATA_BACKEND=replica）での判定
+- search.*: 各検索ルートの SQL 経路（ストリーミング応答を読み切るまで）と NameIndex / ProductIndex
+- lookup.*: 商品・単位のコード参照ルート（SQL 経路）
+- load.*: PriceIndex / NameIndex / ProductIndex の全件読み込み、単価入りスナップショットの作成
+- pdf.order_<行数>: build_order_pdf_bytes（assets/ のフォント・テンプレがなければ skipped）
+
+ルートは app.db の関数をスタンドインに差し替えて直接呼ぶ（索引・スナップショット・結果キャッシュは
+起動しないので SQL 経路になる）。時間は SQLite のもので、Oracle での絶対値の目安にはならない。
+同じマシン・同じ規模で取った JSON 同士を比べること。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from benchmarks.standin_db import CACHE_DIR, Scale, StandInDB, build, product_code
+
+# compare で p50 / p95 がこの ms 未満しか増えていなければ誤差とみなす
+_NOISE_FLOOR_MS = 0.05
+
+_PRODUCT_WORDS = ["ボルト", "ﾎﾞﾙﾄ", "ナット", "バルブ", "継手"]
+_PART_WORDS = ["ABC", "ＡＢＣ", "xr", "NK-1"]
+
+
+def _percentile(lat: list[float], p: float) -> float:
+    """昇順の lat の p 分位（nearest-rank）。"""
+    return lat[min(len(lat) - 1, max(math.ceil(p * len(lat)) - 1, 0))]
+
+
+def _summary(lat: list[float]) -> dict[str, Any]:
+    lat.sort()
+    return {
+        "n": len(lat),
+        "p50_ms": round(_percentile(lat, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(lat, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(lat, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(lat) * 1000, 3),
+    }
+
+
+class Scenario:
+    def __init__(self, name: str, fn: Callable[[Any], Any], inputs: list, *, repeat: int = 1, warmup: int = 3) -> None:
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.repeat = repeat
+        self.warmup = warmup
+
+    def run(self) -> dict[str, Any]:
+        for x in self.inputs[: self.warmup]:
+            self.fn(x)
+        gc.collect()
+        lat: list[float] = []
+        for _ in range(self.repeat):
+            for x in self.inputs:
+                t0 = time.perf_counter()
+                self.fn(x)
+                lat.append(time.perf_counter() - t0)
+        return _summary(lat)
+
+
+class Context:
+    """スタンドイン DB・差し替え済みのルート・読み込み済みの索引をシナリオ間で共有する。"""
+
+    def __init__(self, db: StandInDB, scale: Scale, args: argparse.Namespace) -> None:
+        self.db = db
+        self.scale = scale
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.loop = asyncio.new_event_loop()
+        self.closers: list[Callable[[], None]] = []
+        self._patch_routes()
+
+    def _patch_routes(self) -> None:
+        import app.routes.customers as customers
+        import app.routes.makers as makers
+        import app.routes.products as products
+        import app.search_page as search_page
+
+        for module in (customers, makers, products):
+            for name in ("fetch_all", "fetch_one", "fetch_all_by_keys"):
+                if hasattr(module, name):
+                    setattr(module, name, getattr(self.db, name))
+        search_page.iter_rows = self.db.iter_rows
+
+    def call(self, coro_fn: Callable[..., Any]) -> Callable[[Any], Any]:
+        """async ルートを1回ずつイベントループで完了まで実行する関数にする（StreamingResponse は読み切る）。"""
+
+        async def _drain(x: Any) -> None:
+            res = await coro_fn(x)
+            body = getattr(res, "body_iterator", None)
+            if body is not None:
+                async for _ in body:
+                    pass
+
+        return lambda x: self.loop.run_until_complete(_drain(x))
+
+    def sample(self, sql: str, n: int) -> list:
+        with self.db.cursor() as cur:
+            rows = cur.execute(sql).fetchall()
+        return [r[0] for r in self.rnd.sample(rows, min(n, len(rows)))]
+
+    def close(self) -> None:
+        for close in self.closers:
+            close()
+        self.loop.close()
+        self.db.close()
+
+
+def _name_queries(ctx: Context, sql: str, n: int) -> list[str]:
+    """実在する名称の 2〜3 文字の部分文字列（ヒットする検索語）。"""
+    out = []
+    for name in ctx.sample(sql, n):
+        size = ctx.rnd.randint(2, 3)
+        start = ctx.rnd.randrange(max(len(name) - size, 0) + 1)
+        out.append(name[start:start + size])
+    return out
+
+
+def _pricing_scenarios(ctx: Context) -> Iterable[Scenario]:
+    from app.price_index import PriceIndex
+    from app.pricing import PricingKey, decide_pricing, decide_pricing_batch
+
+    n = ctx.args.iterations
+    index = PriceIndex()
+    cur = ctx.db.cursor()
+    yield Scenario("load.price_index", lambda _: index.load_full(cur), [None], repeat=ctx.args.load_repeat, warmup=0)
+    if not index.ready:
+        index.load_full(cur)
+
+    keys = index.sample_keys(n, seed=ctx.args.seed)
+    yield Scenario(
+        "pricing.pick_sql",
+        lambda k: decide_pricing(cur, tcode=k.tcode, jcode=k.jcode, scode=k.scode, irank=k.irank),
+        keys,
+    )
+    batches = [keys[i:i + 50] for i in range(0, len(keys), 50)]
+    batches = [b for b in batches if len(b) == 50] or batches
+    yield Scenario("pricing.batch50_sql", lambda b: decide_pricing_batch(cur, b), batches, repeat=ctx.args.batch_repeat)
+    yield Scenario("pricing.resolve_index", index.resolve, keys, repeat=10)
+    yield Scenario("pricing.resolve_many_index_50", index.resolve_many, batches, repeat=ctx.args.batch_repeat * 10)
+    yield from _replica_scenarios(ctx, keys, batches)
+    # 未ヒットだけのキー（全 tier を引いて外れる最悪ケース）
+    misses = [PricingKey("0", "0", product_code(ctx.scale.products + 1 + i), "1") for i in range(n)]
+    yield Scenario(
+        "pricing.pick_sql_miss",
+        lambda k: decide_pricing(cur, tcode=k.tcode, jcode=k.jcode, scode=k.scode, irank=k.irank),
+        misses,
+    )
+
+
+def _replica_scenarios(ctx: Context, keys: list, batches: list[list]) -> Iterable[Scenario]:
+    from app.master_snapshot import MasterSnapshot, build_snapshot
+
+    os.environ["MASTER_SNAPSHOT_PRICES"] = "true"
+    directory = CACHE_DIR / f"replica-{ctx.scale.key()}"
+    built: list[Path] = []
+    yield Scenario("load.replica_build", lambda _: built.append(build_snapshot(ctx.db.cursor(), directory)), [None],
+                   repeat=ctx.args.load_repeat, warmup=0)
+    snap = MasterSnapshot(built[-1] if built else build_snapshot(ctx.db.cursor(), directory))
+    ctx.closers.append(snap.close)
+    yield Scenario("pricing.resolve_replica", lambda k: snap.pricing([k]), keys)
+    yield Scenario("pricing.resolve_many_replica_50", snap.pricing, batches, repeat=ctx.args.batch_repeat)
+
+
+def _search_scenarios(ctx: Context) -> Iterable[Scenario]:
+    import app.routes.customers as customers
+    import app.routes.makers as makers
+    import app.routes.products as products
+    from app.name_index import _SOURCES, NameIndex
+    from app.product_index import ProductIndex
+
+    n = ctx.args.iterations
+    customer_q = _name_queries(ctx, "SELECT 得意先名 FROM 得意先マスタV", n)
+    maker_q = _name_queries(ctx, "SELECT 社内用メーカ名 FROM メーカマスタV", n)
+    product_q = [ctx.rnd.choice(_PRODUCT_WORDS) for _ in range(n)]
+    keyword_q = [f"{ctx.rnd.choice(_PRODUCT_WORDS)} {ctx.rnd.choice(_PART_WORDS)}" for _ in range(n)]
+
+    yield Scenario(
+        "search.customers_sql",
+        ctx.call(lambda q: customers.search_customers(q=q, limit=100, after=None)),
+        customer_q,
+    )
+    yield Scenario(
+        "search.makers_sql",
+        ctx.call(lambda q: makers.search_makers(q=q, limit=100, after=None)),
+        maker_q,
+    )
+
+    def search_products(**kw: str):
+        fields = {"maker_cd": "", "maker_name": "", "maker_part_no": "", "product_name": "", "spec": "", "q": ""}
+        return products.search_products(**{**fields, **kw}, limit=200, after=None)
+
+    yield Scenario(
+        "search.products_name_sql",
+        ctx.call(lambda q: search_products(product_name=q)),
+        product_q,
+    )
+    yield Scenario(
+        "search.products_keywords_sql",
+        ctx.call(lambda q: search_products(q=q)),
+        keyword_q,
+    )
+
+    cur = ctx.db.cursor()
+    customer_index = NameIndex("customers", _SOURCES["customers"])
+    yield Scenario("load.name_index_customers", lambda _: customer_index.load(cur), [None],
+                   repeat=ctx.args.load_repeat, warmup=0)
+    product_index = ProductIndex()
+    yield Scenario("load.product_index", lambda _: product_index.load(cur), [None],
+                   repeat=ctx.args.load_repeat, warmup=0)
+    if not customer_index.ready:
+        customer_index.load(cur)
+    if not product_index.ready:
+        product_index.load(cur)
+
+    yield Scenario("search.customers_index", lambda q: customer_index.search(q, 101), customer_q, repeat=10)
+    yield Scenario("search.products_name_index", lambda q: product_index.search(product_name=q, limit=201),
+                   product_q, repeat=10)
+    yield Scenario("search.products_keywords_index", lambda q: product_index.search_keywords(q, limit=201),
+                   keyword_q, repeat=10)
+
+
+def _lookup_scenarios(ctx: Context) -> Iterable[Scenario]:
+    import app.routes.products as products
+    from app.schemas import CodeLookupRequest
+
+    n = ctx.args.iterations
+    codes = ctx.sample("SELECT 商品コード FROM 商品マスタV", n)
+    yield Scenario("lookup.product_sql", ctx.call(products.get_product), codes)
+    yield Scenario("lookup.units_sql", ctx.call(lambda c: products.get_units(product_cd=c)), codes)
+    batches = [CodeLookupRequest(codes=codes[i:i + 100]) for i in range(0, len(codes), 100)]
+    yield Scenario("lookup.products_100_sql", ctx.call(products.lookup_products), batches,
+                   repeat=ctx.args.batch_repeat)
+    yield Scenario("lookup.units_100_sql", ctx.call(products.lookup_units), batches, repeat=ctx.args.batch_repeat)
+
+
+def _pdf_scenarios(ctx: Context) -> Iterable[Scenario]:
+    from app import pdf
+    from benchmarks.bench_pdf_engines import HEADER, _items
+
+    for lines in ctx.args.pdf_lines:
+        items = _items(lines)
+        yield Scenario(
+            f"pdf.order_{lines}",
+            lambda _, items=items: pdf.build_order_pdf_bytes(HEADER, items),
+            [None],
+            repeat=ctx.args.pdf_repeat,
+            warmup=1,
+        )
+
+
+# (グループが作るシナリオ名の接頭辞, グループ)。--only に当たらないグループは準備（索引の読み込み等）もしない
+_GROUPS = (
+    (("pricing.", "load.price_index", "load.replica"), _pricing_scenarios),
+    (("search.", "load.name_index", "load.product_index"), _search_scenarios),
+    (("lookup.",), _lookup_scenarios),
+    (("pdf.",), _pdf_scenarios),
+)
+
+
+def _selected(name: str, only: Optional[list[str]]) -> bool:
+    return not only or any(name.startswith(prefix) for prefix in only)
+
+
+def _group_selected(prefixes: tuple[str, ...], only: Optional[list[str]]) -> bool:
+    return not only or any(p.startswith(o) or o.startswith(p) for p in prefixes for o in only)
+
+
+def run(args: argparse.Namespace) -> int:
+    # 検索結果キャッシュは使わない経路だが、念のため切って毎回 DB を引かせる
+    os.environ["SEARCH_CACHE_SIZE"] = "0"
+    scale = Scale(args.products, args.price_rows, args.seed)
+    db = StandInDB(build(scale))
+    ctx = Context(db, scale, args)
+
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        for prefixes, group in _GROUPS:
+            if not _group_selected(prefixes, args.only):
+                continue
+            for scenario in group(ctx):
+                if not _selected(scenario.name, args.only):
+                    continue
+                try:
+                    results[scenario.name] = scenario.run()
+                except Exception as exc:
+                    results[scenario.name] = {"skipped": f"{type(exc).__name__}: {exc}".splitlines()[0]}
+                print(f"{scenario.name:36s} {_format(results[scenario.name])}", file=sys.stderr)
+    finally:
+        ctx.close()
+
+    report = {
+        "meta": {
+            "scale": scale.as_dict(),
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "scenarios": results,
+    }
+    out = Path(args.out) if args.out else CACHE_DIR / f"result-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(out)
+    return 0
+
+
+def _format(r: dict[str, Any]) -> str:
+    if "skipped" in r:
+        return f"skipped ({r['skipped']})"
+    return f"p50={r['p50_ms']:.3f} p95={r['p95_ms']:.3f} p99={r['p99_ms']:.3f} ms (n={r['n']})"
+
+
+def compare(args: argparse.Namespace) -> int:
+    base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+    new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+    if base["meta"]["scale"] != new["meta"]["scale"]:
+        print(f"warning: scale differs: {base['meta']['scale']} vs {new['meta']['scale']}", file=sys.stderr)
+
+    regressions = []
+    rows = []
+    for name in sorted(set(base["scenarios"]) | set(new["scenarios"])):
+        b = base["scenarios"].get(name)
+        n = new["scenarios"].get(name)
+        if b is None or n is None or "skipped" in b or "skipped" in n:
+            rows.append((name, "-", "-", "new" if b is None else "missing" if n is None else "skipped"))
+            continue
+        status = "ok"
+        ratios = {}
+        for stat in ("p50_ms", "p95_ms"):
+            ratios[stat] = n[stat] / b[stat] if b[stat] > 0 else 1.0
+            if ratios[stat] > 1 + args.threshold and n[stat] - b[stat] > args.noise_floor_ms:
+                status = "REGRESSION"
+            elif ratios[stat] < 1 - args.threshold and b[stat] - n[stat] > args.noise_floor_ms and status == "ok":
+                status = "faster"
+        if status == "REGRESSION":
+            regressions.append(name)
+        rows.append((name, f"{b['p50_ms']:.3f}->{n['p50_ms']:.3f} (x{ratios['p50_ms']:.2f})",
+                     f"{b['p95_ms']:.3f}->{n['p95_ms']:.3f} (x{ratios['p95_ms']:.2f})", status))
+
+    print(f"{'scenario':36s} {'p50 ms':28s} {'p95 ms':28s} status")
+    for name, p50, p95, status in rows:
+        print(f"{name:36s} {p50:28s} {p95:28s} {status}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="シナリオを実行して JSON を書く")
+    p.add_argument("--products", type=int, default=100000)
+    p.add_argument("--price-rows", type=int, default=1000000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--iterations", type=int, default=200, help="1シナリオの入力数（検索語・キー・コード）")
+    p.add_argument("--batch-repeat", type=int, default=5, help="一括系シナリオの繰り返し回数")
+    p.add_argument("--load-repeat", type=int, default=3, help="全件読み込みの回数")
+    p.add_argument("--pdf-lines", type=int, nargs="+", default=[5, 60, 300], help="受注 PDF の明細行数（複数可）")
+    p.add_argument("--pdf-repeat", type=int, default=10)
+    p.add_argument("--only", nargs="+", help="シナリオ名の前方一致（例: pricing. search.products）")
+    p.add_argument("--out", help="出力 JSON（既定 var/bench/result-<日時>.json）")
+    p.set_defaults(func=run)
+
+    c = sub.add_parser("compare", help="2つの JSON を比べ、回帰があれば終了コード 1")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10, help="p50 / p95 の許容増加率")
+    c.add_argument("--noise-floor-ms", type=float, default=_NOISE_FLOOR_MS, help="これ未満の増加は無視")
+    c.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -11,12 +11,37 @@ export function recalcAmounts(tr) {
   setText(tr.querySelector(".shiire_amount"), String(buy * qty));
 }
 
-export async function refreshPricingForRow(tr) {
+export function applyPricingToRow(tr, r) {
+  setText(tr.querySelector(".teika"), String(toNum(r.teika)));
+  tr.querySelector(".sales_price").value = String(toNum(r.sales_price));
+  tr.querySelector(".purchase_price").value = String(toNum(r.purchase_price));
+  setText(tr.querySelector(".price_src"), r.source ?? "未設定");
+
+  if (r.supplier_code != null && String(r.supplier_code).trim() !== "") {
+    setText(tr.querySelector(".sup_cd"), r.supplier_code);
+  }
+
+  recalcAmounts(tr);
+}
+
+function pricingParams(tr) {
   const tcode = document.getElementById("tcode")?.value?.trim() ?? "";
   const jcode = document.getElementById("jcode")?.value?.trim() ?? "";
   const scode = tr.querySelector(".scode")?.value?.trim() ?? "";
   const irank = tr.querySelector(".irisu_rank")?.value?.trim() ?? "";
-  const pricingKey = `${tcode}|${jcode}|${scode}|${irank}`;
+  return { tcode, jcode, scode, irank, pricingKey: `${tcode}|${jcode}|${scode}|${irank}` };
+}
+
+// /order_rows/hydrate で受け取った入数ランク毎の単価を行に覚えておく（単位を変えても再取得しない）
+export function rememberRowPricing(tr, { tcode, jcode, scode }, units) {
+  tr.hydratedPricing = {};
+  for (const u of units || []) {
+    if (u.pricing) tr.hydratedPricing[`${tcode}|${jcode}|${scode}|${u.irisu_rank}`] = u.pricing;
+  }
+}
+
+export async function refreshPricingForRow(tr) {
+  const { tcode, jcode, scode, irank, pricingKey } = pricingParams(tr);
 
   if (tr.dataset.pricingBusy === "1") return;
   if (tr.dataset.pricingKey === pricingKey) return;
@@ -34,6 +59,14 @@ export async function refreshPricingForRow(tr) {
     return;
   }
 
+  const hydrated = tr.hydratedPricing?.[pricingKey];
+  if (hydrated) {
+    applyPricingToRow(tr, hydrated);
+    try { saveDraft(); } catch {}
+    tr.dataset.pricingBusy = "0";
+    return;
+  }
+
   setError("");
   setStatus(`単価取得中... 得意先=${tcode} 需要先=${jcode} 商品=${scode} ランク=${irank}`);
 
@@ -44,32 +77,62 @@ export async function refreshPricingForRow(tr) {
     tr.dataset.pricingBusy = "0";
   }
 
-  setText(tr.querySelector(".teika"), String(toNum(r.teika)));
-  tr.querySelector(".sales_price").value = String(toNum(r.sales_price));
-  tr.querySelector(".purchase_price").value = String(toNum(r.purchase_price));
-  setText(tr.querySelector(".price_src"), r.source ?? "未設定");
-
-  if (r.supplier_code != null && String(r.supplier_code).trim() !== "") {
-    setText(tr.querySelector(".sup_cd"), r.supplier_code);
-  }
-
-  recalcAmounts(tr);
+  applyPricingToRow(tr, r);
   setStatus(`単価取得完了: ${(r.source ?? "")}`);
 
   try { saveDraft(); } catch {}
 }
 
 export async function refreshPricingAllRows() {
-  const rows = [...document.querySelectorAll("#grid tbody tr")];
-  for (const tr of rows) {
-    const scode = tr.querySelector(".scode")?.value?.trim() ?? "";
-    const irank = tr.querySelector(".irisu_rank")?.value?.trim() ?? "";
-    if (!scode || !irank) continue;
-    try {
-      await refreshPricingForRow(tr);
-    } catch (e) {
-      console.warn("[ui_main] refreshPricingAllRows row failed", e);
+  const rows = [...document.querySelectorAll("#grid tbody tr")].filter((tr) => {
+    const { scode, irank } = pricingParams(tr);
+    return scode && irank;
+  });
+
+  const tcode = document.getElementById("tcode")?.value?.trim() ?? "";
+  const jcode = document.getElementById("jcode")?.value?.trim() ?? "";
+  if (!tcode || !jcode) {
+    // 通信なしで0クリアされるので行単位で処理
+    for (const tr of rows) {
+      await refreshPricingForRow(tr).catch((e) => console.warn("[ui_main] refreshPricingAllRows row failed", e));
     }
+    try { saveDraft(); } catch {}
+    return;
+  }
+
+  const targets = rows
+    .map((tr) => ({ tr, p: pricingParams(tr) }))
+    .filter(({ tr, p }) => tr.dataset.pricingBusy !== "1" && tr.dataset.pricingKey !== p.pricingKey);
+  if (!targets.length) {
+    try { saveDraft(); } catch {}
+    return;
   }
+
+  for (const { tr, p } of targets) {
+    tr.dataset.pricingKey = p.pricingKey;
+    tr.dataset.pricingBusy = "1";
+  }
+
+  setError("");
+  setStatus(`単価取得中... 得意先=${tcode} 需要先=${jcode} ${targets.length}行`);
+
+  let res;
+  try {
+    res = await apiPost("/pricing/resolve_batch", {
+      items: targets.map(({ p }) => ({ tcode: p.tcode, jcode: p.jcode, scode: p.scode, irank: p.irank })),
+    });
+  } catch (e) {
+    // 失敗した行は次回の呼び出しで再取得させる
+    for (const { tr } of targets) delete tr.dataset.pricingKey;
+    throw e;
+  } finally {
+    for (const { tr } of targets) tr.dataset.pricingBusy = "0";
+  }
+
+  (res.items || []).forEach((r, i) => {
+    if (targets[i]) applyPricingToRow(targets[i].tr, r);
+  });
+  setStatus(`単価取得完了: ${targets.length}行`);
+
   try { saveDraft(); } catch {}
 }
@@ -1,8 +1,8 @@
 // 商品取得と行反映
-import { apiGet, setError, setStatus, setText } from "./core.js";
+import { apiGet, apiPost, setError, setStatus, setText } from "./core.js";
 import { saveDraft } from "./draft.js";
-import { recalcAmounts } from "./pricing.js";
-import { clearUnitUI, resolveUnits } from "./units.js";
+import { recalcAmounts, refreshPricingAllRows, refreshPricingForRow, rememberRowPricing } from "./pricing.js";
+import { applyUnitsToRow, clearUnitUI } from "./units.js";
 
 export async function resolveProduct(tr) {
   setError("");
@@ -21,9 +21,29 @@ export async function resolveProduct(tr) {
     return;
   }
 
+  // 商品・単位・入数ランク毎の単価を1回で取得
+  const tcode = document.getElementById("tcode")?.value?.trim() ?? "";
+  const jcode = document.getElementById("jcode")?.value?.trim() ?? "";
+  const irank = tr.querySelector(".irisu_rank")?.value?.trim() ?? "";
+  const preferredUnit = tr.querySelector(".unit_select")?.value ?? "";
+
   setStatus(`商品情報取得中... 商品CD=${scode}`);
-  const r = await apiGet(`/products/${encodeURIComponent(scode)}`);
+  const params = new URLSearchParams({ scode, tcode, jcode, irank });
+  const h = await apiGet(`/order_rows/hydrate?${params.toString()}`);
+  applyProductToRow(tr, h.product || {});
+  rememberRowPricing(tr, { tcode, jcode, scode }, h.units);
+  applyUnitsToRow(tr, h.units || [], preferredUnit);
+
+  setStatus(`商品情報取得完了: 商品CD=${scode}`);
 
+  await refreshPricingForRow(tr).catch((e) => {
+    console.warn("[ui_main] refreshPricingForRow failed", e);
+  });
+
+  try { saveDraft(); } catch {}
+}
+
+function applyProductToRow(tr, r) {
   const makerCd = tr.querySelector(".maker_cd");
   const makerName = tr.querySelector(".maker_name");
   const sname = tr.querySelector(".sname");
@@ -48,12 +68,28 @@ export async function resolveProduct(tr) {
 
   supCd.textContent = r.supplier_code ?? "";
   supName.textContent = r.supplier_name ?? "";
+}
 
-  setStatus(`商品情報取得完了: 商品CD=${scode}`);
+// 複数行の商品・単位をまとめて取得し、単価は一括で決定する（下書き復元・初期表示用）
+// 行毎に GET 3回ずつ投げる代わりに、POST 2回 + resolve_batch 1回で済ませる
+export async function resolveRowsBulk(trs) {
+  const targets = trs.filter((tr) => (tr.querySelector(".scode")?.value || "").trim());
+  if (!targets.length) return;
+
+  const codes = targets.map((tr) => tr.querySelector(".scode").value.trim());
+  setStatus(`商品情報取得中... ${targets.length}行`);
+  const [products, units] = await Promise.all([
+    apiPost("/products/lookup", { codes }),
+    apiPost("/products/units/lookup", { codes }),
+  ]);
 
-  await resolveUnits(tr, tr.querySelector(".unit_select")?.value ?? "").catch((e) => {
-    console.warn("[ui_main] resolveUnits failed", e);
+  targets.forEach((tr, i) => {
+    applyProductToRow(tr, products.items?.[i] || {});
+    applyUnitsToRow(tr, units.items?.[codes[i]] || [], tr.dataset.preferredUnit || "");
+    delete tr.dataset.preferredUnit;
   });
+  setStatus(`商品情報取得完了: ${targets.length}行`);
 
+  await refreshPricingAllRows();
   try { saveDraft(); } catch {}
 }
@@ -7,7 +7,8 @@ import { resolveProduct } from "./product.js";
 import { applySelectedUnitToRow, resolveUnits } from "./units.js";
 import { openMakerSearch, openProductSearch } from "./popup.js";
 
-export function addRow(prefill = {}) {
+// deferResolve=true なら単位・単価を取りに行かない（呼び出し側で resolveRowsBulk する）
+export function addRow(prefill = {}, { deferResolve = false } = {}) {
   const tbody = document.querySelector("#grid tbody");
   if (!tbody) throw new Error("Missing element: #grid tbody");
 
@@ -121,7 +122,9 @@ export function addRow(prefill = {}) {
   const tehaiSel = tr.querySelector(".tehai");
   if (tehaiSel && prefill.tehai) tehaiSel.value = prefill.tehai;
 
-  if ((prefill.scode || "").trim()) {
+  if ((prefill.scode || "").trim() && deferResolve) {
+    tr.dataset.preferredUnit = prefill.unit_name || "";
+  } else if ((prefill.scode || "").trim()) {
     resolveUnits(tr, prefill.unit_name || "").catch(() => {});
   } else {
     setText(tr.querySelector(".teika"), String(prefill.teika ?? 0));
@@ -76,6 +76,15 @@ export async function resolveUnits(tr, preferredUnitName = "") {
 
   setStatus(`単位候補取得中... 商品CD=${scode}`);
   const units = await apiGet(`/products/units?product_cd=${encodeURIComponent(scode)}`);
+  applyUnitsToRow(tr, units, preferredUnitName);
+
+  setStatus(`単位候補取得完了: 商品CD=${scode}`);
+
+  await refreshPricingForRow(tr).catch(() => {});
+}
+
+// 単位候補を反映し、希望の単位（なければ候補が1つならそれ）を選ぶ
+export function applyUnitsToRow(tr, units, preferredUnitName = "") {
   fillUnitOptions(tr, units);
 
   const sel = tr.querySelector(".unit_select");
@@ -90,8 +99,4 @@ export async function resolveUnits(tr, preferredUnitName = "") {
     }
     applySelectedUnitToRow(tr);
   }
-
-  setStatus(`単位候補取得完了: 商品CD=${scode}`);
-
-  await refreshPricingForRow(tr).catch(() => {});
 }
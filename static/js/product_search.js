@@ -16,9 +16,11 @@ const makerNameEl = qs("maker_name");
 const makerPartNoEl = qs("maker_part_no");
 const productNameEl = qs("product_name");
 const specEl = qs("spec");
+const keywordEl = qs("q");
 
 const btnSearch = qs("btnSearch");
 const btnClose = qs("btnClose");
+const btnMore = qs("btnMore");
 const body = qs("resultBody");
 const errEl = qs("error");
 const loadingEl = qs("loading");
@@ -51,10 +53,13 @@ function setLoading(on) {
   if (makerPartNoEl) makerPartNoEl.disabled = !!on;
   if (productNameEl) productNameEl.disabled = !!on;
   if (specEl) specEl.disabled = !!on;
+  if (keywordEl) keywordEl.disabled = !!on;
+  if (btnMore) btnMore.disabled = !!on;
 }
 
 btnClose?.addEventListener("click", () => window.close());
 btnSearch?.addEventListener("click", () => search().catch((e) => setError(String(e))));
+btnMore?.addEventListener("click", () => search({ more: true }).catch((e) => setError(String(e))));
 
 // Enter=検索 / Esc=閉じる
 document.addEventListener("keydown", (e) => {
@@ -68,19 +73,31 @@ document.addEventListener("keydown", (e) => {
   }
 });
 
-// 検索
-async function search() {
+// 続きの取得用（直前の検索条件と next_after）
+let lastParams = null;
+let nextAfter = null;
+
+function setNextAfter(after) {
+  nextAfter = after ?? null;
+  if (btnMore) btnMore.hidden = nextAfter === null;
+}
+
+// 検索（more=true で前回の続きを追加表示）
+async function search({ more = false } = {}) {
   setError("");
 
   // 検索条件（空でも検索したいなら調整）
-  const params = new URLSearchParams({
+  const params = more && lastParams ? new URLSearchParams(lastParams) : new URLSearchParams({
     maker_cd: makerCdEl?.value?.trim() ?? "",
     maker_name: makerNameEl?.value?.trim() ?? "",
     maker_part_no: makerPartNoEl?.value?.trim() ?? "",
     product_name: productNameEl?.value?.trim() ?? "",
     spec: specEl?.value?.trim() ?? "",
+    q: keywordEl?.value?.trim() ?? "",
     limit: "200",
   });
+  if (!more) lastParams = params.toString();
+  if (more && nextAfter !== null) params.set("after", String(nextAfter));
 
   setLoading(true);
   try {
@@ -90,12 +107,14 @@ async function search() {
       throw new Error(`検索に失敗しました (${res.status}) ${t}`);
     }
 
-    const items = await res.json(); // list
+    const data = await res.json(); // { items: [...], has_more, next_after }
+    const items = data.items || [];
+    setNextAfter(data.has_more ? data.next_after : null);
 
-    body.innerHTML = "";
+    if (!more) body.innerHTML = "";
 
     // 該当なし
-    if (!items || items.length === 0) {
+    if (!more && (!items || items.length === 0)) {
       const tr = document.createElement("tr");
       tr.innerHTML = `<td colspan="6" class="muted">（該当なし）</td>`;
       body.appendChild(tr);
@@ -2,6 +2,7 @@
 import { onEnterOrBlur, setError, setStatus, todayISO, toNum } from "./order/core.js";
 import { resolveCustomerName, resolveShiptoName } from "./order/customer.js";
 import { saveDraft, restoreDraft } from "./order/draft.js";
+import { resolveRowsBulk } from "./order/product.js";
 import { addRow } from "./order/rows.js";
 import { resolveUnits } from "./order/units.js";
 import {
@@ -81,7 +82,7 @@ window.addEventListener("message", (e) => {
 function init() {
   console.log("[ui_main] init start");
   try {
-    const restored = restoreDraft(addRow);
+    const restored = restoreDraft((r) => addRow(r, { deferResolve: true }));
 
     const issueDate = document.getElementById("issue_date");
     if (issueDate && !issueDate.value) issueDate.value = todayISO();
@@ -132,12 +133,15 @@ function init() {
     const tbody = document.querySelector("#grid tbody");
     const hasRows = !!(tbody && tbody.children.length > 0);
     if (!restored || !hasRows) {
-      addRow({ scode: "534687", qty: 10 });
-      addRow({ scode: "479238", qty: 5 });
-      addRow({ scode: "50362", qty: 5 });
+      addRow({ scode: "534687", qty: 10 }, { deferResolve: true });
+      addRow({ scode: "479238", qty: 5 }, { deferResolve: true });
+      addRow({ scode: "50362", qty: 5 }, { deferResolve: true });
       saveDraft();
     }
 
+    // 復元した行の商品・単位・単価はまとめて取得する
+    resolveRowsBulk([...(tbody?.children ?? [])]).catch((err) => setError(String(err)));
+
     console.log("[ui_main] init end");
   } catch (e) {
     console.error("[ui_main] init crashed", e);
@@ -0,0 +1,44 @@
+# テスト共通のフィクスチャ（SQLite のスタンドイン DB）
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from app import db
+from benchmarks.standin_db import Scale, StandInDB, StandInPool, build
+
+# 単価の全経路（需商 / 得商 / 定価 / 該当なし）が出る程度の小さな規模
+STANDIN_SCALE = Scale(products=300, price_rows=6000, seed=7)
+
+
+@pytest.fixture(scope="session")
+def standin_path(tmp_path_factory) -> Path:
+    return build(STANDIN_SCALE, tmp_path_factory.mktemp("standin") / "standin.sqlite")
+
+
+@pytest.fixture
+def standin_db(standin_path):
+    sdb = StandInDB(standin_path)
+    yield sdb
+    sdb.close()
+
+
+@pytest.fixture
+def standin_pool(standin_path, monkeypatch):
+    """app.db の同期プールをスタンドインに差し替える。作られたプールは created に入る。"""
+    monkeypatch.setenv("ORACLE_DRIVER_MODE", "thick")
+    monkeypatch.setenv("ORACLE_USER", "test")
+    monkeypatch.setenv("ORACLE_PASSWORD", "test")
+    monkeypatch.setenv("ORACLE_DSN", "standin")
+    created: list[StandInPool] = []
+
+    def create_pool() -> StandInPool:
+        pool = StandInPool(standin_path, **db._pool_params())
+        created.append(pool)
+        return pool
+
+    monkeypatch.setattr(db, "_POOL", None)
+    monkeypatch.setattr(db, "_create_pool", create_pool)
+    yield created
+    db.close_pool()
@@ -0,0 +1,135 @@
+# app.db のプール・取得関数（スタンドイン DB）
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from app import db
+from app.repository import SQL_CUSTOMERS_BY_KEYS, SQL_MAKERS_BY_KEYS
+
+SQL_CUSTOMERS_UPTO = "SELECT 得意先コード, 得意先名 FROM 得意先マスタV WHERE 得意先コード <= :n ORDER BY 得意先コード"
+SQL_PRODUCTS = "SELECT 商品コード FROM 商品マスタV ORDER BY 商品コード"
+
+
+def _direct(standin_db, sql: str, params: dict | None = None) -> list[tuple]:
+    with standin_db.cursor() as cur:
+        return cur.execute(sql, params).fetchall()
+
+
+def test_pool_is_created_lazily_and_once(standin_pool):
+    assert db.pool_stats() == {"created": False}
+
+    barrier = threading.Barrier(16)
+    pools = []
+
+    def borrow() -> None:
+        barrier.wait()
+        pools.append(db.get_pool())
+
+    threads = [threading.Thread(target=borrow) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(standin_pool) == 1
+    assert all(p is standin_pool[0] for p in pools)
+    assert db.pool_stats()["created"] is True
+
+
+def test_pool_params_from_env(standin_pool, monkeypatch):
+    monkeypatch.setenv("ORACLE_POOL_MIN", "3")
+    monkeypatch.setenv("ORACLE_POOL_MAX", "2")
+    monkeypatch.setenv("ORACLE_POOL_WAIT_TIMEOUT", "1500")
+    db.get_pool()
+    stats = db.pool_stats()
+    # max は min より小さくしない
+    assert (stats["min"], stats["max"], stats["wait_timeout"]) == (3, 3, 1500)
+
+
+def test_fetch_all_and_fetch_one(standin_pool, standin_db):
+    rows = asyncio.run(db.fetch_all(SQL_CUSTOMERS_UPTO, {"n": 5}))
+    assert rows == _direct(standin_db, SQL_CUSTOMERS_UPTO, {"n": 5})
+    assert len(rows) == 5
+
+    row = asyncio.run(db.fetch_one(SQL_CUSTOMERS_UPTO, {"n": 5}))
+    assert row == rows[0]
+    assert asyncio.run(db.fetch_one(SQL_CUSTOMERS_UPTO, {"n": 0})) is None
+    assert db.pool_stats()["busy"] == 0
+
+
+def test_connection_is_returned_on_error(standin_pool):
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(db.fetch_all("SELECT * FROM 無い表V"))
+    assert db.pool_stats()["busy"] == 0
+    assert asyncio.run(db.fetch_one("SELECT 1 FROM dual")) == (1,)
+
+
+def test_concurrent_fetches_share_the_pool(standin_pool, standin_db, monkeypatch):
+    monkeypatch.setenv("ORACLE_POOL_MAX", "2")
+    expected = _direct(standin_db, SQL_CUSTOMERS_UPTO, {"n": 10})
+
+    async def run() -> list:
+        return await asyncio.gather(*(db.fetch_all(SQL_CUSTOMERS_UPTO, {"n": 10}) for _ in range(20)))
+
+    assert all(rows == expected for rows in asyncio.run(run()))
+    pool = standin_pool[0]
+    assert pool.opened <= 2
+    assert pool.acquires == 20
+    assert pool.busy == 0
+
+
+def test_iter_rows_yields_arraysize_batches(standin_pool, standin_db):
+    async def run() -> list[list[tuple]]:
+        return [batch async for batch in db.iter_rows(SQL_PRODUCTS, arraysize=128)]
+
+    batches = asyncio.run(run())
+    assert [len(b) for b in batches] == [128, 128, 44]
+    assert [r for b in batches for r in b] == _direct(standin_db, SQL_PRODUCTS)
+    assert db.pool_stats()["busy"] == 0
+
+
+def test_iter_rows_releases_connection_when_abandoned(standin_pool):
+    async def run() -> int:
+        gen = db.iter_rows(SQL_PRODUCTS, arraysize=50)
+        first = await gen.__anext__()
+        assert db.pool_stats()["busy"] == 1  # 取り出し中は接続を保持する
+        await gen.aclose()
+        return len(first)
+
+    assert asyncio.run(run()) == 50
+    assert db.pool_stats()["busy"] == 0
+
+
+def test_fetch_all_by_keys(standin_pool, standin_db):
+    customers = asyncio.run(db.fetch_all_by_keys(SQL_CUSTOMERS_BY_KEYS, ["1", 2, 3, 999999], numeric=True))
+    expected = _direct(standin_db, SQL_CUSTOMERS_UPTO, {"n": 3})
+    assert sorted(customers) == expected
+
+    makers = asyncio.run(db.fetch_all_by_keys(SQL_MAKERS_BY_KEYS, ["M0001", "M0002", "NOPE"]))
+    assert sorted(code for code, _ in makers) == ["M0001", "M0002"]
+
+    assert sorted(db.fetch_all_by_keys_sync(SQL_MAKERS_BY_KEYS, ["M0002", "M0001"])) == sorted(makers)
+    assert db.pool_stats()["busy"] == 0
+
+
+def test_fetch_all_by_keys_empty_and_limit(standin_pool):
+    # 空ならプールにも触れない
+    assert asyncio.run(db.fetch_all_by_keys(SQL_MAKERS_BY_KEYS, [])) == []
+    assert db.fetch_all_by_keys_sync(SQL_MAKERS_BY_KEYS, []) == []
+    assert db.pool_stats() == {"created": False}
+
+    with pytest.raises(ValueError):
+        asyncio.run(db.fetch_all_by_keys(SQL_MAKERS_BY_KEYS, ["x"] * (db.MAX_BIND_KEYS + 1)))
+
+
+def test_close_pool_and_recreate(standin_pool):
+    assert db.ping() == 1
+    db.close_pool()
+    assert db.pool_stats() == {"created": False}
+    assert standin_pool[0].closed
+    assert db.ping() == 1
+    assert len(standin_pool) == 2
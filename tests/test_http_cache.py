@@ -0,0 +1,96 @@
+# app.http_cache の ETag（指紋の無いビュー・ワーカー間の flush）
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import http_cache
+from app.http_cache import FLUSH_FILE, HttpCacheMiddleware, ViewVersions, note_view_rows
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("MASTER_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setenv("HTTP_CACHE_ENABLED", "true")
+    monkeypatch.setattr(http_cache, "_VERSIONS", ViewVersions())
+    monkeypatch.setattr(http_cache, "_FLUSH", http_cache._FlushFile())
+    monkeypatch.setattr(http_cache, "_STATS", http_cache._Stats())
+    monkeypatch.setattr(http_cache, "_FLUSH_CHECK_SEC", 0.0)
+
+    app = FastAPI()
+
+    @app.get("/api/customers/{tcode}")
+    def customer(tcode: int):
+        return {"tcode": tcode}
+
+    @app.get("/api/products/{scode}")
+    def product(scode: str):
+        return {"product_cd": scode}
+
+    app.add_middleware(HttpCacheMiddleware)
+    return TestClient(app)
+
+
+def _revalidate(client, url: str, etag: str) -> int:
+    return client.get(url, headers={"If-None-Match": etag}).status_code
+
+
+def test_no_etag_until_every_view_has_a_fingerprint(client):
+    assert "etag" not in client.get("/api/customers/1").headers
+    # 指紋が無い間は If-None-Match を送られても 304 にしない
+    assert _revalidate(client, "/api/customers/1", "*") == 200
+
+    note_view_rows("得意先マスタV", [(1, "東京商事")], "name_index")
+    etag = client.get("/api/customers/1").headers["etag"]
+    assert _revalidate(client, "/api/customers/1", etag) == 304
+
+    # 商品参照は 商品マスタV・メーカマスタV・仕入先マスタV の全てに指紋が要る
+    note_view_rows("商品マスタV", [("P1",)], "master_snapshot")
+    note_view_rows("メーカマスタV", [("M1",)], "master_snapshot")
+    assert "etag" not in client.get("/api/products/P1").headers
+    note_view_rows("仕入先マスタV", [("S1",)], "master_snapshot")
+    assert "etag" in client.get("/api/products/P1").headers
+
+    assert http_cache.http_cache_stats()["unversioned"] == 3
+
+
+def test_fingerprint_change_invalidates(client):
+    note_view_rows("得意先マスタV", [(1, "東京商事")], "name_index")
+    etag = client.get("/api/customers/1").headers["etag"]
+    note_view_rows("得意先マスタV", [(1, "東京商事（株）")], "name_index")
+    assert _revalidate(client, "/api/customers/1", etag) == 200
+
+
+def test_flush_written_by_another_worker_is_picked_up(client, tmp_path):
+    note_view_rows("得意先マスタV", [(1, "東京商事")], "name_index")
+    etag = client.get("/api/customers/1").headers["etag"]
+
+    # 別のワーカーの flush（共有ファイルだけが変わる）
+    (tmp_path / FLUSH_FILE).write_text(json.dumps({"得意先マスタV": "0123abcd"}), encoding="utf-8")
+    assert _revalidate(client, "/api/customers/1", etag) == 200
+    flushed = client.get("/api/customers/1").headers["etag"]
+    assert flushed != etag
+    assert _revalidate(client, "/api/customers/1", flushed) == 304
+
+
+def test_flush_views_writes_the_shared_file(client, tmp_path):
+    note_view_rows("得意先マスタV", [(1, "東京商事")], "name_index")
+    etag = client.get("/api/customers/1").headers["etag"]
+
+    assert http_cache.flush_views(["得意先マスタV"]) == ["得意先マスタV"]
+    assert set(json.loads((tmp_path / FLUSH_FILE).read_text(encoding="utf-8"))) == {"得意先マスタV"}
+    assert _revalidate(client, "/api/customers/1", etag) == 200
+
+
+def test_versions_agree_across_workers():
+    # 同じ指紋と flush なら、別プロセスでも同じ版（同じ ETag）
+    a, b = ViewVersions(), ViewVersions()
+    for versions in (a, b):
+        versions.set_fingerprint("得意先マスタV", "fp1", "name_index")
+        versions.set_fingerprint("得意先マスタV", "fp2", "master_snapshot")
+        versions.set_flushes({"得意先マスタV": "x"})
+    assert a.get("得意先マスタV") == b.get("得意先マスタV") is not None
+    assert a.get("メーカマスタV") is None
@@ -0,0 +1,93 @@
+# 品名の幅切り（app.pdf.clip_text_to_width）と従来の実装の一致（固定コーパス）
+from __future__ import annotations
+
+import os
+import random
+
+import pytest
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+from app import pdf
+from benchmarks.bench_clip_text import _PARTS, _naive, _names
+
+_TTF_NAME = "ClipTestVera"
+_TTF_PATH = os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")
+
+SIZES = [pdf.FONT_SIZE_SMALL, pdf.FONT_SIZE_MAIN, 9.5]
+WIDTHS = [150.0, 40.0, 5.0, 0.5, 0.0, -0.5, -40.0]
+
+
+def _fonts() -> list:
+    fonts = [
+        pytest.param(_TTF_NAME, id="ttf"),
+        pytest.param("Helvetica", id="base14"),
+    ]
+    if os.path.exists(pdf._font_path()):
+        fonts.append(pytest.param(pdf._FONT_NAME, id="ipaex"))
+    return fonts
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _register_fonts():
+    pdfmetrics.registerFont(TTFont(_TTF_NAME, _TTF_PATH))
+    if os.path.exists(pdf._font_path()):
+        pdf.ensure_japanese_font()
+
+
+def _corpus() -> list[str]:
+    names = _names(600, seed=11)
+    names += ["", " ", "…", "W", "ボルト…", "".join(_PARTS)]
+    return names
+
+
+def _cases(font_name: str) -> list[tuple[str, float, float]]:
+    rnd = random.Random(font_name)
+    suffix = {size: pdfmetrics.stringWidth("…", font_name, size) for size in SIZES}
+    cases = []
+    for text in _corpus():
+        for size in SIZES:
+            cases.append((text, size, rnd.choice(WIDTHS)))
+            full = pdfmetrics.stringWidth(text, font_name, size)
+            # 全体ちょうど・途中の文字ちょうど（と「…」分を足した幅）
+            cases.append((text, size, full))
+            if text:
+                k = rnd.randint(1, len(text))
+                w = pdfmetrics.stringWidth(text[:k], font_name, size)
+                cases += [(text, size, w), (text, size, w + suffix[size]), (text, size, suffix[size])]
+    return cases
+
+
+@pytest.mark.parametrize("font_name", _fonts())
+def test_clip_matches_naive(font_name):
+    pdf._clip_text.cache_clear()
+    cases = _cases(font_name)
+    mismatches = [
+        (text, size, width)
+        for text, size, width in cases
+        if pdf.clip_text_to_width(text, font_name, size, width) != _naive(text, font_name, size, width)
+    ]
+    assert mismatches == []
+    # 2回目は結果のキャッシュから。同じ結果であること
+    assert all(
+        pdf.clip_text_to_width(text, font_name, size, width) == _naive(text, font_name, size, width)
+        for text, size, width in cases[:500]
+    )
+
+
+@pytest.mark.parametrize("font_name", _fonts())
+@pytest.mark.parametrize("width", [0.0, -1.0, -1000.0])
+def test_zero_and_negative_widths(font_name, width):
+    for text in ("", "六角ボルト M12×40", "W" * 50):
+        assert pdf.clip_text_to_width(text, font_name, 9.0, width) == _naive(text, font_name, 9.0, width) == ""
+
+
+@pytest.mark.parametrize("font_name", _fonts())
+def test_exact_fit_and_empty(font_name):
+    text = "SUS304 六角ボルト"
+    full = pdfmetrics.stringWidth(text, font_name, 9.0)
+    assert pdf.clip_text_to_width(text, font_name, 9.0, full) == text
+    assert pdf.clip_text_to_width("", font_name, 9.0, 100.0) == ""
+    clipped = pdf.clip_text_to_width(text, font_name, 9.0, full - 0.01)
+    assert clipped.endswith("…") and clipped == _naive(text, font_name, 9.0, full - 0.01)
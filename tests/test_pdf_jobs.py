@@ -0,0 +1,138 @@
+# app.pdf_jobs の実行権（claim）と終了処理、app.pdf_pool の shutdown 後の投入
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from app import pdf_jobs, pdf_pool
+
+ORDER = {
+    "header": {"customer_name": "テスト商事", "order_date": "2026-04-01"},
+    "items": [{"scode": "P0001", "irank": "1", "qty": 2, "name": "六角ボルト", "price": 100}],
+}
+
+
+def _drain() -> list[str]:
+    ids = []
+    while not pdf_jobs._QUEUE.empty():
+        ids.append(pdf_jobs._QUEUE.get_nowait())
+    return ids
+
+
+@pytest.fixture
+def job_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PDF_JOB_DIR", str(tmp_path))
+    _drain()
+    yield tmp_path
+    _drain()
+    pdf_pool.open_pdf_executor()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """submit_render を差し替え、呼び出しを記録する。結果は outcome で決める。"""
+    calls: list[dict] = []
+    outcome = {"result": b"%PDF-1.4 test"}
+
+    def submit_render(header, items, template_id) -> Future:
+        calls.append(header)
+        future: Future = Future()
+        if outcome.get("cancel"):
+            future.cancel()
+        else:
+            future.set_result(outcome["result"])
+        return future
+
+    monkeypatch.setattr(pdf_pool, "submit_render", submit_render)
+    return calls, outcome
+
+
+def test_job_runs_once_when_every_worker_requeues(job_dir, renders):
+    calls, _ = renders
+    job_id = pdf_jobs.submit_job(ORDER)["job_id"]
+    # uvicorn のワーカー2つが起動時にそれぞれ積み直した状態
+    assert pdf_jobs._requeue_pending() == 1
+    assert pdf_jobs._requeue_pending() == 1
+
+    queued = _drain()
+    assert queued == [job_id] * 3
+    for jid in queued:
+        pdf_jobs._run_job(jid)
+
+    assert len(calls) == 1
+    meta = pdf_jobs.get_job(job_id)
+    assert meta["status"] == "done"
+    assert pdf_jobs.result_path(job_id).read_bytes() == b"%PDF-1.4 test"
+    # 完了後は積み直さない
+    assert pdf_jobs._requeue_pending() == 0
+
+
+def test_cancelled_render_is_not_marked_failed(job_dir, renders):
+    _, outcome = renders
+    outcome["cancel"] = True
+    job_id = pdf_jobs.submit_job(ORDER)["job_id"]
+    _drain()
+
+    pdf_jobs._run_job(job_id)
+
+    meta = pdf_jobs.get_job(job_id)
+    assert meta["status"] == "running"
+    assert meta["error"] is None
+    assert not (job_dir / job_id / pdf_jobs.CLAIM_FILE).exists()
+    # 次回起動時に積み直される
+    assert pdf_jobs._requeue_pending() == 1
+    assert pdf_jobs.get_job(job_id)["status"] == "queued"
+
+
+def test_closed_pool_is_not_marked_failed(job_dir, monkeypatch):
+    monkeypatch.setattr(pdf_pool, "_EXECUTOR", None)
+    pdf_pool.shutdown_pdf_executor()
+    job_id = pdf_jobs.submit_job(ORDER)["job_id"]
+    _drain()
+
+    pdf_jobs._run_job(job_id)
+
+    assert pdf_jobs.get_job(job_id)["status"] == "running"
+    assert pdf_jobs._requeue_pending() == 1
+
+
+def test_live_claim_blocks_requeue_until_it_expires(job_dir, monkeypatch):
+    monkeypatch.setenv("PDF_JOB_CLAIM_TIMEOUT_SEC", "60")
+    job_id = pdf_jobs.submit_job(ORDER)["job_id"]
+    _drain()
+    # 別のワーカーが実行中
+    assert pdf_jobs._claim(job_id)
+    pdf_jobs._update_meta(job_id, status="running", started_at=time.time())
+    assert not pdf_jobs._claim(job_id)
+    assert pdf_jobs._requeue_pending() == 0
+
+    # そのワーカーが落ちて claim が更新されなくなった
+    old = time.time() - 120
+    os.utime(job_dir / job_id / pdf_jobs.CLAIM_FILE, (old, old))
+    assert pdf_jobs._requeue_pending(include_queued=False) == 1
+    assert _drain() == [job_id]
+    assert pdf_jobs.get_job(job_id)["status"] == "queued"
+    assert pdf_jobs._claim(job_id)
+
+
+def test_periodic_requeue_skips_queued_jobs(job_dir):
+    pdf_jobs.submit_job(ORDER)
+    _drain()
+    assert pdf_jobs._requeue_pending(include_queued=False) == 0
+
+
+def test_submit_render_raises_after_shutdown(job_dir, monkeypatch):
+    monkeypatch.setattr(pdf_pool, "_EXECUTOR", None)
+    pdf_pool.shutdown_pdf_executor()
+    assert pdf_pool.pdf_pool_stats()["closed"] is True
+    with pytest.raises(pdf_pool.PdfPoolClosed):
+        pdf_pool.submit_render({}, [], "default")
+    with pytest.raises(pdf_pool.PdfPoolClosed):
+        pdf_pool.get_pdf_executor()
+    assert pdf_pool._EXECUTOR is None  # 作り直していない
+
+    pdf_pool.open_pdf_executor()
+    assert pdf_pool.pdf_pool_stats()["closed"] is False
@@ -0,0 +1,62 @@
+# app.pdf_pool の一括描画（失敗時の取り消し）とプールの起動方式
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import pdf_pool
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """プロセスプールの代わりにスレッドプールで _render を呼ぶ。"""
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(pdf_pool, "get_pdf_executor", lambda: executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_render_many_cancels_the_rest_on_failure(thread_pool, monkeypatch):
+    started: list[str] = []
+    lock = threading.Lock()
+
+    def render(header, items, template_id):
+        with lock:
+            started.append(header["id"])
+        if header["id"] == "0":
+            raise ValueError("broken template")
+        return header["id"].encode()
+
+    monkeypatch.setattr(pdf_pool, "_render", render)
+    payloads = [({"id": str(i)}, []) for i in range(6)]
+
+    async def run():
+        with pytest.raises(ValueError, match="broken template"):
+            await pdf_pool.render_many(payloads, template_id="default", concurrency=1)
+        # 残りがバックグラウンドで投入され続けていないこと
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert started == ["0"]
+
+
+def test_render_many_keeps_input_order(thread_pool, monkeypatch):
+    monkeypatch.setattr(pdf_pool, "_render", lambda header, items, template_id: header["id"].encode())
+    payloads = [({"id": str(i)}, []) for i in range(5)]
+    assert asyncio.run(pdf_pool.render_many(payloads, template_id="default", concurrency=3)) == [
+        b"0", b"1", b"2", b"3", b"4"
+    ]
+
+
+def test_executor_uses_spawn(monkeypatch):
+    monkeypatch.setattr(pdf_pool, "_EXECUTOR", None)
+    pdf_pool.open_pdf_executor()
+    try:
+        executor = pdf_pool.get_pdf_executor()
+        assert executor._mp_context.get_start_method() == "spawn"
+    finally:
+        pdf_pool.shutdown_pdf_executor()
+        pdf_pool.open_pdf_executor()
@@ -0,0 +1,138 @@
+# 単価のメモリ索引と SQL 経路の差分（スタンドイン DB）
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.price_index import _VIEWS, InvalidCode, PriceIndex, diff_against_sql
+from app.pricing import PricingKey, decide_pricing_batch, pick_pricing
+
+
+@pytest.fixture
+def index_and_cursor(standin_db):
+    index = PriceIndex()
+    with standin_db.cursor() as cur:
+        index.load_full(cur)
+        yield index, cur
+
+
+def test_sample_zero_returns_every_key(index_and_cursor):
+    index, _ = index_and_cursor
+    tables = index.stats()["tables"]
+    keys = index.sample_keys(0)
+    # 全ビューの全キー + 未ヒット1件
+    assert len(keys) == sum(tables.values()) + 1
+    assert len(index.sample_keys(10)) == 10
+
+
+def test_index_matches_single_sql(index_and_cursor):
+    index, cur = index_and_cursor
+    keys = index.sample_keys(0, seed=1)
+    assert diff_against_sql(index, cur, keys) == []
+    # 全経路を通っていること（差分が無いのが空振りでない）
+    sources = {index.resolve(k).source for k in keys}
+    assert {"需商", "得商", "定価", "未設定"} <= sources
+
+
+def test_index_matches_batch_sql(index_and_cursor):
+    index, cur = index_and_cursor
+    keys = index.sample_keys(2000, seed=2)
+    keys += keys[:50]  # 重複キーも入力順で返す
+    assert index.resolve_many(keys) == decide_pricing_batch(cur, keys)
+
+
+def test_index_compares_codes_like_sql(index_and_cursor):
+    index, cur = index_and_cursor
+    keys = [k for k in index.sample_keys(0, seed=4) if index.resolve(k).source != "未設定"][:200]
+    variants = []
+    for k in keys:
+        # 得意先・需要先コードは NUMBER（空白・先頭ゼロは同じ値）、商品コード・入数ランクは文字列の完全一致
+        variants.append(PricingKey(f" 00{k.tcode} ", f"0{k.jcode}", k.scode, k.irank))
+        variants.append(PricingKey(k.tcode, k.jcode, f" {k.scode}", k.irank))
+        variants.append(PricingKey(k.tcode, k.jcode, f"{k.scode} ", k.irank))
+        variants.append(PricingKey(k.tcode, k.jcode, k.scode, f"0{k.irank}"))
+    assert diff_against_sql(index, cur, variants) == []
+    # 一致しているのが空振りでない: 数値のゆれはヒットし、文字列のゆれは外れる
+    assert index.resolve(variants[0]) == index.resolve(keys[0])
+    assert index.resolve(variants[1]).source == "未設定"
+
+
+def test_index_rejects_non_numeric_number_codes(index_and_cursor):
+    index, _ = index_and_cursor
+    key = next(k for k in index.sample_keys(0) if index.resolve(k).source == "得商")
+    with pytest.raises(InvalidCode):
+        index.resolve(PricingKey(f"{key.tcode}x", key.jcode, key.scode, key.irank))
+
+
+class _DeltaCursor:
+    """更新日時列つきのビューを返すだけのカーソル。rows は ビュー -> [(キー..., 値..., 更新日時)]。"""
+
+    def __init__(self, rows: dict[str, list[tuple]]) -> None:
+        self.rows = rows
+        self.executed: list[tuple[str, dict]] = []
+        self.arraysize = 1
+        self._pending: list[tuple] = []
+
+    def execute(self, sql: str, params: dict) -> None:
+        self.executed.append((sql, params))
+        view = sql.split(" FROM ")[1].split()[0]
+        since = params.get("since")
+        self._pending = [r for r in self.rows.get(view, []) if since is None or r[-1] >= since]
+
+    def fetchmany(self) -> list[tuple]:
+        out, self._pending = self._pending, []
+        return out
+
+
+def test_delta_swaps_snapshot_and_rereads_overlap(monkeypatch):
+    monkeypatch.setenv("PRICE_INDEX_DELTA_LAG_SEC", "60")
+    t0 = datetime(2026, 4, 1, 9, 0, 0)
+    rows = {
+        "得意先商品売上単価マスタV": [(1, "P1", "1", 100, t0), (1, "P1", "1", 999, t0), (2, "P1", "1", 200, t0)],
+    }
+    cur = _DeltaCursor(rows)
+    index = PriceIndex(updated_col="更新日時")
+    index.load_full(cur)
+    before = index._snap
+    tu = before.tables["tu"]
+    assert tu[(1, "P1", "1")] == (100,)  # 先勝ち
+    assert before.watermarks["tu"] == t0 and before.watermarks["ju"] is None
+
+    # 前回と同じ時刻で遅れてコミットされた行・更新された行・空だったビューの行
+    rows["得意先商品売上単価マスタV"][2] = (2, "P1", "1", 250, t0 + timedelta(seconds=1))
+    rows["得意先商品売上単価マスタV"].append((3, "P1", "1", 300, t0))
+    rows["需要先商品売上単価マスタV"] = [(1, 5, "P1", "1", 80, None)]
+    assert index.load_delta(cur) == 3
+
+    after = index._snap
+    assert after is not before
+    assert before.tables["tu"] is tu and (3, "P1", "1") not in tu  # 読み取り中の索引は書き換えない
+    assert after.tables["tu"][(3, "P1", "1")] == (300,)
+    assert after.tables["tu"][(2, "P1", "1")] == (250,)
+    assert after.tables["tu"][(1, "P1", "1")] == (100,)  # 再読込でも先勝ちのまま
+    assert after.tables["ju"] == {(1, 5, "P1", "1"): (80,)}  # 更新日時の無いビューは全件読み直す
+    assert after.watermarks["tu"] == t0 + timedelta(seconds=1)
+    assert index.resolve(PricingKey("03", "0", "P1", "1")).sales_price == 300
+
+    delta_sql = {sql.split(" FROM ")[1].split()[0]: (sql, p) for sql, p in cur.executed[len(_VIEWS):]}
+    sql, params = delta_sql["得意先商品売上単価マスタV"]
+    assert "更新日時 >= :since" in sql and params["since"] == t0 - timedelta(seconds=60)
+    assert "WHERE" not in delta_sql["需要先商品売上単価マスタV"][0]
+
+
+@pytest.mark.parametrize(
+    "tiers, expected",
+    [
+        ({"ju": (None, 100, None, None), "tu": (None, 200, None, None)}, ("需商", 0, 100, 0, None)),
+        ({"js": (None, None, "S1", 80), "teika": (300, 250, None, 90)}, ("需商", 0, 0, 80, "S1")),
+        ({"ju": (None, None, None, None), "tu": (None, 200, None, None), "ts": (None, None, "S2", 150)},
+         ("得商", 0, 200, 150, "S2")),
+        ({"teika": (300, None, None, None)}, ("定価", 300, 0, 0, None)),
+        ({"teika": (None, None, None, None)}, ("未設定", 0, 0, 0, None)),
+        ({}, ("未設定", 0, 0, 0, None)),
+    ],
+)
+def test_pick_pricing_priority(tiers, expected):
+    r = pick_pricing(tiers)
+    assert (r.source, r.teika, r.sales_price, r.purchase_price, r.supplier_code) == expected
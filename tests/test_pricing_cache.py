@@ -0,0 +1,81 @@
+# app.pricing_cache の破棄（読み込み中の破棄・ワーカー間の flush ファイル）
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app import pricing_cache
+from app.pricing import PricingKey, PricingResult
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+K1 = PricingKey("1", "0", "P1", "1")
+K2 = PricingKey("2", "0", "P1", "1")
+
+
+def _result(price: int) -> PricingResult:
+    return PricingResult(source="定価", teika=price, sales_price=price, purchase_price=0, supplier_code=None)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("MASTER_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(pricing_cache, "_CACHE", None)
+    monkeypatch.setattr(pricing_cache, "_FLUSH", pricing_cache._FlushFile())
+    monkeypatch.setattr(pricing_cache, "_FLUSH_CHECK_SEC", 0.0)
+    return pricing_cache.get_pricing_cache()
+
+
+def _load(price: int):
+    calls: list[list[PricingKey]] = []
+
+    def load(keys: list[PricingKey]) -> list[PricingResult]:
+        calls.append(keys)
+        return [_result(price) for _ in keys]
+
+    return load, calls
+
+
+def test_flush_during_load_is_not_overwritten(cache):
+    def load(keys: list[PricingKey]) -> list[PricingResult]:
+        # 読み込み中に単価マスタが更新され flush された
+        pricing_cache.flush_pricing_cache(tcode="1")
+        return [_result(100) for _ in keys]
+
+    assert pricing_cache.resolve_cached([K1], load) == [_result(100)]
+    assert cache.get(K1) is None
+    assert cache.stats()["stale_puts"] == 1
+
+    load2, calls = _load(200)
+    assert pricing_cache.resolve_cached([K1], load2) == [_result(200)]
+    assert pricing_cache.resolve_cached([K1], load2) == [_result(200)]
+    assert len(calls) == 1
+
+
+def test_flush_from_another_worker_applies_here(cache):
+    load, _ = _load(100)
+    pricing_cache.resolve_cached([K1, K2], load)
+    assert cache.get(K1) is not None and cache.get(K2) is not None
+
+    code = "from app.pricing_cache import flush_pricing_cache; flush_pricing_cache(tcode='1')"
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, check=True)
+
+    load2, calls = _load(200)
+    assert pricing_cache.resolve_cached([K1, K2], load2) == [_result(200), _result(100)]
+    assert calls == [[K1]]
+
+
+def test_worker_behind_the_kept_log_clears_everything(cache, tmp_path):
+    load, _ = _load(100)
+    pricing_cache.resolve_cached([K1, K2], load)
+    # このワーカーが確認しない間に3回 flush され、最初の破棄はファイルから消えている
+    entries = [{"seq": seq, "tcode": None, "scode": "X"} for seq in (2, 3)]
+    (tmp_path / pricing_cache.FLUSH_FILE).write_text(json.dumps({"seq": 3, "entries": entries}), encoding="utf-8")
+
+    pricing_cache._FLUSH.sync()
+    assert cache.get(K1) is None and cache.get(K2) is None
+    assert pricing_cache.pricing_cache_stats()["flush_seq"] == 3
@@ -0,0 +1,57 @@
+# app.product_index の検索条件と keyset ページング
+from __future__ import annotations
+
+import pytest
+
+from app.product_index import InvalidAfter, ProductIndex
+
+# (商品コード, 商品名, 規格, メーカコード, メーカ名, メーカ品番)。DB の照合順序を想定して順不同
+ROWS = [
+    ("P010", "六角ボルト", "M10", "M01", "日本螺子", "HB-10"),
+    ("P002", "六角ボルト", "M12", "M02", "東洋ネジ", "HB-12"),
+    ("p001", "六角ナット", "M12", "M01", "日本螺子", "HN-12"),
+    ("P003", "丸座金", "M12", "M01", "日本螺子", "W-12"),
+    ("P100", "ボルト用座金", "M8", "M02", "東洋ネジ", "BW-8"),
+    ("P004", "ステンレスボルト", "M12", "M01", "日本螺子", "SB-12"),
+]
+
+
+@pytest.fixture
+def index() -> ProductIndex:
+    ix = ProductIndex()
+    ix.load_rows(list(ROWS))
+    return ix
+
+
+def _codes(rows: list[tuple]) -> list[str]:
+    return [r[0] for r in rows]
+
+
+def test_keyword_search_applies_field_filters(index):
+    assert set(_codes(index.search_keywords("ボルト"))) == {"P010", "P002", "P100", "P004"}
+    assert _codes(index.search_keywords("ボルト", spec="M12", maker_name="日本")) == ["P004"]
+    assert set(_codes(index.search_keywords("ボルト", maker_part_no="hb"))) == {"P010", "P002"}
+    assert _codes(index.search_keywords("ボルト", product_name="六角", maker_cd="M02")) == ["P002"]
+    assert index.search_keywords("ボルト", product_name="ナット") == []
+
+
+def test_rows_are_ordered_by_code_string(index):
+    codes = _codes(index.search())
+    assert codes == sorted(r[0] for r in ROWS)
+
+
+def test_paging_after_missing_code_uses_string_order(index):
+    everything = _codes(index.search())
+    page1 = _codes(index.search(limit=2))
+    page2 = _codes(index.search(limit=2, after=page1[-1]))
+    assert page1 + page2 == everything[:4]
+    # 再読込で消えたコード（"P005"）でも文字列順の位置から続ける
+    assert _codes(index.search(after="P005")) == [c for c in everything if c > "P005"]
+
+
+def test_keyword_paging_rejects_unknown_after(index):
+    first = index.search_keywords("ボルト", limit=1)
+    rest = index.search_keywords("ボルト", after=first[0][0])
+    assert set(_codes(first + rest)) == {"P010", "P002", "P100", "P004"}
+    with pytest.raises(InvalidAfter):
+        index.search_keywords("ボルト", after="p001")
@@ -0,0 +1,77 @@
+# app.repository の抽象クラスとレプリカ（スナップショット）参照
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from app.master_snapshot import MasterSnapshot, build_snapshot
+from app.price_index import PriceIndex
+from app.repository import OracleRepository, ReplicaRepository, Repository
+
+
+@pytest.fixture
+def replica_snapshot(standin_db, tmp_path, monkeypatch):
+    monkeypatch.setenv("MASTER_SNAPSHOT_PRICES", "true")
+    with standin_db.cursor() as cur:
+        path = build_snapshot(cur, tmp_path)
+    snap = MasterSnapshot(path)
+    yield snap
+    snap.close()
+
+
+def test_repository_is_abstract():
+    with pytest.raises(TypeError):
+        Repository()
+
+    class Partial(Repository):
+        async def customer_names(self, codes):
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert OracleRepository().name == "oracle"
+
+
+def test_replica_reads_snapshot_off_the_event_loop(replica_snapshot, standin_db, monkeypatch):
+    snap = replica_snapshot
+    threads: set[int] = set()
+    for name in ("customer_names", "maker_names", "products", "units", "pricing"):
+        method = getattr(snap, name)
+
+        def recorded(*args, _method=method):
+            threads.add(threading.get_ident())
+            return _method(*args)
+
+        monkeypatch.setattr(snap, name, recorded)
+
+    with standin_db.cursor() as cur:
+        index = PriceIndex()
+        index.load_full(cur)
+        product_codes = [r[0] for r in cur.execute("SELECT 商品コード FROM 商品マスタV ORDER BY 商品コード").fetchall()[:5]]
+    keys = index.sample_keys(200, seed=3)
+    repo = ReplicaRepository(snap)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        result = (
+            await repo.customer_names([1, 2, 999999]),
+            await repo.maker_names(["M0001", "NOPE"]),
+            await repo.products(product_codes + ["NOPE"]),
+            await repo.units(product_codes[:2] + ["NOPE"]),
+            await repo.pricing(keys[0]),
+            await repo.pricing_many(keys),
+        )
+        return loop_thread, result
+
+    loop_thread, (customers, makers, products, units, price, prices) = asyncio.run(run())
+
+    assert threads and loop_thread not in threads
+    assert set(customers) == {1, 2}
+    assert set(makers) == {"M0001"}
+    assert set(products) == set(product_codes)
+    assert units["NOPE"] == [] and all(units[c] for c in product_codes[:2])
+    # 単価は SQLite 上の判定とメモリ索引が一致する
+    assert price == index.resolve(keys[0])
+    assert prices == index.resolve_many(keys)
@@ -0,0 +1,75 @@
+# 検索ページの cursor（next_after）と経路の取り違え
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app import name_index
+from app.name_index import NameIndex
+from app.routes import customers, shipto
+from app.search_cache import get_search_cache
+from app.search_page import ORDER_CODE, ORDER_RANK, InvalidCursor, decode_cursor, page_bytes
+
+ROWS = [(3, "東京スタンド"), (1, "スタンド商会"), (2, "大阪スタンド販売"), (10, "スタンド")]
+
+
+def test_cursor_round_trip():
+    body = json.loads(page_bytes(ROWS, ("tcode", "customer_name"), 2, order=ORDER_RANK))
+    assert body["has_more"] is True
+    assert body["next_after"] == "r:1"
+    assert decode_cursor(body["next_after"], ORDER_RANK) == "1"
+    with pytest.raises(InvalidCursor):
+        decode_cursor(body["next_after"], ORDER_CODE)
+
+    # 印の無い after（従来の形）はコード順
+    assert decode_cursor("123", ORDER_CODE) == "123"
+    with pytest.raises(InvalidCursor):
+        decode_cursor("123", ORDER_RANK)
+    assert decode_cursor(None, ORDER_RANK) is None
+    assert decode_cursor("", ORDER_CODE) is None
+
+    last = json.loads(page_bytes(ROWS, ("tcode", "customer_name"), 10, order=ORDER_CODE))
+    assert last["has_more"] is False and last["next_after"] is None
+
+
+@pytest.fixture
+def customer_index(monkeypatch):
+    index = NameIndex("customers", "")
+    index.load_rows(ROWS)
+    monkeypatch.setitem(name_index._INDEXES, "customers", index)
+    get_search_cache().clear()
+    yield index
+    get_search_cache().clear()
+
+
+def _search(after=None, limit=2) -> dict:
+    resp = asyncio.run(customers.search_customers(q="スタンド", limit=limit, after=after))
+    return json.loads(resp.body)
+
+
+def test_index_pages_follow_rank_cursor(customer_index):
+    first = _search()
+    assert [r["tcode"] for r in first["items"]] == [10, 1]
+    rest = _search(after=first["next_after"], limit=10)
+    assert [r["tcode"] for r in rest["items"]] == [3, 2]
+
+
+def test_code_cursor_is_rejected_by_index_path(customer_index):
+    # SQL 経路（コード順）の cursor を索引の順位順に当てはめない
+    for after in ("c:2", "2"):
+        with pytest.raises(HTTPException) as exc:
+            _search(after=after)
+        assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("route", [customers.search_customers, shipto.search_shipto])
+@pytest.mark.parametrize("after", ["c:abc", "12a", "c:-1", "c:１２"])
+def test_sql_path_rejects_non_numeric_code_cursor(monkeypatch, route, after):
+    # 得意先コードは NUMBER（DB に渡すと ORA-01722 で 500 になる）
+    monkeypatch.delitem(name_index._INDEXES, "customers", raising=False)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(route(q="スタンド", limit=2, after=after))
+    assert exc.value.status_code == 400
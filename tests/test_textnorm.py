@@ -0,0 +1,46 @@
+# app.textnorm の表記揺れ（ハイフン・長音・空白・NFKC）
+from __future__ import annotations
+
+import pytest
+
+from app.textnorm import normalize, normalize_code, normalize_key
+
+
+@pytest.mark.parametrize(
+    "variant",
+    [
+        "ボールベアリング",
+        "ボ－ルベアリング",  # 全角ハイフンマイナス（NFKC で "-"）
+        "ボ-ルベアリング",  # ASCII のハイフン
+        "ボ‐ルベアリング",  # ハイフン
+        "ボ−ルベアリング",  # マイナス記号
+        "ボ―ルベアリング",  # 水平線
+        "ﾎﾞｰﾙﾍﾞｱﾘﾝｸﾞ",  # 半角カナ + 半角長音
+        "ﾎﾞ-ﾙﾍﾞｱﾘﾝｸﾞ",  # 半角カナ + ASCII のハイフン
+        "ﾎﾞ－ﾙﾍﾞｱﾘﾝｸﾞ",  # 半角カナ + 全角ハイフンマイナス
+    ],
+)
+def test_hyphen_and_long_vowel_variants_after_kana(variant):
+    assert normalize(variant) == "ボールベアリング"
+    assert normalize_key(variant) == "ボールベアリング"
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("ＡＢＣ－１２", "abc-12"),  # かなの直後でなければハイフンのまま
+        ("M12-40", "m12-40"),
+        ("SUS－304", "sus-304"),
+        ("ねじ-M8", "ねじーm8"),  # ひらがなの直後は長音とみなす
+        ("ステンレス　 六角\tボルト ", "ステンレス 六角 ボルト"),
+        ("㈱東洋", "(株)東洋"),
+        (None, ""),
+    ],
+)
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+def test_normalize_code_ignores_separators():
+    assert normalize_code("ABC-12 3") == normalize_code("ａｂｃ－１２３") == "abc123"
+    assert normalize_code("HB－10") == "hb10"